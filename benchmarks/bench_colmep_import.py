@@ -0,0 +1,94 @@
+# Benchmark: CoLMEP import - the streaming importer against the original three-pass importer
+# run from the repository root with: python benchmarks/bench_colmep_import.py [file] [copies]
+# with no file, tests/data/input.xml is repeated to make a larger document
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+
+# the original importer - parse the whole file, build a flat intermediate tree,
+# clone it through an XML string, then tokenise the text elements
+def legacy_import(filename: str) -> Document:
+    input_tree = ET.parse(filename)
+    d = Document.create_new()
+    for elem in input_tree.getroot().iter():
+        if elem.tag == 'document':
+            if elem.text != None:
+                text_elem = ET.SubElement(d.get_underlying_element(), 'text')
+                text_elem.text = elem.text
+        else:
+            new_elem = ET.SubElement(d.get_underlying_element(), elem.tag, elem.attrib)
+            new_elem.text = elem.text
+        if elem.tail != None:
+            if elem.tail != '' and elem.tail != '\n':
+                text_elem = ET.SubElement(d.get_underlying_element(), 'text')
+                text_elem.text = elem.tail
+    d_old = Document.create_from_xml_string(ET.tostring(d.get_underlying_element(), encoding='unicode'))
+    d.clear()
+    for elem in d_old.iter():
+        if elem.tag == 'text':
+            for token in elem.text.split():
+                puncs = [',', '?', '!', ':', ';', '/', '\'', '"', '¶']
+                if len(token) > 1 and token[0] in puncs:
+                    w = ET.SubElement(d.get_underlying_element(), 'w')
+                    w.text = token[0]
+                    token = token[1:]
+                post_punc = ''
+                if len(token) > 1 and token[-1] in puncs:
+                    post_punc = token[-1]
+                    token = token[:-1]
+                w = ET.SubElement(d.get_underlying_element(), 'w')
+                w.text = token
+                if post_punc != '':
+                    w = ET.SubElement(d.get_underlying_element(), 'w')
+                    w.text = post_punc
+        if elem.tag in ['newpage', 'newfolio', 'comment', 'footnote']:
+            tag = ET.SubElement(d.get_underlying_element(), elem.tag)
+            tag.text = elem.text
+            tag.attrib.update(elem.attrib.items())
+    return d
+
+
+def measure(function, filename: str):
+    # time without tracing, then measure peak memory separately as tracemalloc slows things down
+    start = time.perf_counter()
+    d = function(filename)
+    elapsed = time.perf_counter() - start
+    xml = d.to_xml_string()
+    del d
+    tracemalloc.start()
+    d = function(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, xml
+
+
+if len(sys.argv) > 1:
+    filename = sys.argv[1]
+else:
+    copies = 200
+    with open('tests/data/input.xml') as f:
+        body = f.read().strip()
+    body = body[len('<document>'):-len('</document>')]
+    temp = tempfile.NamedTemporaryFile('w', suffix='.xml', delete=False)
+    temp.write('<document>' + body * copies + '</document>')
+    temp.close()
+    filename = temp.name
+
+print('File:', filename, '(%.1f MB)' % (os.path.getsize(filename) / 1e6))
+legacy_time, legacy_peak, legacy_xml = measure(legacy_import, filename)
+stream_time, stream_peak, stream_xml = measure(lambda f: Document.create_from_nonstandard_file(f, 'colmep'), filename)
+print('Original:  %.2f s, peak memory %.1f MB' % (legacy_time, legacy_peak / 1e6))
+print('Streaming: %.2f s, peak memory %.1f MB' % (stream_time, stream_peak / 1e6))
+print('Speed-up: %.1fx, memory reduction: %.1fx' % (legacy_time / stream_time, legacy_peak / stream_peak))
+print('Output identical:', legacy_xml == stream_xml)
+
+if len(sys.argv) == 1:
+    os.remove(filename)
@@ -0,0 +1,36 @@
+# Benchmark: concordance_in building every line against a Concordance showing a page of sorted or sampled hits
+# run from the repository root with: python benchmarks/bench_concordance.py [copies]
+# tests/data/input.xml is repeated to make a larger document
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+sents = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sents:
+        d.append(ET.fromstring(ET.tostring(s)))
+print('Words:', d.count_words())
+
+def timed(name, f):
+    start = time.perf_counter()
+    result = f()
+    print('%-46s %8.3f s' % (name, time.perf_counter() - start))
+    return result
+
+lines = timed('concordance_in (every line)', lambda: d.concordance_in(['the', 'of']))
+print('Hits:', len(lines))
+timed('build_word_index', lambda: d.build_word_index())
+c = timed('get_concordance', lambda: d.get_concordance(['the', 'of']))
+timed('first page', lambda: c.get_page(0))
+timed('sort by R1, R2 and first page', lambda: c.sort(['R1', 'R2']).get_page(0))
+timed('sort by L1 and last page', lambda: c.sort('L1').get_page(c.count_pages() - 1))
+timed('sample of 100', lambda: c.sample(100).get_lines())
@@ -0,0 +1,70 @@
+# Benchmark: memory used to answer queries from a Corpus loaded into memory, against a CorpusStore
+# run from the repository root with: python benchmarks/bench_corpus_store.py [files]
+# tests/data/input.xml is imported, tokenised and saved as each file of the corpus
+# NB tracemalloc counts memory allocated by Python - the pages of the mapped files are not included,
+# as they belong to the operating system's file cache and are dropped when memory is short
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Corpus, CorpusStore, Document
+
+files = int(sys.argv[1]) if len(sys.argv) > 1 else 38
+
+# the queries which are answered from both
+def run_queries(c) -> list:
+    return [
+        c.count_words(),
+        c.count_sentences(),
+        c.get_sentence_lengths(),
+        c.word_frequency(correctedText=True).most_common(20),
+        c.concordance_in(['which', 'whiche'], correctedText=True)
+    ]
+
+# time and peak memory of a function
+def measure(f) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+with tempfile.TemporaryDirectory() as folder:
+    d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+    d.transform_tokenise_sentences()
+    d.update_spellings_from_file('tests/data/spellings.json')
+    paths = []
+    for i in range(files):
+        path = os.path.join(folder, 'text%02d.xml' % i)
+        d.to_xml_file(path)
+        paths.append(path)
+    store_folder = os.path.join(folder, 'store')
+    CorpusStore.create_from_files(paths, store_folder).close()
+
+    def in_memory():
+        c = Corpus.create_new()
+        for path in paths:
+            Document.create_from_xml_file(path).add_to_corpus(c)
+        return run_queries(c)
+
+    def from_store():
+        store = CorpusStore(store_folder)
+        results = run_queries(store)
+        store.close()
+        return results
+
+    memory_results, memory_time, memory_peak = measure(in_memory)
+    store_results, store_time, store_peak = measure(from_store)
+    assert memory_results == store_results
+
+print('Words:', memory_results[0])
+print()
+print('                 time       peak memory')
+print('Corpus:          %.2f s     %6.1f MB' % (memory_time, memory_peak / 1000000))
+print('CorpusStore:     %.2f s     %6.1f MB' % (store_time, store_peak / 1000000))
@@ -0,0 +1,27 @@
+# Benchmark: time taken to import corpusparser without using the parser
+# run from the repository root with: python benchmarks/bench_import.py
+# each import runs in a fresh interpreter so nothing is already cached in sys.modules
+
+import subprocess
+import sys
+
+runs = 10
+code = '''
+import sys, time
+start = time.perf_counter()
+import corpusparser
+elapsed = time.perf_counter() - start
+heavy = [m for m in ('spacy', 'benepar', 'torch') if m in sys.modules]
+print(elapsed, ','.join(heavy))
+'''
+
+times = []
+for i in range(runs):
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    elapsed, heavy = result.stdout.split('\n')[0].split(' ')
+    times.append(float(elapsed))
+    if heavy != '':
+        print('Heavy modules imported:', heavy)
+
+times.sort()
+print('import corpusparser - best: %.1f ms, median: %.1f ms over %d runs' % (times[0] * 1000, times[len(times) // 2] * 1000, runs))
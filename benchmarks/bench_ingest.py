@@ -0,0 +1,35 @@
+# Benchmark: importing a corpus of files one at a time against importing them in worker processes
+# run from the repository root with: python benchmarks/bench_ingest.py [files] [workers]
+# tests/data/input.xml is copied to a temporary directory to make the files
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Corpus
+
+files = int(sys.argv[1]) if len(sys.argv) > 1 else 38
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+with tempfile.TemporaryDirectory() as folder:
+    paths = []
+    for i in range(files):
+        path = os.path.join(folder, 'text%02d.xml' % i)
+        shutil.copy('tests/data/input.xml', path)
+        paths.append(path)
+
+    start = time.perf_counter()
+    serial = Corpus.create_from_files(paths, 'colmep')
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = Corpus.create_from_files(paths, 'colmep', workers=workers)
+    parallel_time = time.perf_counter() - start
+
+assert parallel.to_xml_string() == serial.to_xml_string()
+print()
+print('One at a time:   %.2f s' % serial_time)
+print('%2d workers:      %.2f s (%.1fx)' % (workers, parallel_time, serial_time / parallel_time))
@@ -0,0 +1,59 @@
+# Benchmark: peak memory of a Corpus loaded into memory, against a LazyCorpus which keeps a few documents loaded
+# run from the repository root with: python benchmarks/bench_lazy_corpus.py [files] [max documents]
+# tests/data/input.xml is imported, tokenised and saved as each file of the corpus
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Corpus, Document
+
+files = int(sys.argv[1]) if len(sys.argv) > 1 else 38
+max_documents = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# the work done on each corpus - a spelling update, written back for the lazy corpus, and two queries
+def run(c) -> list:
+    c.map_documents([('update_spellings', 'the', 'thee')])
+    return [c.count_words(), c.word_frequency(correctedText=True).most_common(20)]
+
+# time and peak memory of a function
+def measure(f) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = f()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+with tempfile.TemporaryDirectory() as folder:
+    d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+    d.transform_tokenise_sentences()
+    paths = []
+    for i in range(files):
+        paths.append(os.path.join(folder, 'text%02d.xml' % i))
+        d.to_xml_file(paths[-1])
+
+    def in_memory():
+        c = Corpus.create_new()
+        for path in paths:
+            Document.create_from_xml_file(path).add_to_corpus(c)
+        return run(c)
+
+    def lazy():
+        c = Corpus.create_lazy(paths, max_documents=max_documents)
+        results = run(c)
+        c.close()
+        return results
+
+    memory_results, memory_time, memory_peak = measure(in_memory)
+    lazy_results, lazy_time, lazy_peak = measure(lazy)
+    assert memory_results == lazy_results
+
+print()
+print('                          time       peak memory')
+print('Corpus:                   %.2f s     %6.1f MB' % (memory_time, memory_peak / 1000000))
+print('LazyCorpus (%2d loaded):   %.2f s     %6.1f MB' % (max_documents, lazy_time, lazy_peak / 1000000))
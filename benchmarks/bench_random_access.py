@@ -0,0 +1,51 @@
+# Benchmark: walking a large document word by word, and sentence by sentence, by index
+# run from the repository root with: python benchmarks/bench_random_access.py [words]
+# tests/data/input.xml is repeated to make a document of at least the given number of words (500,000 by default)
+# the lists of words and sentences used to be built again for every lookup - the time for that is
+# estimated from a small number of lookups
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+target = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+sents = list(d.get_underlying_element())
+copy_words = d.count_words()
+for i in range((target - 1) // copy_words):
+    for s in sents:
+        d.append(ET.fromstring(ET.tostring(s)))
+words = d.count_words()
+sentences = d.count_sentences()
+print('Words:', words, 'Sentences:', sentences)
+
+# the previous implementation, for comparison
+def legacy_word(index):
+    return list(d.iter('w'))[index]
+
+samples = 20
+start = time.perf_counter()
+for i in range(samples):
+    legacy_word(i * 1000)
+legacy_estimate = (time.perf_counter() - start) / samples * words
+
+start = time.perf_counter()
+for i in range(words):
+    d.get_word_element_by_index(i)
+word_time = time.perf_counter() - start
+
+start = time.perf_counter()
+for i in range(sentences):
+    for j in range(len(d.get_sentence_element_by_index(i).findall('w'))):
+        d.get_word_element_by_sentence_and_word_index(i, j)
+sentence_time = time.perf_counter() - start
+
+print('Every word by index:                 %8.3f s' % word_time)
+print('Every word by sentence and index:    %8.3f s' % sentence_time)
+print('Previously, every word by index (estimated): %8.0f s' % legacy_estimate)
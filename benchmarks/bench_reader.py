@@ -0,0 +1,53 @@
+# Benchmark: exporting the sentences of a file by loading the whole document, against iter_sentences()
+# run from the repository root with: python benchmarks/bench_reader.py [copies]
+# the sentences of tests/data/input.xml are copied to make a large file
+
+import copy
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document, iter_sentences
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+sentences = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sentences:
+        d.append(copy.deepcopy(s))
+print('Words:', d.count_words())
+
+# time and peak memory of writing the corrected text of each sentence to a file
+def measure(get_sentences, filename) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(filename, 'w', encoding='utf-8') as f:
+        for s in get_sentences():
+            f.write(s + '\n')
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+with tempfile.TemporaryDirectory() as folder:
+    xml_file = os.path.join(folder, 'document.xml')
+    d.to_xml_file(xml_file, indent=2)
+    del d, sentences
+    whole_file = os.path.join(folder, 'whole.txt')
+    stream_file = os.path.join(folder, 'stream.txt')
+    whole_time, whole_peak = measure(lambda: Document.create_from_xml_file(xml_file).get_sentences_as_text_list(True), whole_file)
+    stream_time, stream_peak = measure(lambda: iter_sentences(xml_file, as_text=True, correctedText=True), stream_file)
+    with open(whole_file, encoding='utf-8') as f, open(stream_file, encoding='utf-8') as g:
+        assert f.read() == g.read()
+
+# NB times are measured with tracemalloc running, which slows both down
+print()
+print('                          time       peak memory')
+print('Whole document:           %.2f s     %6.1f MB' % (whole_time, whole_peak / 1000000))
+print('iter_sentences():         %.2f s     %6.1f MB' % (stream_time, stream_peak / 1000000))
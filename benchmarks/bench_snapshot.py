@@ -0,0 +1,51 @@
+# Benchmark: saving and loading a document as XML against saving and loading it as a snapshot
+# run from the repository root with: python benchmarks/bench_snapshot.py [copies]
+# the sentences of tests/data/input.xml are copied to make a large document
+
+import copy
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+runs = 5
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+sentences = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sentences:
+        d.append(copy.deepcopy(s))
+print('Words:', d.count_words())
+
+# best time over a few runs
+def best_time(f) -> float:
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+with tempfile.TemporaryDirectory() as folder:
+    xml_file = os.path.join(folder, 'document.xml')
+    snapshot_file = os.path.join(folder, 'document.snapshot')
+    xml_save = best_time(lambda: d.to_xml_file(xml_file, indent=2))
+    snapshot_save = best_time(lambda: d.save_snapshot(snapshot_file))
+    xml_load = best_time(lambda: Document.create_from_xml_file(xml_file))
+    snapshot_load = best_time(lambda: Document.load_snapshot(snapshot_file))
+    # the indent is only applied to the file, so the snapshot is compared with the XML as it would be indented
+    assert Document.load_snapshot(snapshot_file).to_xml_string(indent=2) == Document.create_from_xml_file(xml_file).to_xml_string(indent=2)
+    xml_size = os.path.getsize(xml_file)
+    snapshot_size = os.path.getsize(snapshot_file)
+
+print()
+print('            save       load       size')
+print('XML:        %.3f s    %.3f s    %.1f MB' % (xml_save, xml_load, xml_size / 1000000))
+print('Snapshot:   %.3f s    %.3f s    %.1f MB' % (snapshot_save, snapshot_load, snapshot_size / 1000000))
+print('            %.1fx       %.1fx' % (xml_save / snapshot_save, xml_load / snapshot_load))
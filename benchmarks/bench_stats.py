@@ -0,0 +1,47 @@
+# Benchmark: the separate walks print_info used to make against collect_stats() on a whole corpus
+# run from the repository root with: python benchmarks/bench_stats.py [documents]
+# tests/data/input.xml is copied to make a corpus
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Corpus, Document
+
+documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+c = Corpus.create_new()
+for i in range(documents):
+    d.clone_document().add_to_corpus(c)
+print('Words:', c.count_words())
+
+# each call walks the tree again, as print_info did - mark_changed() stops results being remembered
+calls = [
+    lambda: c.count_documents(),
+    lambda: c.count_sentences(),
+    lambda: c.count_words(),
+    lambda: c.count_sentences(), lambda: c.longest_sentence_length(),
+    lambda: c.count_sentences(), lambda: c.shortest_sentence_length(),
+    lambda: c.count_sentences(), lambda: c.average_sentence_length(),
+    lambda: c.word_frequency_no_punctuation(correctedText=True).most_common(20),
+    lambda: c.word_frequency_contains_punctuation(correctedText=True).most_common(10),
+    lambda: c.get_nonstandard_characters(),
+    lambda: c.get_xml_tags(),
+]
+start = time.perf_counter()
+for call in calls:
+    c.mark_changed()
+    call()
+separate_time = time.perf_counter() - start
+
+c.mark_changed()
+start = time.perf_counter()
+c.collect_stats()
+stats_time = time.perf_counter() - start
+
+print('Separate walks: %.3f s' % separate_time)
+print('collect_stats:  %.3f s (%.1fx)' % (stats_time, separate_time / stats_time))
@@ -0,0 +1,55 @@
+# Benchmark: query methods walking the tree against the same methods using a TokenTable
+# run from the repository root with: python benchmarks/bench_token_table.py [copies]
+# tests/data/input.xml is repeated to make a larger document
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+sents = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sents:
+        d.append(ET.fromstring(ET.tostring(s)))
+print('Words:', d.count_words())
+
+queries = {
+    'count_words': lambda d: d.count_words(),
+    'get_sentence_lengths': lambda d: d.get_sentence_lengths(),
+    'word_frequency': lambda d: d.word_frequency(),
+    'word_frequency (corrected, ignore case)': lambda d: d.word_frequency(correctedText=True, ignoreCase=True),
+    'word_frequency_no_punctuation': lambda d: d.word_frequency_no_punctuation(correctedText=True),
+    'concordance_in': lambda d: d.concordance_in(['he', 'hym']),
+    'word_count_in': lambda d: d.word_count_in(['he', 'hym', 'hys']),
+}
+
+# each query is run on a new Document for the same tree, so no remembered results are used
+def run_all(use_table: bool) -> dict:
+    times = {}
+    for name, query in queries.items():
+        document = Document(d.get_underlying_element())
+        if use_table:
+            document.build_token_table()
+        start = time.perf_counter()
+        query(document)
+        times[name] = time.perf_counter() - start
+    return times
+
+tree_times = run_all(False)
+start = time.perf_counter()
+Document(d.get_underlying_element()).build_token_table()
+build_time = time.perf_counter() - start
+table_times = run_all(True)
+
+print('Building the token table: %.3f s' % build_time)
+print('%-42s %10s %10s %8s' % ('Query', 'Tree (s)', 'Table (s)', 'Speed-up'))
+for name in queries:
+    print('%-42s %10.3f %10.3f %7.1fx' % (name, tree_times[name], table_times[name], tree_times[name] / table_times[name]))
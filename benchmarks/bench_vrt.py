@@ -0,0 +1,59 @@
+# Benchmark: exporting a corpus as sentence text with the README recipe, against to_text_file() and to_vrt_file()
+# run from the repository root with: python benchmarks/bench_vrt.py [documents]
+# tests/data/input.xml is copied to make a corpus
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Corpus, Document
+
+documents = int(sys.argv[1]) if len(sys.argv) > 1 else 38
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.transform_number_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+c = Corpus.create_new()
+for i in range(documents):
+    copy = d.clone_document()
+    copy.set_id('text%02d' % i)
+    copy.add_to_corpus(c)
+print('Words:', c.count_words())
+
+# the recipe from the README
+def write_text_list(filename):
+    sents = c.get_sentences_as_text_list(correctedText=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        for s in sents:
+            f.write(f"{s}\n")
+
+# time of an export, and its peak memory in a second run - NB tracemalloc slows the exports down a lot
+def measure(write, filename) -> tuple:
+    start = time.perf_counter()
+    write(filename)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    write(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+with tempfile.TemporaryDirectory() as folder:
+    files = [os.path.join(folder, name) for name in ['list.txt', 'stream.txt', 'corpus.vrt', 'corpus.vrt.gz']]
+    results = [
+        measure(write_text_list, files[0]),
+        measure(lambda filename: c.to_text_file(filename, correctedText=True), files[1]),
+        measure(c.to_vrt_file, files[2]),
+        measure(c.to_vrt_file, files[3])
+    ]
+    with open(files[0], 'rb') as f, open(files[1], 'rb') as g:
+        assert f.read() == g.read()
+
+print()
+print('                                  time       peak memory')
+for name, (seconds, peak) in zip(['get_sentences_as_text_list():', 'to_text_file():', 'to_vrt_file():', 'to_vrt_file() with gzip:'], results):
+    print('%-32s  %.2f s     %6.1f MB' % (name, seconds, peak / 1000000))
@@ -0,0 +1,52 @@
+# Benchmark: word_count_in and concordance_in scanning every word against the same methods using a WordIndex
+# run from the repository root with: python benchmarks/bench_word_index.py [copies]
+# tests/data/input.xml is repeated to make a larger document
+
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+sents = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sents:
+        d.append(ET.fromstring(ET.tostring(s)))
+print('Words:', d.count_words())
+
+# a variant-counting study - several small queries on the same document
+queries = {
+    'word_count_in he/hym/hys': lambda: d.word_count_in(['he', 'hym', 'hys']),
+    'word_count_in ye/ȝe': lambda: d.word_count_in(['ye', 'ȝe']),
+    'word_count_in corrected': lambda: d.word_count_in(['upon', 'unto'], correctedText=True),
+    'concordance_in he/hym': lambda: d.concordance_in(['he', 'hym']),
+    'concordance thou': lambda: d.concordance('thou'),
+}
+
+def run_all() -> dict:
+    times = {}
+    for name, query in queries.items():
+        start = time.perf_counter()
+        query()
+        times[name] = time.perf_counter() - start
+    return times
+
+scan_times = run_all()
+start = time.perf_counter()
+d.build_word_index()
+build_time = time.perf_counter() - start
+# the postings are built by the first query which needs them
+run_all()
+index_times = run_all()
+
+print('Building the token table and index: %.3f s' % build_time)
+print('%-42s %10s %10s %8s' % ('Query', 'Scan (s)', 'Index (s)', 'Speed-up'))
+for name in queries:
+    print('%-42s %10.3f %10.4f %7.1fx' % (name, scan_times[name], index_times[name], scan_times[name] / index_times[name]))
@@ -0,0 +1,67 @@
+# Benchmark: writing a large document with ET.tostring(), as to_xml_file used to, against the streaming writer
+# run from the repository root with: python benchmarks/bench_xml_writer.py [copies]
+# the sentences of tests/data/input.xml are copied to make a large document
+
+import copy
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from corpusparser import Document
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+d.transform_tokenise_sentences()
+d.update_spellings_from_file('tests/data/spellings.json')
+sentences = list(d.get_underlying_element())
+for i in range(copies - 1):
+    for s in sentences:
+        d.append(copy.deepcopy(s))
+print('Words:', d.count_words())
+
+# the old to_xml_file - NB ET.indent changes the tree, so it is given a copy
+def write_with_tostring(filename):
+    e = copy.deepcopy(d.get_underlying_element())
+    start = time.perf_counter()
+    ET.indent(e, '  ')
+    xml = ET.tostring(e, 'unicode')
+    with open(filename, 'w') as f:
+        f.write(xml)
+    return time.perf_counter() - start
+
+def write_streaming(filename):
+    start = time.perf_counter()
+    d.to_xml_file(filename, indent=2)
+    return time.perf_counter() - start
+
+# time of a write, and its peak memory in a second run - NB tracemalloc slows the writes down a lot
+def measure(write, filename) -> tuple:
+    seconds = write(filename)
+    tracemalloc.start()
+    write(filename)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+with tempfile.TemporaryDirectory() as folder:
+    old_file = os.path.join(folder, 'old.xml')
+    new_file = os.path.join(folder, 'new.xml')
+    gz_file = os.path.join(folder, 'new.xml.gz')
+    old_time, old_peak = measure(write_with_tostring, old_file)
+    new_time, new_peak = measure(write_streaming, new_file)
+    gz_time, gz_peak = measure(write_streaming, gz_file)
+    with open(old_file, 'rb') as f, open(new_file, 'rb') as g:
+        assert f.read() == g.read()
+    assert Document.create_from_xml_file(gz_file).to_xml_string() == Document.create_from_xml_file(new_file).to_xml_string()
+    sizes = [os.path.getsize(f) for f in (old_file, new_file, gz_file)]
+
+print()
+print('                 time       peak memory   size')
+print('ET.tostring:     %.2f s     %6.1f MB     %.2f MB' % (old_time, old_peak / 1000000, sizes[0] / 1000000))
+print('Streaming:       %.2f s     %6.1f MB     %.2f MB' % (new_time, new_peak / 1000000, sizes[1] / 1000000))
+print('Streaming gzip:  %.2f s     %6.1f MB     %.2f MB' % (gz_time, gz_peak / 1000000, sizes[2] / 1000000))
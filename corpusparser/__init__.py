@@ -2,4 +2,15 @@ from .corpus_element import CorpusElement
 from .corpus import Corpus
 from .document import Document
 from .sentence import Sentence
-from .word import Word
\ No newline at end of file
+from .word import Word
+from .parser import ParserBackend, register_parser_backend, set_parser_backend, get_parser_backend
+from .parse_cache import ParseCache
+from .spelling import SpellingRules
+from .normalization import NormalizationTable
+from .token_table import TokenTable
+from .word_index import WordIndex
+from .concordance import Concordance
+from .query import Query
+from .corpus_store import CorpusStore
+from .lazy_corpus import LazyCorpus
+from .reader import iter_sentences, iter_words
\ No newline at end of file
@@ -0,0 +1,160 @@
+# A keyword-in-context (KWIC) concordance, answered from a WordIndex
+# each hit is held only as the range of positions it covers, so frequent words can be
+# found, sorted and sampled without building a line of text for every hit
+# lines are rendered only when they are asked for, e.g. one page at a time
+# a concordance is a snapshot - if the tree is changed, it must be created again
+
+from corpusparser.word_index import WordIndex
+from array import array
+import bisect
+import collections
+import random
+import re
+
+# the location of a hit - the index of its document and sentence in the element (None if it
+# is not in one), its position in the element's word list, and the number of words it covers
+Hit = collections.namedtuple('Hit', ['document', 'sentence', 'position', 'length'])
+
+# a sort key is KW for the first word of the hit, or L or R and a distance, e.g. L1 for the
+# word immediately to the left and R2 for the second word to the right
+_sort_key_pattern = re.compile(r'(KW|L|R)(\d*)$')
+
+
+class Concordance():
+
+    # starts and ends are the ranges of positions covered by each hit, in the order they should be shown
+    # if there are no ends, each hit is a single word
+    def __init__(self, index: WordIndex, starts, ends=None, correctedText=False) -> None:
+        self.index = index
+        self.correctedText = correctedText
+        self.starts = array('i', starts)
+        if ends is None:
+            self.ends = array('i', (start + 1 for start in self.starts))
+        else:
+            self.ends = array('i', ends)
+
+    ##############################################################################
+    # Object creation methods
+
+    # find every word which, in lower case, is one of the keywords - the same hits as CorpusElement.concordance_in
+    def create_from_keywords(index: WordIndex, keywords: list, correctedText=False):
+        return Concordance(index, index.positions_lower(keywords, correctedText), correctedText=correctedText)
+
+    ##############################################################################
+    # Hits
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def get_hit(self, i: int) -> Hit:
+        start = self.starts[i]
+        row = self.index.get_row(start)
+        table = self.index.table
+        return Hit(_locate(table.document_starts, table.document_ends, row),
+                   _locate(table.sentence_starts, table.sentence_ends, row),
+                   start, self.ends[i] - start)
+
+    def get_hits(self, start=0, end=None) -> list:
+        return [self.get_hit(i) for i in range(len(self))[start:end]]
+
+    ##############################################################################
+    # Lines of text
+
+    # a hit as a line of text, in the same form as CorpusElement.concordance_in
+    def get_line(self, i: int, separator='\t', context_length=25) -> str:
+        index = self.index
+        start = self.starts[i]
+        end = self.ends[i]
+        left_context = ' '.join(index.get_words(max(0, start - context_length), start, self.correctedText))
+        keyword = ' '.join(index.get_words(start, end, self.correctedText))
+        right_context = ' '.join(index.get_words(end, end + context_length, self.correctedText))
+        return left_context + separator + keyword + separator + right_context
+
+    def get_lines(self, start=0, end=None, separator='\t', context_length=25) -> list:
+        return [self.get_line(i, separator, context_length) for i in range(len(self))[start:end]]
+
+    # pages are numbered from 0
+    def count_pages(self, page_size=20) -> int:
+        return (len(self) + page_size - 1) // page_size
+    def get_page(self, page: int, page_size=20, separator='\t', context_length=25) -> list:
+        return self.get_lines(page * page_size, (page + 1) * page_size, separator, context_length)
+
+    ##############################################################################
+    # Sorting and sampling - these return a new Concordance
+
+    # sort the hits by the words around them, e.g. sort('R1') or sort(['L1', 'KW'])
+    # hits with the same sort words stay in their current order
+    def sort(self, keys='R1', ignoreCase=True):
+        if isinstance(keys, str):
+            keys = [keys]
+        offsets = [_sort_offset(key) for key in keys]
+        column = self.index.get_column(self.correctedText)
+        ranks = self.index.get_sort_ranks(ignoreCase)
+        last = len(column) - 1
+        starts = self.starts
+        ends = self.ends
+
+        # the rank of each sort word - words beyond the start or end of the text sort first
+        def sort_key(i):
+            key = []
+            for side, distance in offsets:
+                if side == 'L':
+                    position = starts[i] - distance
+                elif side == 'R':
+                    position = ends[i] - 1 + distance
+                else:
+                    position = starts[i]
+                key.append(ranks[column[position]] if 0 <= position <= last else -1)
+            return key
+
+        order = sorted(range(len(self)), key=sort_key)
+        return Concordance(self.index, (starts[i] for i in order), (ends[i] for i in order), self.correctedText)
+
+    # a random sample of n hits, kept in their current order
+    def sample(self, n: int, seed=None):
+        chosen = sorted(random.Random(seed).sample(range(len(self)), min(n, len(self))))
+        return Concordance(self.index, (self.starts[i] for i in chosen), (self.ends[i] for i in chosen), self.correctedText)
+
+
+# the lines of CorpusElement.concordance_in for a stream of words, read in a single pass
+# so only the words to the left of the current one, and the hits still waiting for the words
+# to their right, are held in memory
+# the words can be any values - is_keyword(word) says whether a word is a hit, and text(word) gives its text
+def concordance_in_stream(words, is_keyword, text, separator='\t', context_length=25) -> list:
+    results = []
+    left = collections.deque(maxlen=context_length)
+    # for each hit, the left context and keyword, and the words to its right so far
+    waiting = collections.deque()
+    for word in words:
+        for hit in waiting:
+            hit[2].append(word)
+        if is_keyword(word):
+            waiting.append((' '.join(map(text, left)), text(word), []))
+        while waiting and len(waiting[0][2]) >= context_length:
+            results.append(_stream_line(waiting.popleft(), text, separator))
+        left.append(word)
+    for hit in waiting:
+        results.append(_stream_line(hit, text, separator))
+    return results
+
+def _stream_line(hit: tuple, text, separator: str) -> str:
+    left_context, keyword, right = hit
+    return left_context + separator + keyword + separator + ' '.join(map(text, right))
+
+
+# the index of the range containing a row, or None
+def _locate(starts: array, ends: array, row: int) -> int:
+    # the ranges are in order and do not overlap, so only the last one starting at or before the row can contain it
+    i = bisect.bisect_right(starts, row) - 1
+    if i >= 0 and row < ends[i]:
+        return i
+    return None
+
+# return the side (KW, L or R) and distance for a sort key
+def _sort_offset(key: str) -> tuple:
+    match = _sort_key_pattern.match(key.upper())
+    if match is None or (match.group(1) == 'KW') != (match.group(2) == ''):
+        raise ValueError('Unknown concordance sort key: ' + key)
+    if match.group(1) == 'KW':
+        return ('KW', 0)
+    return (match.group(1), int(match.group(2)))
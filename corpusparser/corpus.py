@@ -1,5 +1,11 @@
-from corpusparser.corpus_element import CorpusElement
+from corpusparser.corpus_element import CorpusElement, _get_change_count, _get_element_content_version, _get_elements_changed_since
 import xml.etree.ElementTree as ET   
+import collections
+import multiprocessing
+import re
+import time
+import tracemalloc
+import weakref
 
 class Corpus(CorpusElement):
 
@@ -7,6 +13,15 @@ class Corpus(CorpusElement):
     # its primary purpose is to allow functions such as word frequency to be
     # applied across multiple documents
 
+    # details of each file imported by create_from_files()
+    ingest_report = None
+
+    # details of each document transformed by the last call to map_documents()
+    map_report = None
+
+    # the word counts of each document - see get_document_frequencies()
+    _document_counts = None
+
     # initialise with the provided underlying element
     def __init__(self, element: ET.Element) -> None:
         self.e = element
@@ -18,4 +33,305 @@ class Corpus(CorpusElement):
     # create an empty corpus
     def create_new():
         new_e = ET.Element('corpus')
-        return Corpus(new_e)
\ No newline at end of file
+        return Corpus(new_e)
+
+    # create a corpus from a list of files, importing each one as a document
+    # format is 'xml' for standard format files, or a non-standard format such as 'colmep'
+    # if workers is more than 1, files in a non-standard format are converted in that many processes at once
+    # NB a worker passes its document back as XML, which must be parsed again here - so standard format
+    # files are always read in this process, as reading them in a worker would only add work
+    # the documents are always in the same order as the files
+    # a file which cannot be imported is left out, and the error is reported, rather than stopping the import
+    # the time taken (including parsing a worker's result), number of words and any error for each file are
+    # printed, and kept in ingest_report
+    def create_from_files(paths: list, format='xml', workers=None):
+        start = time.perf_counter()
+        if format != 'xml' and workers is not None and workers > 1 and len(paths) > 1:
+            tasks = [(path, format, True) for path in paths]
+            with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                results = list(pool.imap(_import_file, tasks))
+        else:
+            results = [_import_file((path, format, False)) for path in paths]
+
+        c = Corpus.create_new()
+        c.ingest_report = []
+        for path, (document, seconds, words, error) in zip(paths, results):
+            if isinstance(document, bytes):
+                parse_start = time.perf_counter()
+                document = ET.fromstring(document)
+                seconds += time.perf_counter() - parse_start
+            c.ingest_report.append({'path': path, 'seconds': seconds, 'words': words, 'error': error})
+            if error is not None:
+                print('Failed to import ' + path + ': ' + error)
+                continue
+            c.append(document)
+            print('Imported %s in %.2f s (%d words)' % (path, seconds, words))
+        failed = sum(1 for r in c.ingest_report if r['error'] is not None)
+        print('Imported %d of %d files in %.2f s' % (len(paths) - failed, len(paths), time.perf_counter() - start))
+        return c
+
+    # create a corpus of document files which are only loaded when they are needed - see LazyCorpus
+    # at most max_documents, or about max_mb of documents, are kept in memory at once
+    def create_lazy(paths: list, max_documents=8, max_mb=None):
+        from corpusparser.lazy_corpus import LazyCorpus
+        return LazyCorpus(paths, max_documents, max_mb)
+
+    ##############################################################################
+
+    # return the documents in the corpus as Document objects
+    # changes made through these objects count as changes to the corpus
+    def get_documents(self) -> list:
+        from corpusparser.document import Document
+        return [Document.create_from_element(d)._attach_to(self) for d in self.e if d.tag == 'document']
+
+    ##############################################################################
+    # Transforms
+
+    # run a pipeline of transforms on each document in the corpus, and put the results back in its place
+    # each step of the pipeline is one of:
+    #   the name of a Document method, e.g. 'transform_tokenise_sentences'
+    #   a tuple of the method name and its arguments - if the last one is a dictionary, it holds keyword
+    #   arguments, e.g. ('update_spellings_from_file', 'spellings.json') or ('transform_parse', {'restructure': True})
+    #   a function which is called with the Document, e.g. lambda d: d.set_attribute('done', 'yes')
+    # if workers is more than 1, the documents are transformed in that many processes at once
+    # NB functions must then be defined at the top level of a module, so they can be sent to the workers
+    # the time taken, peak memory (if measure_memory is True) and any error for each document are printed, and
+    # kept in map_report - NB measuring memory slows the transforms down
+    # if a step fails, the document is left out of the results and the error is reported - in a worker process
+    # the document is left as it was, but otherwise it may have been partly transformed
+    # the document elements stay in the corpus, so Document objects for them can still be used - but in a
+    # worker process the elements below each document are replaced, so objects for those are left behind
+    def map_documents(self, pipeline: list, workers=None, measure_memory=True) -> list:
+        _check_pipeline(pipeline)
+        positions = [i for i, child in enumerate(self.e) if child.tag == 'document']
+        start = time.perf_counter()
+        if workers is not None and workers > 1 and len(positions) > 1:
+            tasks = [(_document_to_xml(self.e[i]), pipeline, measure_memory) for i in positions]
+            with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+                results = list(pool.imap(_map_document, tasks))
+        else:
+            results = [_map_document((self.e[i], pipeline, measure_memory)) for i in positions]
+
+        # the documents are changed or replaced, so their word counts are updated, but the others are kept
+        self._touch(content=False)
+        self.map_report = []
+        for n, (i, (document, seconds, memory, error)) in enumerate(zip(positions, results)):
+            name = self.e[i].get('name', str(n))
+            self.map_report.append({'document': n, 'name': name, 'seconds': seconds, 'peak_memory': memory, 'error': error})
+            if error is not None:
+                print('Failed to transform document ' + name + ': ' + error)
+                continue
+            if isinstance(document, bytes):
+                _copy_into(self.e[i], ET.fromstring(document))
+            if memory is None:
+                print('Transformed document %s in %.2f s' % (name, seconds))
+            else:
+                print('Transformed document %s in %.2f s, peak memory %.1f MB' % (name, seconds, memory / 1000000))
+        print('Transformed %d documents in %.2f s' % (len(positions), time.perf_counter() - start))
+        return self.map_report
+
+    ##############################################################################
+    # Word frequency
+
+    # the word frequency of each document in the corpus, as a list of Counters
+    # the counts for each document are remembered, and a document is only counted again when it has been
+    # changed - so after a change to one document, only that document is counted
+    # if workers is more than 1, the documents which need to be counted are counted in that many processes at once
+    def get_document_frequencies(self, correctedText=False, workers=None) -> list:
+        return [collections.Counter(counts[1 if correctedText else 0]) for counts in self._get_document_counts(workers)]
+
+    # the word frequency of the corpus is the sum of the word frequencies of its documents
+    # the counts of each document are remembered by _get_document_counts(), which sees changes through any
+    # object, so the whole result is not remembered as it is by CorpusElement
+    # NB the Corpus counts are used unless the corpus has sub-elements other than documents, or a token table
+    def word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        return collections.Counter(self._word_frequency(pattern, correctedText, ignoreCase))
+    def _word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        if self._get_token_table() is not None or any(child.tag != 'document' for child in self.e):
+            return CorpusElement._word_frequency(self, pattern, correctedText, ignoreCase)
+        counts = collections.Counter()
+        for document_counts in self._get_document_counts():
+            counts.update(document_counts[1 if correctedText else 0])
+        return _filter_frequency(counts, pattern, ignoreCase)
+
+    # return (original text counts, corrected text counts) for each document, counting any which have changed
+    # a document's counts are kept until there is a change to the document, or to an element below it, through
+    # any object - or a change to the corpus which may be anywhere in its tree (e.g. a transform of the whole corpus)
+    def _get_document_counts(self, workers=None) -> list:
+        if self._document_counts is None:
+            self._document_counts = weakref.WeakKeyDictionary()
+        documents = [child for child in self.e if child.tag == 'document']
+        changes = _get_change_count()
+        corpus_version = _get_element_content_version(self.e)
+        entries = [self._document_counts.get(d) for d in documents]
+        # the elements changed since the oldest counts - a change to an element below a document is only
+        # recorded on that element, as it does not know its parents, so the documents are searched for them
+        since = min((entry[0] for entry in entries if entry is not None), default=changes)
+        changed = _get_elements_changed_since(since) if since < changes else {}
+        changed.pop(self.e, None)
+        below = [version for e, version in changed.items() if e not in self._document_counts]
+        stale = []
+        for d, entry in zip(documents, entries):
+            if entry is None or corpus_version > entry[0] or changed.get(d, 0) > entry[0]:
+                stale.append(d)
+            elif any(version > entry[0] for version in below) and _contains_changed(d, changed, entry[0]):
+                stale.append(d)
+        if workers is not None and workers > 1 and len(stale) > 1:
+            counts = _count_in_pool(stale, workers)
+        else:
+            counts = [_count_document_words(d) for d in stale]
+        for d, (original, corrected) in zip(stale, counts):
+            self._document_counts[d] = (changes, original, corrected)
+        return [self._document_counts[d][1:] for d in documents]
+
+
+# import a single file, in a worker process or in this one
+# returns (document element, seconds, number of words, error message)
+# in a worker process the document is returned as XML, as this is much quicker to pass back than a pickled tree
+def _import_file(task: tuple) -> tuple:
+    # NB Document imports this module, so it cannot be imported at the top
+    from corpusparser.document import Document
+    path, format, as_xml = task
+    start = time.perf_counter()
+    try:
+        if format == 'xml':
+            d = Document.create_from_xml_file(path)
+        elif format == 'colmep':
+            d = Document.create_from_nonstandard_file(path, format)
+        else:
+            raise ValueError('Unknown format: ' + str(format))
+        words = sum(1 for w in d.iter('w'))
+        document = d.get_underlying_element()
+        if as_xml:
+            document = ET.tostring(document, encoding='utf-8')
+        return (document, time.perf_counter() - start, words, None)
+    except Exception as err:
+        return (None, time.perf_counter() - start, 0, type(err).__name__ + ': ' + str(err))
+
+# raise a ValueError if a step of a pipeline is not a Document method or a function
+def _check_pipeline(pipeline: list) -> None:
+    from corpusparser.document import Document
+    for step in pipeline:
+        name = step if isinstance(step, str) else step[0] if isinstance(step, tuple) else None
+        if name is not None and not callable(getattr(Document, name, None)):
+            raise ValueError('Unknown document method in pipeline: ' + str(name))
+        if name is None and not callable(step):
+            raise ValueError('Invalid pipeline step: ' + repr(step))
+
+# the XML of a document, without the text which follows it in the corpus
+def _document_to_xml(e: ET.Element) -> bytes:
+    tail = e.tail
+    e.tail = None
+    data = ET.tostring(e, encoding='utf-8')
+    e.tail = tail
+    return data
+
+# put the contents of a transformed copy of a document into the document element, keeping its tail
+def _copy_into(e: ET.Element, document: ET.Element) -> None:
+    tail = e.tail
+    e.clear()
+    e.tag = document.tag
+    e.attrib.update(document.attrib)
+    e.text = document.text
+    e.tail = tail
+    e.extend(list(document))
+    CorpusElement(e)._touch()
+
+# run a pipeline on a document, in a worker process (which is given and returns XML) or in this one
+# a function step may change the elements directly, so the document is marked as changed after it
+# returns (document element, seconds, peak memory in bytes, error message)
+def _map_document(task: tuple) -> tuple:
+    from corpusparser.document import Document
+    document, pipeline, measure_memory = task
+    as_xml = isinstance(document, bytes)
+    start = time.perf_counter()
+    # if memory is already being traced, e.g. by the caller, carry on tracing afterwards
+    tracing = tracemalloc.is_tracing()
+    if measure_memory:
+        if tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+    try:
+        if as_xml:
+            document = ET.fromstring(document)
+        d = Document.create_from_element(document)
+        for step in pipeline:
+            if isinstance(step, str):
+                getattr(d, step)()
+            elif isinstance(step, tuple):
+                name, args, kwargs = step[0], list(step[1:]), {}
+                if len(args) > 0 and isinstance(args[-1], dict):
+                    kwargs = args.pop()
+                getattr(d, name)(*args, **kwargs)
+            else:
+                step(d)
+                d.mark_changed()
+        if as_xml:
+            document = ET.tostring(document, encoding='utf-8')
+        error = None
+    except Exception as err:
+        document = None
+        error = type(err).__name__ + ': ' + str(err)
+    memory = None
+    if measure_memory:
+        memory = tracemalloc.get_traced_memory()[1] - base
+        if not tracing:
+            tracemalloc.stop()
+    return (document, time.perf_counter() - start, memory, error)
+
+# True if an element in a document has been changed since a change count
+def _contains_changed(e: ET.Element, changed: dict, count: int) -> bool:
+    return any(changed.get(child, 0) > count for child in e.iter())
+
+# count the original and corrected text of the words in a document
+def _count_document_words(e: ET.Element) -> tuple:
+    texts = []
+    sos = []
+    for w in e.iter('w'):
+        if w.text is not None:
+            texts.append(w.text)
+            sos.append(w.get('so'))
+    original = collections.Counter()
+    corrected = collections.Counter()
+    for (text, so), count in collections.Counter(zip(texts, sos)).items():
+        original[text] += count
+        corrected[text if so is None else so] += count
+    return (original, corrected)
+
+# the documents being counted by the workers of a pool - on platforms which fork new processes
+# the workers can read them directly, rather than being sent them as XML
+_pool_documents = None
+
+def _count_in_pool(documents: list, workers: int) -> list:
+    global _pool_documents
+    if multiprocessing.get_start_method() == 'fork':
+        _pool_documents = documents
+        tasks = range(len(documents))
+    else:
+        tasks = [_document_to_xml(d) for d in documents]
+    try:
+        with multiprocessing.Pool(min(workers, len(documents))) as pool:
+            return list(pool.imap(_count_pool_document, tasks))
+    finally:
+        _pool_documents = None
+
+def _count_pool_document(task) -> tuple:
+    if isinstance(task, bytes):
+        return _count_document_words(ET.fromstring(task))
+    return _count_document_words(_pool_documents[task])
+
+# apply the pattern and case options of word_frequency() to counts of each distinct word
+# NB the words are added in order of their first occurrence, as in CorpusElement.word_frequency
+def _filter_frequency(counts: dict, pattern: str, ignoreCase: bool) -> dict:
+    frequency = collections.Counter()
+    for w, count in counts.items():
+        if ignoreCase:
+            w = w.lower()
+        if pattern != '':
+            if not re.match(pattern, w):
+                continue
+            w = w.lower()
+        frequency[w] += count
+    return frequency
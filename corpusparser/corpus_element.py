@@ -4,16 +4,73 @@
 # and serves as the parent class for more specialised classes
 
 
+from corpusparser.parser import get_parser_backend, parse_in_batches, parse_in_pool, MAX_PARSE_LENGTH
+from corpusparser.spelling import SpellingRules
+from corpusparser.token_table import TokenTable
+from corpusparser.word_index import WordIndex
+from corpusparser.concordance import Concordance
+from corpusparser.query import Query
+from corpusparser import snapshot
+from corpusparser import xml_writer
+from corpusparser import vrt
 import xml.etree.ElementTree as ET
 import collections
-import json
+import copy
 import re
+import weakref
+
+# the number of changes made to any element through any CorpusElement object
+# ElementTree elements do not know their parents, so a change through one object cannot be passed
+# on to the objects for the elements above it - remembered results are therefore only kept until
+# there is a change anywhere - see _cached()
+_change_count = 0
+
+# the change count at the last change to each underlying element by any CorpusElement object
+# this is shared by all the objects for the same element, unlike the version of each object
+_element_versions = weakref.WeakKeyDictionary()
+
+# the change count at the last change to each underlying element which may be anywhere below it,
+# e.g. a transform, rather than just to the element and its list of children
+_element_content_versions = weakref.WeakKeyDictionary()
+
+# the version of an underlying element, which is different after every change to it
+def _get_element_version(e: ET.Element) -> int:
+    return _element_versions.get(e, 0)
+def _get_element_content_version(e: ET.Element) -> int:
+    return _element_content_versions.get(e, 0)
+
+# the number of changes made so far, to any element
+def _get_change_count() -> int:
+    return _change_count
+
+# the underlying elements which have been changed since a change count, with their versions
+def _get_elements_changed_since(count: int) -> dict:
+    return {e: version for e, version in list(_element_versions.items()) if version > count}
 
 class CorpusElement():
 
     # the underlying XML tree element
     e = None
 
+    # an optional columnar view of the words in the element - see build_token_table()
+    _token_table = None
+    # the number of changes to any element when the token table was built
+    _token_table_changes = 0
+
+    # an optional positional index of the words in the element - see build_word_index()
+    _word_index = None
+
+    # a counter which is increased whenever the element is changed by any method of this object
+    # results of the count and statistics methods are remembered along with the number of changes
+    # to any element when they were computed, so they are only computed again after a change
+    # made through this or any other object - see _cached()
+    _version = 0
+    _cache = None
+
+    # the object this one was created from, e.g. by Word.create_from_parent_and_index()
+    # changes made through this object also count as changes to the parent
+    _parent = None
+
     # initialise with the provided underlying element
     def __init__(self, element: ET.Element) -> None:
         self.e = element
@@ -42,17 +99,23 @@ class CorpusElement():
         new_e = ET.fromstring(text)
         return CorpusElement.create_from_element(new_e)
     
-    # create an object from a file
+    # create an object from a file, which may be compressed with gzip
     # NB this expects a standard corpusparser XML format
     # other formats may need to be manipulated by subclasses
     def create_from_xml_file(filename: str):
-        tree = ET.parse(filename)
+        with xml_writer.open_xml_file(filename) as f:
+            tree = ET.parse(f)
         return CorpusElement.create_from_element(tree.getroot())
 
+    # create an object from a snapshot file written by save_snapshot()
+    def load_snapshot(filename: str):
+        return CorpusElement.create_from_element(snapshot.read_snapshot(filename))
+
     # create an object as a new object in the tree
     def append_new(parent, tag: str):
         new_e = ET.SubElement(parent.get_underlying_element(), tag)
-        return CorpusElement(new_e)
+        parent._touch(content=False)
+        return CorpusElement(new_e)._attach_to(parent)
     
     # End of object creation methods
     ##############################################################################
@@ -67,13 +130,17 @@ class CorpusElement():
         return len(list(self.e.iter(tag)))
     
     # create a new deep copy of any element in the tree
-    def clone_element(self) -> ET.Element:
-        # the easiest way is to convert to an XML string then parse back out
-        xml = ET.tostring(self.e, encoding='unicode')
-        return ET.fromstring(xml)
+    # the tags, text and tails of all sub-elements are copied
+    # if a list of attribute names is given, only those attributes are copied, e.g.
+    # clone_element(['n', 'so']) - otherwise all attributes are copied
+    def clone_element(self, attributes=None) -> ET.Element:
+        if attributes is None:
+            return copy.deepcopy(self.e)
+        return _copy_element_structure(self.e, set(attributes))
     
     # clear all sub-elements from the element
     def clear_children(self) -> None:
+        self._touch(content=False)
         text = self.e.text
         tail = self.e.tail
         attribs = self.e.attrib.items()
@@ -122,9 +189,11 @@ class CorpusElement():
 
     # return all word as a list of strings or elements
     def get_words_as_text_list(self, correctedText=False) -> list:
+        if self._get_token_table() is not None:
+            return self._token_table.get_words_as_text_list(correctedText)
         return self.get_children_as_text_list('w', correctedText)
     def get_words_as_text(self, correctedText=False) -> str:
-        return self.get_children_as_text('w', correctedText)
+        return ' '.join(self.get_words_as_text_list(correctedText))
     def get_words_as_elements(self) -> list:
         return self.get_children_as_elements('w')
 
@@ -134,10 +203,13 @@ class CorpusElement():
     
     # return a specific sub-element by index
     # if we need these to be recursive use iter() instead of findall()
+    # the list of sub-elements is remembered until there is a change through any object, so this takes constant time
     def get_child_by_index(self, tag: str, index: int, recursive=True) -> ET.Element:
+        return self._get_indexed_children(tag, recursive)[index]
+    def _get_indexed_children(self, tag: str, recursive=True) -> list:
         if recursive:
-            return list(self.iter(tag))[index]
-        return self.findall(tag)[index]
+            return self._cached(('children', tag, True), lambda: list(self.iter(tag)))
+        return self._cached(('children', tag, False), lambda: self.findall(tag))
     
     # character-specific functions
     def get_nonstandard_characters(self) -> set:
@@ -149,9 +221,26 @@ class CorpusElement():
         return self.get_child_by_index('w', index, recursive=True)
     def get_sentence_element_by_index(self, index: int) -> ET.Element:
         return self.get_child_by_index('s', index, recursive=True)
+    # the words of a sentence are next to each other in the list of all words, so a word can be found
+    # from the position of the sentence's first word and the number of words in the sentence
     def get_word_element_by_sentence_and_word_index(self, sentence_index: int, word_index: int) -> ET.Element:
-        sent_e = self.get_sentence_element_by_index(sentence_index)
-        return list(sent_e.iter('w'))[word_index]
+        starts, lengths = self._cached(('sentence_word_ranges',), self._get_sentence_word_ranges)
+        length = lengths[sentence_index]
+        if word_index < 0:
+            word_index += length
+        if word_index < 0 or word_index >= length:
+            raise IndexError('word index out of range')
+        return self._get_indexed_children('w')[starts[sentence_index] + word_index]
+    def _get_sentence_word_ranges(self) -> tuple:
+        positions = {w: i for i, w in enumerate(self._get_indexed_children('w'))}
+        starts = []
+        lengths = []
+        for s in self._get_indexed_children('s'):
+            words = s.iter('w')
+            first = next(words, None)
+            starts.append(0 if first is None else positions[first])
+            lengths.append(0 if first is None else 1 + sum(1 for w in words))
+        return (starts, lengths)
 
 
 
@@ -161,50 +250,135 @@ class CorpusElement():
 
     # get count of specific element types
     def count_elements(self, tag: str, recursive=True) -> int:
+        return self._cached(('count_elements', tag, recursive), lambda: self._count_elements(tag, recursive))
+    def _count_elements(self, tag: str, recursive=True) -> int:
         if recursive:
             return len(list(self.iter(tag)))
         return len(self.findall(tag))
     
     # specific element types
     def count_sentences(self) -> int:
+        if self._get_token_table() is not None:
+            return self._token_table.count_sentences()
         return self.count_elements('s')
     def count_words(self) -> int:
+        if self._get_token_table() is not None:
+            return self._token_table.count_words()
         return self.count_elements('w')
     def count_documents(self) -> int:
+        if self._get_token_table() is not None:
+            return self._token_table.count_documents()
         return self.count_elements('document')
 
     # get sentence length - longest, shortest, average
+    # NB a copy of the remembered list is returned, so the caller can change it
     def get_sentence_lengths(self) -> list:
+        return list(self._cached(('get_sentence_lengths',), self._get_sentence_lengths))
+    def _get_sentence_lengths(self) -> list:
+        if self._get_token_table() is not None:
+            return self._token_table.get_sentence_lengths()
         sent_lengths = []
         for s in self.get_sentences_as_elements():
             sent_lengths.append(len(list(s.iter('w'))))
         return sent_lengths
     def longest_sentence_length(self) -> int:
-        if self.count_sentences() == 0:
+        lengths = self._cached(('get_sentence_lengths',), self._get_sentence_lengths)
+        if len(lengths) == 0:
             return 0
-        return max(self.get_sentence_lengths())
+        return max(lengths)
     def shortest_sentence_length(self) -> int:
-        if self.count_sentences() == 0:
+        lengths = self._cached(('get_sentence_lengths',), self._get_sentence_lengths)
+        if len(lengths) == 0:
             return 0
-        return min(self.get_sentence_lengths())
+        return min(lengths)
     def average_sentence_length(self) -> int:
-        if self.count_sentences() == 0:
+        lengths = self._cached(('get_sentence_lengths',), self._get_sentence_lengths)
+        if len(lengths) == 0:
             return 0
-        lengths = self.get_sentence_lengths()
         return round(sum(lengths) / len(lengths))
     
     # print some basic data about the element
     def print_info(self) -> None:
-        print('Number of documents: ', self.count_documents())
-        print('Number of sentences: ', self.count_sentences())
-        print('Number of words: ', self.count_words())
-        print('Longest sentence: ', self.longest_sentence_length())
-        print('Shortest sentence: ', self.shortest_sentence_length())
-        print('Average sentence length: ', self.average_sentence_length())
-        print('Most frequent words: ', self.word_frequency_no_punctuation(correctedText=True).most_common(20))
-        print('Most frequent punctuation: ', self.word_frequency_contains_punctuation(correctedText=True).most_common(10))
-        print('Non-standard characters', self.get_nonstandard_characters())
-        print("XML tags: ", self.get_xml_tags())
+        stats = self.collect_stats()
+        print('Number of documents: ', stats['documents'])
+        print('Number of sentences: ', stats['sentences'])
+        print('Number of words: ', stats['words'])
+        print('Longest sentence: ', stats['longest_sentence'])
+        print('Shortest sentence: ', stats['shortest_sentence'])
+        print('Average sentence length: ', stats['average_sentence_length'])
+        print('Most frequent words: ', [tuple(entry) for entry in stats['most_frequent_words']])
+        print('Most frequent punctuation: ', [tuple(entry) for entry in stats['most_frequent_punctuation']])
+        print('Non-standard characters', stats['nonstandard_characters'])
+        print("XML tags: ", stats['xml_tags'])
+
+    # collect the data shown by print_info in a single walk of the tree
+    # returns a dictionary which can be saved as JSON, e.g.
+    # {'documents': 1, 'sentences': 39, 'words': 1772, 'longest_sentence': 124, 'shortest_sentence': 2,
+    #  'average_sentence_length': 45, 'most_frequent_words': [['and', 83], ['the', 81], ...],
+    #  'most_frequent_punctuation': [[',', 136], ['/', 79], ...], 'nonstandard_characters': " '()*,./:;^¶ā＆",
+    #  'xml_tags': ['document', 's', 'newpage', 'comment', 'w'], 'element_counts': {'document': 1, 's': 39, ...}}
+    # the word frequencies use the corrected text, as for print_info
+    # the result is remembered until there is a change through any object - see _cached()
+    def collect_stats(self, most_frequent_words=20, most_frequent_punctuation=10) -> dict:
+        key = ('collect_stats', most_frequent_words, most_frequent_punctuation)
+        return copy.deepcopy(self._cached(key, lambda: self._collect_stats(most_frequent_words, most_frequent_punctuation)))
+    def _collect_stats(self, most_frequent_words: int, most_frequent_punctuation: int) -> dict:
+        element_counts = {}
+        sentences = []
+        texts = []
+        sos = []
+        for elem in self.e.iter():
+            tag = elem.tag
+            if tag == 'w':
+                if elem.text is not None:
+                    texts.append(elem.text)
+                    sos.append(elem.get('so'))
+            elif tag == 's':
+                sentences.append(elem)
+            elif not isinstance(tag, str):
+                tag = _tag_name(tag)
+            element_counts[tag] = element_counts.get(tag, 0) + 1
+        # counting the words below each sentence is done by ElementTree, so is much quicker than the walk
+        sent_lengths = [sum(1 for w in s.iter('w')) for s in sentences]
+
+        # count each distinct pair of original and corrected text, in order of first occurrence
+        original = collections.Counter()
+        corrected = collections.Counter()
+        for (text, so), count in collections.Counter(zip(texts, sos)).items():
+            original[text] += count
+            corrected[text if so is None else so] += count
+
+        # the distinct forms are checked against the patterns used by word_frequency_no_punctuation and
+        # word_frequency_contains_punctuation, in order of their first occurrence
+        words = collections.Counter()
+        punctuation = collections.Counter()
+        for w, count in corrected.items():
+            if re.match('.*[A-Za-z0-9].*', w):
+                words[w.lower()] += count
+            if re.match('.*[^A-Za-z0-9].*', w):
+                punctuation[w.lower()] += count
+
+        # the same characters as get_nonstandard_characters, which joins the words with spaces
+        chars = set()
+        for w in original:
+            chars.update(w)
+        if sum(original.values()) > 1:
+            chars.add(' ')
+        ns_chars = chars - set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789')
+
+        return {
+            'documents': element_counts.get('document', 0),
+            'sentences': len(sent_lengths),
+            'words': element_counts.get('w', 0),
+            'longest_sentence': max(sent_lengths) if len(sent_lengths) > 0 else 0,
+            'shortest_sentence': min(sent_lengths) if len(sent_lengths) > 0 else 0,
+            'average_sentence_length': round(sum(sent_lengths) / len(sent_lengths)) if len(sent_lengths) > 0 else 0,
+            'most_frequent_words': [[w, count] for w, count in words.most_common(most_frequent_words)],
+            'most_frequent_punctuation': [[w, count] for w, count in punctuation.most_common(most_frequent_punctuation)],
+            'nonstandard_characters': ''.join(sorted(ns_chars)),
+            'xml_tags': list(element_counts),
+            'element_counts': element_counts,
+        }
 
 
 
@@ -213,7 +387,13 @@ class CorpusElement():
     ##############################################################################
 
     # return a dictonary with the frequency of each word in the element
+    # NB a copy of the remembered result is returned, so the caller can change it
     def word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        key = ('word_frequency', pattern, correctedText, ignoreCase)
+        return collections.Counter(self._cached(key, lambda: self._word_frequency(pattern, correctedText, ignoreCase)))
+    def _word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        if self._get_token_table() is not None:
+            return self._token_table.word_frequency(pattern, correctedText, ignoreCase)
         words = self.get_words_as_text_list(correctedText)
         if ignoreCase:
             words = [w.lower() for w in words]
@@ -244,6 +424,11 @@ class CorpusElement():
     
     #return a count of all words matching a list of words
     def word_count_in(self, list, correctedText=False) -> int:
+        if self._get_word_index() is not None:
+            count = self._word_index.word_count_in(list, correctedText)
+            # the index cannot answer for words containing punctuation or regex patterns
+            if count is not None:
+                return count
         words = self.get_words_as_text_list(correctedText)
         if len(list) == 0:
             return 0
@@ -257,17 +442,19 @@ class CorpusElement():
     
     # get list of XML tags used
     def get_xml_tags(self) -> list:
-        tag_list = []
+        # a dictionary keeps the tags in order of their first occurrence
+        tags = {}
         for elem in self.iter():
-            if elem.tag not in tag_list:
-                tag_list.append(elem.tag)
-        return tag_list
+            tags[elem.tag] = None
+        return list(tags)
     
     # concordance output
     def concordance(self, keyword: str, correctedText=False, separator='\t', context_length=25) -> list:
         return self.concordance_in([keyword], correctedText, separator, context_length)
     
     def concordance_in(self, keywords: list, correctedText=False, separator='\t', context_length=25) -> list:
+        if self._get_word_index() is not None:
+            return self._word_index.concordance_in(keywords, correctedText, separator, context_length)
         results = []
         words = self.get_words_as_text_list(correctedText)
         for i in range(len(words)):
@@ -285,6 +472,22 @@ class CorpusElement():
                 result = left_context + separator + words[i] + separator + right_context
                 results.append(result)
         return results         
+
+    # a Concordance of the same hits as concordance_in, which can be sorted, sampled and shown a page at a time
+    # e.g. get_concordance(['of']).sort(['R1', 'R2']).get_page(0)
+    # this builds a word index if there is not one already
+    def get_concordance(self, keywords: list, correctedText=False) -> Concordance:
+        if self._get_word_index() is None:
+            self.build_word_index()
+        return Concordance.create_from_keywords(self._word_index, keywords, correctedText)
+
+    # find sequences of words matching a CQL-style query, e.g. '[so="ye"] [pos="VB.*"]' - see query.py
+    # returns a Concordance with a hit for each match
+    # this builds a word index if there is not one already
+    def query(self, query: str) -> Concordance:
+        if self._get_word_index() is None:
+            self.build_word_index()
+        return Query.create_from_string(query).find(self._word_index)
         
 
 
@@ -298,38 +501,46 @@ class CorpusElement():
     def get_tag(self) -> str:
         return self.e.tag
     def set_tag(self, tag) -> None:
+        self._touch(content=False)
         self.e.tag = tag
 
     def get_text(self) -> str:
         return self.e.text
     def set_text(self, text) -> None:
+        self._touch(content=False)
         self.e.text = text
 
     def get_tail(self) -> str:
         return self.e.tail
     def set_tail(self, tail) -> None:
+        self._touch(content=False)
         self.e.tail = tail
 
     # helper methods to retrieve and update data from the underlying element's attributes
     def get_name(self) -> str:
         return self.e.get('name')
     def set_name(self, name) -> None:
+        self._touch(content=False)
         self.e.set('name', name)
     
     def get_id(self) -> str:
         return self.e.get('id')
     def set_id(self, id) -> None:
+        self._touch(content=False)
         self.e.set('id', id)
     
     def get_attribute(self, key) -> str:
         return self.e.get(key)
     def set_attribute(self, key, value) -> None:
+        self._touch(content=False)
         self.e.set(key, value)
     def has_attribute(self, key) -> bool:
         return key in self.e.attrib
     def delete_attribute(self, key) -> None:
+        self._touch(content=False)
         self.e.attrib.pop(key)
     def clear_attributes(self) -> None:
+        self._touch(content=False)
         self.e.attrib.clear()
     
     # helper methods to retrieve sub-elements from the underlying element
@@ -342,31 +553,150 @@ class CorpusElement():
     
     # helper methods to alter the structure of the underlying element
     def clear(self) -> None:
+        self._touch(content=False)
         self.e.clear()
     def append(self, subelement: ET.Element) -> None:
+        self._touch(content=False)
         self.e.append(subelement)
     def insert(self, index: int, subelement: ET.Element) -> None:
+        self._touch(content=False)
         self.e.insert(index, subelement)
     def remove(self, subelement: ET.Element) -> None:
+        self._touch(content=False)
         self.e.remove(subelement)
 
     # helper methods to output the tree
+    # the indent is applied to the output only - the text and tails of the elements are not changed
     def to_xml_string(self, indent=0, encoding='unicode') -> str:
-        if indent > 0:
-            space = ' ' * indent
-            ET.indent(self.e, space)
-        return ET.tostring(self.e, encoding)
+        return xml_writer.to_xml_string(self.e, indent, encoding)
     
     # write to file
-    def to_xml_file(self, filename, indent=0, encoding='unicode') -> None:
-        xml = self.to_xml_string(indent, encoding)
+    # the XML is written a chunk at a time, so the whole text is never held in memory
+    # files whose names end with .gz are compressed with gzip, unless compress is False
+    def to_xml_file(self, filename, indent=0, encoding='unicode', compress=None) -> None:
         try:
-            with open(filename, 'w') as f:
-                f.write(xml)
+            xml_writer.write_xml(self.e, filename, indent, encoding, compress)
         except IOError:
             print('IOError: Could not write to file ' + filename)
 
+    # write in vertical (VRT) format for Sketch Engine - one word per line, with its original text,
+    # corrected text and POS type, inside <doc> and <s> structures with the listed attributes
+    # files whose names end with .gz are compressed with gzip, unless compress is False
+    def to_vrt_file(self, filename, attributes=('id', 'n'), compress=None) -> None:
+        try:
+            vrt.write_vrt(self.e, filename, attributes, compress)
+        except IOError:
+            print('IOError: Could not write to file ' + filename)
+
+    # write the text of each sentence on its own line
+    def to_text_file(self, filename, correctedText=False, compress=None) -> None:
+        try:
+            vrt.write_sentence_text(self.e, filename, correctedText, compress)
+        except IOError:
+            print('IOError: Could not write to file ' + filename)
+
+    # write a snapshot - a compact binary copy of the tree which is much quicker to save and load than XML
+    # NB a snapshot is for reloading with load_snapshot(), so use to_xml_file() for files to be read elsewhere
+    def save_snapshot(self, filename) -> None:
+        try:
+            snapshot.write_snapshot(self.e, filename)
+        except IOError:
+            print('IOError: Could not write to file ' + filename)
+
+
 
+    ##############################################################################
+    # Token table
+    ##############################################################################
+
+    # build a columnar TokenTable of the words in this element
+    # while the table is in place, the count, word list and frequency methods use it rather than
+    # walking the tree - like remembered results, it is dropped after a change through any object
+    # NB if the underlying elements are changed directly, call mark_changed() or drop_token_table()
+    def build_token_table(self) -> TokenTable:
+        self._token_table = TokenTable.create_from_element(self.e)
+        self._token_table_changes = _change_count
+        # any index was built on the old table
+        self._word_index = None
+        return self._token_table
+    def get_token_table(self) -> TokenTable:
+        return self._get_token_table()
+    def drop_token_table(self) -> None:
+        self._token_table = None
+        self._word_index = None
+
+    # build a positional index of the words in this element, on top of its token table
+    # while the index is in place, word_count_in, concordance and concordance_in look up the
+    # positions of the words they need, rather than scanning every word
+    # like the token table, it is dropped after a change through any object
+    def build_word_index(self) -> WordIndex:
+        if self._get_token_table() is None:
+            self.build_token_table()
+        self._word_index = WordIndex(self._token_table)
+        return self._word_index
+    def get_word_index(self) -> WordIndex:
+        return self._get_word_index()
+    def drop_word_index(self) -> None:
+        self._word_index = None
+
+    # the token table and word index, if they are in place and there has been no change since they were built
+    def _get_token_table(self) -> TokenTable:
+        if self._token_table is not None and self._token_table_changes != _change_count:
+            self.drop_token_table()
+        return self._token_table
+    def _get_word_index(self) -> WordIndex:
+        self._get_token_table()
+        return self._word_index
+
+    # called by every method which changes the tree, so that derived data is not out of date
+    # content is False for changes to this element and its list of children, e.g. append(), and True for
+    # changes which may be anywhere below it, e.g. transforms - see Corpus.get_document_frequencies()
+    def _touch(self, content=True) -> None:
+        global _change_count
+        self._token_table = None
+        self._word_index = None
+        self._version += 1
+        _change_count += 1
+        _element_versions[self.e] = _change_count
+        if content:
+            _element_content_versions[self.e] = _change_count
+        # a change to a document is recorded in its own version, so its parent only needs to know
+        # that one of its children has changed
+        if self._parent is not None:
+            self._parent._touch(content=self.e.tag != 'document')
+
+    # record the object this one was created from, and return this object
+    def _attach_to(self, parent):
+        self._parent = parent
+        return self
+
+    ##############################################################################
+    # Memoised results
+    ##############################################################################
+
+    # the number of times the element has been changed by methods of this object
+    def get_version(self) -> int:
+        return self._version
+
+    # call this after changing the underlying elements directly, so that remembered results, the
+    # token table and the word index are not out of date
+    # NB changes through other objects, e.g. a Sentence object, are seen by every object without this
+    def mark_changed(self) -> None:
+        self._touch()
+
+    # return the remembered result for a key, or compute it if any element has changed since
+    # a change through another object for the same element, or for one of its sub-elements, must
+    # also be seen here, so the result is kept against the number of changes to any element
+    # NB the result is shared, so methods which return a list or dictionary should return a copy
+    def _cached(self, key: tuple, compute):
+        if self._cache is None:
+            self._cache = {}
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == _change_count:
+            return entry[1]
+        value = compute()
+        self._cache[key] = (_change_count, value)
+        return value
 
     ##############################################################################
     # Transform functions
@@ -376,57 +706,66 @@ class CorpusElement():
         # split the words into sentences
         # start with a set of <w> elements which are children of the <document>
         # create <s> elements to hold the <w> elements in each sentence
+        # the existing elements are moved into the <s> elements in place - the document is not copied
+        self._touch()
+
+        # if this is a corpus, tokenise each of its documents separately
+        documents = self.findall('document')
+        if self.e.tag != 'document' and len(documents) > 0:
+            for d in documents:
+                CorpusElement(d).transform_tokenise_sentences(tokenisation_model)
+            return
 
         # create an ordered list of word elements - NB this can be punctuation also
         word_elem_list = list(self.e.iter('w'))
 
         # iterate through the list and call the tokenisation model for each word
-        # if the model predicts this is the last word of a sentence, add a 'sent-break' attribute to flag this
-        for i in range(0, len(word_elem_list)):
-
-            # choose the tokenisation model
-            if tokenisation_model == 'period':
-                if _period_tokenisation_model(word_elem_list, i):
-                    word_elem_list[i].set('sent-break', '1')
-
-            if tokenisation_model == 'period_and_pause':
-                if _period_and_pause_tokenisation_model(word_elem_list, i):
-                    word_elem_list[i].set('sent-break', '1')
-
-            if tokenisation_model == 'period_and_capital':
-                if _period_and_capital_tokenisation_model(word_elem_list, i):
-                    word_elem_list[i].set('sent-break', '1')
-
-            # NB no other tokenisation models at present
+        # if the model predicts this is the last word of a sentence, add it to the set of sentence breaks
+        # NB no other tokenisation models at present
+        models = {
+            'period': _period_tokenisation_model,
+            'period_and_pause': _period_and_pause_tokenisation_model,
+            'period_and_capital': _period_and_capital_tokenisation_model,
+        }
+        model = models.get(tokenisation_model)
+        sent_breaks = set()
+        if model is not None:
+            for i in range(0, len(word_elem_list)):
+                if model(word_elem_list, i):
+                    sent_breaks.add(word_elem_list[i])
 
         # the last word will always be a sentence break
-        word_elem_list[-1].set('sent-break', '1')
+        if len(word_elem_list) > 0:
+            sent_breaks.add(word_elem_list[-1])
 
-        # clone the document and clear the existing children
-        old_doc = self.clone_document()
-        self.clear_children()
+        # take the child elements out of the document, keeping its text, tail and attributes
+        # if the document has already been split into sentences, take the children of those sentences instead
+        children = []
+        for elem in self.e:
+            if elem.tag == 's':
+                children.extend(elem)
+            else:
+                children.append(elem)
+        del self.e[:]
 
-        # iterate through all child elements of the original document
+        # iterate through the child elements in order
         s = None
-        for elem in old_doc.e.iter():
-
-            # the iterator picks up the document itself - ignore this
-            if elem.tag != 'document':
+        for elem in children:
 
-                # NB all elements are added to a Sentence object, not just words
-                # this includes comments and footnotes
-                    
-                # if there is no sentence, create one, append it to the document
-                if s == None:
-                    s = ET.SubElement(self.e, 's')
+            # NB all elements are added to a Sentence object, not just words
+            # this includes comments and footnotes
+                
+            # if there is no sentence, create one, append it to the document
+            if s == None:
+                s = ET.SubElement(self.e, 's')
 
-                # add the word (or other element) to the sentence
-                s.append(elem)
+            # add the word (or other element) to the sentence
+            s.append(elem)
 
-                # if this word is sentence breaking
-                if elem.get('sent-break') == '1':
-                    # set the sentence back to None to signify it has ended and we need a new one
-                    s = None
+            # if this word is sentence breaking
+            if elem in sent_breaks:
+                # set the sentence back to None to signify it has ended and we need a new one
+                s = None
 
 
     def transform_add_original_text_to_sentences(self) -> None:
@@ -441,6 +780,7 @@ class CorpusElement():
         # TODO - this should use get_children_as_text()
         # however that would entail creating a Sentence object for each iteration
         # leave for now - it creates a circular import reference
+        self._touch()
 
         for sentence in self.e.iter('s'):
             words = []
@@ -458,79 +798,64 @@ class CorpusElement():
                     sentence.set('orig-text', text)
 
     def transform_remove_asterisks(self) -> None:
-        self.update_spellings(match='*', replace='')
+        self.update_spellings_from_rules(_asterisk_rules)
 
     def transform_v_to_u(self) -> None:
-        self.update_spellings_regex(match='v([bcdfghjklmnpqrstvwxz].*)', replace='u\\1')
+        self.update_spellings_from_rules(_v_to_u_rules)
 
     def transform_u_to_v(self) -> None:
-        self.update_spellings_regex(match='(.*[aeiouy])u([aeiouy].*)', replace='\\1v\\2')
+        self.update_spellings_from_rules(_u_to_v_rules)
 
     def transform_carets(self) -> None:
         # several spellings where a digraph is represented with carets
-        self.update_spellings('y^e^', 'the')
-        self.update_spellings('y^e', 'the')
-        self.update_spellings('y^t^', 'that')
-        self.update_spellings('w^t^', 'with')
+        self.update_spellings_from_rules(_caret_rules)
 
     def transform_lbar_to_l(self) -> None:
-        self.update_spellings('ƚ', 'l')
+        self.update_spellings_from_rules(_lbar_rules)
 
     def transform_nasal_bars(self) -> None:
         # several spellings where a nasalised vowel is represented with a bar
         # most often this represents letter n, but it can also be m
         # a separate spelling update can be applied before this, if this is the case
-        self.update_spellings('ā', 'an')
-        self.update_spellings('ē', 'en')
-        self.update_spellings('ī', 'in')
-        self.update_spellings('ō', 'on')
-        self.update_spellings('ū', 'un')
+        self.update_spellings_from_rules(_nasal_bar_rules)
 
     def transform_common_spellings(self) -> None:
         # helper function which bundles common spelling updates together
-        self.transform_remove_asterisks()
-        self.transform_v_to_u()
-        self.transform_u_to_v()
-        self.transform_carets()
-        self.transform_lbar_to_l()
-        self.transform_nasal_bars()
+        # these are applied in order, in a single pass over the words
+        self.update_spellings_from_rules(_asterisk_rules + _v_to_u_rules + _u_to_v_rules + _caret_rules + _lbar_rules + _nasal_bar_rules)
 
     def update_spellings_from_file(self, filename: str) -> None:
         # read the file and apply the spelling updates
-        with open(filename) as f:
-            dict = json.load(f)
-            for spelling in dict['spellings']:
-                if 'regex' in spelling and spelling['regex']:
-                    self.update_spellings_regex(spelling['match'], spelling['replace'])
-                else:
-                    self.update_spellings(spelling['match'], spelling['replace'])
+        # the rules are compiled into a single pipeline, which is run once for each distinct word form
+        self._touch()
+        SpellingRules.create_from_file(filename).apply(self.e)
+
+    def update_spellings_from_table(self, table) -> None:
+        # apply a NormalizationTable which has been built from a spelling file
+        # this gives the same result as update_spellings_from_file, by looking up each word
+        self._touch()
+        table.apply(self.e)
+
+    def update_spellings_from_rules(self, rules: list) -> None:
+        # apply a list of spelling rules, in the same form as a spelling file
+        self._touch()
+        SpellingRules(rules).apply(self.e)
     
     def update_spellings(self, match: str, replace: str) -> None:
         # for each word, check if it matches the match pattern
         # if so, make corrections and add the updated orthography to the word as an attribute
         # if we have already made a change, use the value in the ortho attribute
-        for w in self.iter('w'):
-            if 'so' in w.attrib:
-                if match in w.attrib['so']:
-                    w.set('so', w.attrib['so'].replace(match, replace))
-            else:
-                if match in w.text:
-                    w.set('so', w.text.replace(match, replace))
+        self.update_spellings_from_rules([{'match': match, 'replace': replace}])
 
     def update_spellings_regex(self, match: str, replace: str) -> None:
         # for each word, check if it matches the regex pattern
         # if so, make corrections and add the updated orthography to the word as an attribute
         # if we have already made a change, use the value in the ortho attribute
-        for w in self.iter('w'):
-            if 'so' in w.attrib:
-                if re.match(match, w.attrib['so'], flags=re.IGNORECASE):
-                    w.set('so', re.sub(match, replace, w.attrib['so']))
-            else:
-                if re.match(match, w.text, flags=re.IGNORECASE):
-                    w.set('so', re.sub(match, replace, w.text))
+        self.update_spellings_from_rules([{'regex': True, 'match': match, 'replace': replace}])
 
     def transform_number_elements(self, tag: str) -> None:
         # for each element, add a number attribute
+        self._touch()
         for i, e in enumerate(self.iter(tag)):
             e.set('n', str(i + 1))
 
@@ -538,28 +863,80 @@ class CorpusElement():
         # for each sentence, add a number attribute
         self.transform_number_elements('s')
 
-    def transform_parse(self, correctedText=False, add_parse_string=False, restructure=False, id=None) -> None:
+    def transform_parse(self, correctedText=False, add_parse_string=False, restructure=False, id=None, batch_size=None, sort_by_length=True, cache=None, workers=None) -> None:
         # for each sentence, invoke the parser
+        # if a batch size is given, the sentence texts are streamed through the parser in batches
+        # (optionally grouped by length) and the results applied back to the sentences in order
+        # if a number of workers is given, the batches are shared across that many processes
+        # if a ParseCache is given, sentences which have been parsed before are taken from the cache
+        self._touch()
+        if batch_size is not None or workers is not None:
+            self._transform_parse_batched(correctedText, add_parse_string, restructure, id, batch_size or 64, sort_by_length, cache, workers)
+        else:
+            sents = self.get_sentences()
+            i = 0
+            fails = 0
+            for s in sents:
+                success = s.parse(correctedText, add_parse_string, restructure, id, cache)
+                # if counter is divisible by 100, print a message
+                if i % 100 == 0:
+                    print('Parsed', i, 'of', len(sents), 'sentences')
+                i += 1
+                # if the parser fails, count it
+                if not success:
+                    fails += 1
+            # print a message if there are any failures
+            if fails > 0:
+                print('Parsing failed for', fails, 'sentences which were too long (>512)')
+        # save the cache and report how useful it was
+        if cache is not None:
+            cache.flush()
+            cache.print_stats()
+
+    def _transform_parse_batched(self, correctedText, add_parse_string, restructure, id, batch_size, sort_by_length, cache, workers) -> None:
         sents = self.get_sentences()
-        i = 0
-        fails = 0
-        for s in sents:
-            success = s.parse(correctedText, add_parse_string, restructure, id)
+        texts = [s.get_words_as_text(correctedText) for s in sents]
+        parses = [None] * len(sents)
+        # sentences which are too long for the parser are not sent to it
+        indexes = [i for i in range(len(texts)) if len(texts[i]) <= MAX_PARSE_LENGTH]
+        fails = len(sents) - len(indexes)
+        # nor are sentences which are already in the cache
+        if cache is not None:
+            model = get_parser_backend().get_model_version()
+            for i in indexes:
+                parses[i] = cache.get(texts[i], correctedText, model)
+            indexes = [i for i in indexes if parses[i] is None]
+        if workers is not None and workers > 1:
+            batch = parse_in_pool([texts[i] for i in indexes], workers, batch_size, sort_by_length)
+        else:
+            batch = parse_in_batches([texts[i] for i in indexes], batch_size, sort_by_length)
+        # progress and failures are counted here, across all of the workers
+        errors = 0
+        for count, (i, parse) in enumerate(batch):
             # if counter is divisible by 100, print a message
-            if i % 100 == 0:
-                print('Parsed', i, 'of', len(sents), 'sentences')
-            i += 1
-            # if the parser fails, count it
-            if not success:
-                fails += 1
+            if count % 100 == 0:
+                print('Parsed', count, 'of', len(indexes), 'sentences')
+            if parse is None:
+                errors += 1
+                continue
+            parses[indexes[i]] = parse
+            if cache is not None:
+                cache.put(texts[indexes[i]], correctedText, model, parse)
+        # apply the results to the sentences in their original order
+        for s, parse in zip(sents, parses):
+            if parse is not None:
+                s.apply_parse(parse, add_parse_string, restructure, id)
         # print a message if there are any failures
         if fails > 0:
             print('Parsing failed for', fails, 'sentences which were too long (>512)')
+        if errors > 0:
+            print('Parsing failed for', errors, 'sentences because of a parser error')
     
 
     def transform_pos_tag(self, id=None):
         # for each sentence, calcalate the POS tags
         # NB we must have previously run the parser - check for a 'parse' attribute
+        self._touch()
         sents = self.get_sentences()
         for s in sents:
             if s.has_attribute('parse'):
@@ -573,6 +950,29 @@ class CorpusElement():
 
 
 
+##############################################################################
+# Spelling rules used by the transform functions
+##############################################################################
+
+_asterisk_rules = [{'match': '*', 'replace': ''}]
+_v_to_u_rules = [{'regex': True, 'match': 'v([bcdfghjklmnpqrstvwxz].*)', 'replace': 'u\\1'}]
+_u_to_v_rules = [{'regex': True, 'match': '(.*[aeiouy])u([aeiouy].*)', 'replace': '\\1v\\2'}]
+_caret_rules = [
+    {'match': 'y^e^', 'replace': 'the'},
+    {'match': 'y^e', 'replace': 'the'},
+    {'match': 'y^t^', 'replace': 'that'},
+    {'match': 'w^t^', 'replace': 'with'},
+]
+_lbar_rules = [{'match': 'ƚ', 'replace': 'l'}]
+_nasal_bar_rules = [
+    {'match': 'ā', 'replace': 'an'},
+    {'match': 'ē', 'replace': 'en'},
+    {'match': 'ī', 'replace': 'in'},
+    {'match': 'ō', 'replace': 'on'},
+    {'match': 'ū', 'replace': 'un'},
+]
+
+
 ##############################################################################
 # Models
 ##############################################################################
@@ -605,3 +1005,20 @@ def _period_and_capital_tokenisation_model(word_list, index: int) -> bool:
 ##############################################################################
 
     
+
+# copy an element and its sub-elements, keeping only the named attributes
+def _copy_element_structure(e: ET.Element, attributes: set) -> ET.Element:
+    new_e = ET.Element(e.tag, {k: v for k, v in e.attrib.items() if k in attributes})
+    new_e.text = e.text
+    new_e.tail = e.tail
+    for child in e:
+        new_e.append(_copy_element_structure(child, attributes))
+    return new_e
+
+# the tag of an element as a string - comments and processing instructions have a function as their tag
+def _tag_name(tag) -> str:
+    if tag is ET.Comment:
+        return '!comment'
+    if tag is ET.ProcessingInstruction:
+        return '?pi'
+    return tag
@@ -0,0 +1,275 @@
+# An on-disk corpus, for collections which are too large to load into one element tree
+# the words are held in the same columns as a TokenTable - original text, corrected text and POS type as
+# ids into a vocabulary, and sentences and documents as ranges of rows - but each column is a file of
+# 32-bit integers which is opened with mmap, so only the parts being read are in memory
+# word frequency, counts, sentence lengths and concordances are worked out from the columns, so their
+# memory use depends on the size of the vocabulary, not the size of the corpus
+# every document is also kept as a snapshot, so the corpus can be converted back to exactly the same XML
+#
+# a store is a folder of files:
+#   store.json - the counts, and the attributes, text and document tails of the corpus element
+#   vocab.bin - the number of strings, their lengths in UTF-8 bytes, then the UTF-8 bytes
+#   words.bin, corrected.bin, pos.bin - one id per word, or -1 for none
+#   sentence_starts.bin, sentence_ends.bin, document_starts.bin, document_ends.bin - one row per range
+#   documents.bin - the snapshot of each element in the corpus, one after another
+#   document_offsets.bin - the start of each snapshot in documents.bin, and the end of the last one
+# all the numbers are little-endian
+
+from corpusparser.token_table import TokenTable
+from corpusparser.concordance import concordance_in_stream
+from corpusparser import snapshot
+from corpusparser import xml_writer
+from array import array
+import xml.etree.ElementTree as ET
+import collections
+import json
+import mmap
+import os
+import struct
+import sys
+
+_format = 'corpusparser store'
+_version = 1
+
+# the columns of word ids and ranges of rows
+_columns = ['words', 'corrected', 'pos', 'sentence_starts', 'sentence_ends', 'document_starts', 'document_ends']
+
+_count = struct.Struct('<I')
+
+
+class CorpusStore(TokenTable):
+
+    # open the store in a folder
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        with open(os.path.join(folder, 'store.json'), encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get('format') != _format or info.get('version') != _version:
+            raise ValueError('Not a corpus store, or an unsupported version: ' + folder)
+        self.info = info
+        self.has_empty_words = info['has_empty_words']
+        self.vocab = _read_vocab(os.path.join(folder, 'vocab.bin'))
+        self.vocab_ids = None
+        # the open files and maps, so they can be closed
+        self._files = []
+        self._views = []
+        for name in _columns:
+            setattr(self, name, self._map_column(name, 'i'))
+        self.document_offsets = self._map_column('document_offsets', 'q')
+        self.documents = self._map_column('documents', 'B')
+        if len(self.words) != info['words'] or len(self.document_offsets) != len(info['tails']) + 1:
+            raise ValueError('Corpus store files do not match: ' + folder)
+
+    ##############################################################################
+    # Object creation methods
+
+    # write a store of a corpus in a folder, and open it
+    def create_from_corpus(corpus, folder: str):
+        e = corpus.get_underlying_element()
+        _write_store(folder, e, iter(e))
+        return CorpusStore(folder)
+
+    # write a store of a list of XML files in a folder, and open it
+    # each file is loaded as a document, and dropped once it has been written, so the files
+    # can be much larger than the memory available
+    def create_from_files(paths: list, folder: str):
+        # NB Document imports corpus, so it cannot be imported at the top
+        from corpusparser.document import Document
+        shell = ET.Element('corpus')
+        documents = (Document.create_from_xml_file(path).get_underlying_element() for path in paths)
+        _write_store(folder, shell, documents)
+        return CorpusStore(folder)
+
+    ##############################################################################
+
+    # close the files - the store cannot be used afterwards
+    def close(self) -> None:
+        # NB a view must be released before the view or map it was made from
+        for view in reversed(self._views):
+            view.release()
+        for f in self._files:
+            f.close()
+        self._views = []
+        self._files = []
+
+    # a column file as a sequence of numbers
+    # NB the files are little-endian, so on a big-endian platform each column is read and swapped instead
+    def _map_column(self, name: str, code: str):
+        f = open(os.path.join(self.folder, name + '.bin'), 'rb')
+        self._files.append(f)
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or sys.byteorder == 'big':
+            column = array(code)
+            column.frombytes(f.read())
+            if sys.byteorder == 'big':
+                column.byteswap()
+            return column
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append(m)
+        view = memoryview(m)
+        self._views.append(view)
+        if code == 'B':
+            return view
+        column = view.cast(code)
+        self._views.append(column)
+        return column
+
+    ##############################################################################
+    # Documents - each one is loaded from its snapshot only when it is asked for
+
+    # the number of elements in the corpus, which are usually all documents
+    def count_elements_in_corpus(self) -> int:
+        return len(self.document_offsets) - 1
+
+    # return the element at an index in the corpus as a Document
+    def get_document(self, index: int):
+        from corpusparser.document import Document
+        return Document.create_from_element(self._load_element(index))
+
+    # return each element in the corpus as a Document, one at a time
+    def iter_documents(self):
+        for index in range(self.count_elements_in_corpus()):
+            yield self.get_document(index)
+
+    def _load_element(self, index: int) -> ET.Element:
+        if index < 0:
+            index += self.count_elements_in_corpus()
+        if not 0 <= index < self.count_elements_in_corpus():
+            raise IndexError('Corpus store has no document ' + str(index))
+        start = self.document_offsets[index]
+        end = self.document_offsets[index + 1]
+        e = snapshot.from_snapshot_bytes(bytes(self.documents[start:end]))
+        e.tail = self.info['tails'][index]
+        return e
+
+    # load the whole corpus into memory
+    def to_corpus(self):
+        from corpusparser.corpus import Corpus
+        c = Corpus.create_new()
+        e = c.get_underlying_element()
+        e.attrib.update(self.info['attributes'])
+        e.text = self.info['text']
+        for index in range(self.count_elements_in_corpus()):
+            e.append(self._load_element(index))
+        return c
+
+    # write the corpus as XML, in the same way as Corpus.to_xml_file(), loading one document at a time
+    def to_xml_file(self, filename, indent=0, encoding='unicode', compress=None) -> None:
+        try:
+            xml_writer.write_xml(_StoreCorpusElement(self), filename, indent, encoding, compress)
+        except IOError:
+            print('IOError: Could not write to file ' + filename)
+
+    ##############################################################################
+    # Queries - these give the same results as the CorpusElement methods of the same name
+    # count_words(), count_sentences(), count_documents(), get_sentence_lengths() and word_frequency()
+    # come from TokenTable
+
+    def concordance(self, keyword: str, correctedText=False, separator='\t', context_length=25) -> list:
+        return self.concordance_in([keyword], correctedText, separator, context_length)
+
+    def concordance_in(self, keywords: list, correctedText=False, separator='\t', context_length=25) -> list:
+        vocab = self.vocab
+        keyword_ids = set(id for id, form in enumerate(vocab) if form.lower() in keywords)
+        ids = (id for id in self.get_word_ids(correctedText) if id != TokenTable.NONE)
+        return concordance_in_stream(ids, keyword_ids.__contains__, vocab.__getitem__, separator, context_length)
+
+
+# the corpus element of a store, which loads each document when it is written
+# it has just the parts of an element which xml_writer.iter_xml() uses
+class _StoreCorpusElement():
+
+    def __init__(self, store: CorpusStore) -> None:
+        self.store = store
+        self.tag = 'corpus'
+        self.text = store.info['text']
+        self.tail = None
+
+    def items(self):
+        return self.store.info['attributes'].items()
+
+    def __len__(self) -> int:
+        return self.store.count_elements_in_corpus()
+
+    def __getitem__(self, index: int) -> ET.Element:
+        return self.store._load_element(index)
+
+
+# write the store of a corpus element and its sub-elements, given one at a time
+# the words of each sub-element are added to the columns and written before the next one is given
+def _write_store(folder: str, shell: ET.Element, elements) -> None:
+    os.makedirs(folder, exist_ok=True)
+    # the information is written last, so a store which was not finished cannot be opened
+    info_file = os.path.join(folder, 'store.json')
+    if os.path.exists(info_file):
+        os.remove(info_file)
+    files = {name: open(os.path.join(folder, name + '.bin'), 'wb') for name in _columns + ['documents']}
+    vocab = []
+    vocab_ids = {}
+    tails = []
+    offsets = array('q', [0])
+    counts = collections.Counter()
+    has_empty_words = False
+    try:
+        for e in elements:
+            # a table of just this element, which shares the vocabulary of the whole store
+            table = TokenTable()
+            table.vocab = vocab
+            table.vocab_ids = vocab_ids
+            table._add_element(e)
+            has_empty_words = has_empty_words or table.has_empty_words
+            for name in _columns:
+                column = getattr(table, name)
+                if name.endswith('_starts') or name.endswith('_ends'):
+                    column = array('i', (row + counts['words'] for row in column))
+                _write_column(files[name], column)
+            for name in ['words', 'sentence_starts', 'document_starts']:
+                counts[name] += len(getattr(table, name))
+            data = snapshot.to_snapshot_bytes(e)
+            files['documents'].write(data)
+            offsets.append(offsets[-1] + len(data))
+            tails.append(e.tail)
+    finally:
+        for f in files.values():
+            f.close()
+    with open(os.path.join(folder, 'document_offsets.bin'), 'wb') as f:
+        _write_column(f, offsets)
+    with open(os.path.join(folder, 'vocab.bin'), 'wb') as f:
+        encoded = [s.encode('utf-8') for s in vocab]
+        f.write(_count.pack(len(encoded)))
+        _write_column(f, array('I', map(len, encoded)))
+        f.write(b''.join(encoded))
+    info = {
+        'format': _format,
+        'version': _version,
+        'words': counts['words'],
+        'sentences': counts['sentence_starts'],
+        'documents': counts['document_starts'],
+        'has_empty_words': has_empty_words,
+        'attributes': dict(shell.attrib),
+        'text': shell.text,
+        'tails': tails
+    }
+    with open(info_file, 'w', encoding='utf-8') as f:
+        json.dump(info, f)
+
+def _write_column(f, column: array) -> None:
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    column.tofile(f)
+
+def _read_vocab(filename: str) -> list:
+    with open(filename, 'rb') as f:
+        data = f.read()
+    (count,) = _count.unpack_from(data, 0)
+    lengths = array('I')
+    lengths.frombytes(data[_count.size:_count.size + count * lengths.itemsize])
+    if sys.byteorder == 'big':
+        lengths.byteswap()
+    position = _count.size + count * lengths.itemsize
+    vocab = []
+    for length in lengths:
+        vocab.append(data[position:position + length].decode('utf-8'))
+        position += length
+    return vocab
@@ -2,6 +2,8 @@ from corpusparser.corpus_element import CorpusElement
 from corpusparser.corpus import Corpus
 from corpusparser.sentence import Sentence
 from corpusparser.word import Word
+from corpusparser import snapshot
+from corpusparser import xml_writer
 import xml.etree.ElementTree as ET   
 import re
 
@@ -26,10 +28,15 @@ class Document(CorpusElement):
         new_e = ET.fromstring(text)
         return Document.create_from_element(new_e)
     
-    # create a document from a file
+    # create a document from a file, which may be compressed with gzip
     def create_from_xml_file(filename: str):
-        tree = ET.parse(filename)
+        with xml_writer.open_xml_file(filename) as f:
+            tree = ET.parse(f)
         return Document.create_from_element(tree.getroot())
+
+    # create a document from a snapshot file written by save_snapshot()
+    def load_snapshot(filename: str):
+        return Document.create_from_element(snapshot.read_snapshot(filename))
     
     # create a document from new
     def create_new():
@@ -39,101 +46,29 @@ class Document(CorpusElement):
     # create a document as a new object in the tree
     def append_new(parent, tag: str):
         new_e = ET.SubElement(parent.get_underlying_element(), tag)
-        return Document(new_e)
+        parent._touch(content=False)
+        return Document(new_e)._attach_to(parent)
 
     ##############################################################################
 
     # add the document to a corpus
     def add_to_corpus(self, corpus: Corpus):
-        corpus.get_underlying_element().append(self.get_underlying_element())
+        corpus.append(self.get_underlying_element())
 
     ##############################################################################
 
     # clone an existing document
-    def clone_document(self):
-        new_elem = self.clone_element()
+    # if a list of attribute names is given, only those attributes are copied
+    def clone_document(self, attributes=None):
+        new_elem = self.clone_element(attributes)
         return Document.create_from_element(new_elem)
 
     # create a document from a non-XML, or a non-standard XML file
     def create_from_nonstandard_file(filename:str, format:str):
 
         if format == 'colmep':
-
-            input_tree = ET.parse(filename)
             d = Document.create_new()
-
-            # traverse the input tree and copy corresponding (but adjusted) elements into our new Document
-
-            for elem in input_tree.getroot().iter():
-                # the iterator picks up the document element itself, so skip that
-                # however for simple documents the document's text may be actual text, so capture that
-                if elem.tag == 'document':
-                    if elem.text != None:
-                        text_elem = ET.SubElement(d.get_underlying_element(), 'text')
-                        text_elem.text = elem.text
-
-                else:
-                    # for each child item, copy the element and append it to the new document root
-                    new_elem = ET.SubElement(d.get_underlying_element(), elem.tag, elem.attrib)
-                    new_elem.text = elem.text
-
-                # if there is a tail, create a new <text> element using the tail text
-                if elem.tail != None:
-                    if elem.tail != '' and elem.tail != '\n':
-                        text_elem = ET.SubElement(d.get_underlying_element(), 'text')
-                        text_elem.text = elem.tail
-
-            # at this stage the XML is in an intermediate stage, we now need to convert to our document-word form
-            # set up current document, sentence and word
-            w = None
-
-            # clone the document and clear the original - it will be easier to copy across than to keep track of iterators
-            d_old = d.clone_document()
-            d.clear()
-
-            # iterate across the existing document
-            for elem in d_old.iter():
-                    
-                # if this is a text element
-                if elem.tag == 'text':
-
-                    # split the text into tokens based on whitespace
-                    tokens = elem.text.split()
-
-                    # iterate across each token
-                    for token in tokens:
-                        # add the token to the document as a w element
-                        # NB this will include punctuation elements
-
-                        # some words may still have punctuation attached at the beginning and end
-                        # these need to be removed from the word and stored as a separate element
-                        # check length is at least 2 to avoid single punctuation words
-                        puncs = [',', '?', '!', ':', ';', '/', '\'', '"', '¶']
-                        if len(token) > 1 and token[0] in puncs:
-                            w = ET.SubElement(d.get_underlying_element(), 'w')
-                            w.text = token[0]
-                            token = token[1:]
-                        
-                        post_punc = ''
-                        if len(token) > 1 and token[-1] in puncs:
-                            post_punc = token[-1]
-                            token = token[:-1]
-
-                        # create the actual word token
-                        w = ET.SubElement(d.get_underlying_element(), 'w')
-                        w.text = token
-
-                        if post_punc != '':
-                            w = ET.SubElement(d.get_underlying_element(), 'w')
-                            w.text = post_punc
-
-                # if this is a page, comment or footnote tag, copy it into the document
-                if elem.tag in ['newpage', 'newfolio', 'comment', 'footnote']:
-                    tag = ET.SubElement(d.get_underlying_element(), elem.tag)
-                    tag.text = elem.text
-                    attribs = elem.attrib.items()
-                    tag.attrib.update(attribs)
-
+            _import_colmep(filename, d.get_underlying_element())
             return d
         # end of colmep format
                     
@@ -144,13 +79,116 @@ class Document(CorpusElement):
         sent_elems = self.get_sentences_as_elements()
         sent_list = []
         for s in sent_elems:
-            sent_list.append(Sentence.create_from_element(s))
+            sent_list.append(Sentence.create_from_element(s)._attach_to(self))
         return sent_list
     
     def get_words(self) -> list:
         word_elems = self.get_words_as_elements()
         word_list = []
         for w in word_elems:
-            word_list.append(Word.create_from_element(w))
+            word_list.append(Word.create_from_element(w)._attach_to(self))
         return word_list
-    
\ No newline at end of file
+    
+
+
+##############################################################################
+# CoLMEP import
+##############################################################################
+
+# CoLMEP files are XML documents where the text is held as free text, interspersed
+# with page, comment and footnote tags, e.g.
+# <document><newpage pageno="1" /> The Prologue . As the philosopher ... </document>
+# the text is split on whitespace into <w> elements, and the page, comment and footnote
+# tags are copied across in the same position - all other tags are dropped
+
+# tags which are copied into the document
+_colmep_tags = {'newpage', 'newfolio', 'comment', 'footnote'}
+
+# punctuation which may be attached to the start or end of a token
+# a token is matched as: optional leading punctuation, the word, optional trailing punctuation
+# NB punctuation is only split off if something is left, so single punctuation tokens are kept whole
+_colmep_puncs = '[' + re.escape(',?!:;/\'"¶') + ']'
+_colmep_token_pattern = re.compile('(?:(' + _colmep_puncs + ')(?=.))?(.+?)(' + _colmep_puncs + ')?', re.DOTALL)
+
+# split a token into its leading punctuation, word and trailing punctuation
+def _split_colmep_token(token: str) -> tuple:
+    return tuple(part for part in _colmep_token_pattern.fullmatch(token).groups() if part is not None)
+
+# split a string of text into tokens and return a <w> element for each one
+# the split of each distinct token is remembered in split_cache, as most tokens occur many times
+def _colmep_words(text: str, split_cache: dict) -> list:
+    words = []
+    for token in text.split():
+        parts = split_cache.get(token)
+        if parts is None:
+            parts = split_cache[token] = _split_colmep_token(token)
+        for part in parts:
+            w = ET.Element('w')
+            w.text = part
+            words.append(w)
+    return words
+
+# read a CoLMEP file into the document element d in a single pass
+# the input is streamed with iterparse, and each input element is discarded once its text and
+# tail have been processed, so only the output document is held in memory
+# the output for each input element is, in order:
+# - its head - a copy of the element if it is a page, comment or footnote tag, or the words
+#   of its text if it is the document or a <text> tag
+# - the words of its tail
+# - the output for each of its child elements
+def _import_colmep(filename: str, d: ET.Element) -> None:
+    # a frame for each input element which is still open, or whose tail is not yet known
+    # each frame holds [element, head, output of the child elements]
+    stack = []
+    # an element's text is only complete once the next event has been read, and its
+    # tail once the event after its end has been read - so each is held back until then
+    pending_text = None
+    pending_tail = None
+    split_cache = {}
+
+    for event, elem in ET.iterparse(filename, events=('start', 'end')):
+        if pending_text is not None:
+            _add_colmep_text(pending_text, split_cache)
+            pending_text = None
+        if pending_tail is not None:
+            _add_colmep_tail(stack, split_cache)
+            pending_tail = None
+
+        if event == 'start':
+            head = []
+            if elem.tag in _colmep_tags:
+                head.append(ET.Element(elem.tag, elem.attrib))
+            pending_text = [elem, head, []]
+            stack.append(pending_text)
+        else:
+            pending_tail = elem
+
+    if pending_tail is not None:
+        _add_colmep_tail(stack, split_cache)
+    d.extend(stack[0][2])
+
+# process the text of an input element
+# the text of the document and of any <text> tags is split into words
+# the text of a copied tag is kept as the text of the copy
+def _add_colmep_text(frame: list, split_cache: dict) -> None:
+    elem, head = frame[0], frame[1]
+    if elem.tag == 'document' or elem.tag == 'text':
+        if elem.text != None:
+            head.extend(_colmep_words(elem.text, split_cache))
+    elif len(head) > 0:
+        head[0].text = elem.text
+
+# process the tail of the most recently ended input element, then pass its output to its parent
+# the output of the root element is held in an extra frame at the bottom of the stack
+def _add_colmep_tail(stack: list, split_cache: dict) -> None:
+    elem, head, children = stack.pop()
+    if len(stack) == 0:
+        stack.append([None, [], []])
+    output = stack[-1][2]
+    output.extend(head)
+    if elem.tail != None and elem.tail != '' and elem.tail != '\n':
+        output.extend(_colmep_words(elem.tail, split_cache))
+    output.extend(children)
+    # the input element is no longer needed
+    if stack[-1][0] is not None:
+        stack[-1][0].remove(elem)
@@ -0,0 +1,214 @@
+# A corpus of document files which are loaded only when they are needed
+# the corpus holds the names of the files, which can be standard format XML (optionally compressed
+# with gzip) or snapshots, and keeps the most recently used documents in memory
+# when there are more than max_documents, or they are estimated to take more than max_mb, the least
+# recently used document is dropped - if it has been changed, it is first written back to its file
+# whole-corpus queries load each document in turn, so the collection can be much larger than memory
+#
+# a document is counted as changed when it, or an element in it, is changed through the corpusparser
+# methods - if you change its elements directly, call mark_changed() on the document
+# a changed document is written to a new file in the same folder, which then replaces the old one, so the
+# document is not lost if writing fails - it is compressed if the old file was, whatever its name
+# NB a Document returned by get_document() must not be changed after it has been dropped, as the
+# changes would not be written back - ask for it again instead
+
+from corpusparser.corpus_element import _get_change_count, _get_elements_changed_since
+from corpusparser.corpus import _check_pipeline, _map_document, _count_document_words, _filter_frequency, _contains_changed
+from corpusparser.concordance import concordance_in_stream
+from corpusparser import snapshot
+from corpusparser import xml_writer
+import xml.etree.ElementTree as ET
+import collections
+import os
+import stat
+import tempfile
+
+# a rough size of a loaded element, with its text and attributes, used for max_mb
+_bytes_per_element = 150
+
+
+class LazyCorpus():
+
+    def __init__(self, paths: list, max_documents=8, max_mb=None) -> None:
+        self.paths = list(paths)
+        self.max_documents = max_documents
+        self.max_mb = max_mb
+        # the loaded documents, from least to most recently used
+        # index -> (element, change count when loaded or written, estimated size in bytes, True if compressed)
+        self.loaded = collections.OrderedDict()
+        self.loaded_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self.writes = 0
+
+    ##############################################################################
+    # Object creation methods
+
+    def create_from_files(paths: list, max_documents=8, max_mb=None):
+        return LazyCorpus(paths, max_documents, max_mb)
+
+    ##############################################################################
+    # Documents
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    # return a document, loading it from its file if it is not in memory
+    def get_document(self, index: int):
+        from corpusparser.document import Document
+        return Document.create_from_element(self._get_element(index))
+
+    # return each document in turn
+    def iter_documents(self):
+        for index in range(len(self.paths)):
+            yield self.get_document(index)
+
+    def is_loaded(self, index: int) -> bool:
+        return index in self.loaded
+
+    # True if a loaded document has been changed since it was loaded or last written
+    def is_changed(self, index: int) -> bool:
+        if index not in self.loaded:
+            return False
+        e, count, size, compressed = self.loaded[index]
+        if _get_change_count() == count:
+            return False
+        return _contains_changed(e, _get_elements_changed_since(count), count)
+
+    # write every changed document back to its file
+    def flush(self) -> None:
+        for index in list(self.loaded):
+            self._write_back(index)
+
+    # write back any changed documents, and drop all the documents from memory
+    def close(self) -> None:
+        self.flush()
+        self.loaded.clear()
+        self.loaded_bytes = 0
+
+    def get_stats(self) -> dict:
+        return {
+            'documents': len(self.paths),
+            'loaded': len(self.loaded),
+            'loaded_mb': self.loaded_bytes / 1000000,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'writes': self.writes
+        }
+
+    def _get_element(self, index: int) -> ET.Element:
+        if index < 0:
+            index += len(self.paths)
+        if not 0 <= index < len(self.paths):
+            raise IndexError('Corpus has no document ' + str(index))
+        if index in self.loaded:
+            self.loaded.move_to_end(index)
+            return self.loaded[index][0]
+        e, compressed = _load_file(self.paths[index])
+        self.loads += 1
+        size = _bytes_per_element * sum(1 for element in e.iter())
+        self.loaded[index] = (e, _get_change_count(), size, compressed)
+        self.loaded_bytes += size
+        # drop the least recently used documents, but always keep the one which has just been loaded
+        while len(self.loaded) > 1 and self._is_full():
+            self._evict(next(iter(self.loaded)))
+        return e
+
+    def _is_full(self) -> bool:
+        if self.max_documents is not None and len(self.loaded) > self.max_documents:
+            return True
+        return self.max_mb is not None and self.loaded_bytes > self.max_mb * 1000000
+
+    def _evict(self, index: int) -> None:
+        self._write_back(index)
+        e, count, size, compressed = self.loaded.pop(index)
+        self.loaded_bytes -= size
+        self.evictions += 1
+
+    def _write_back(self, index: int) -> None:
+        if not self.is_changed(index):
+            return
+        e, count, size, compressed = self.loaded[index]
+        path = self.paths[index]
+        folder, name = os.path.split(path)
+        handle, temporary = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=folder or '.')
+        os.close(handle)
+        try:
+            if snapshot.is_snapshot_file(path):
+                snapshot.write_snapshot(e, temporary)
+            else:
+                xml_writer.write_xml(e, temporary, compress=compressed)
+            # NB the new file is made readable only by its owner, so it is given the permissions of the old one
+            os.chmod(temporary, stat.S_IMODE(os.stat(path).st_mode))
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.loaded[index] = (e, _get_change_count(), size, compressed)
+        self.writes += 1
+
+    ##############################################################################
+    # Transforms
+
+    # run a pipeline of transforms on each document in turn - see Corpus.map_documents() for the steps
+    # the changed documents are written back when they are dropped, or by flush() or close()
+    # NB a function step may change the elements directly, so the document is counted as changed after it
+    # returns the time taken and any error for each document
+    def map_documents(self, pipeline: list) -> list:
+        _check_pipeline(pipeline)
+        report = []
+        for index in range(len(self.paths)):
+            document, seconds, memory, error = _map_document((self._get_element(index), pipeline, False))
+            report.append({'document': index, 'path': self.paths[index], 'seconds': seconds, 'error': error})
+            if error is not None:
+                print('Failed to transform ' + self.paths[index] + ': ' + error)
+        return report
+
+    ##############################################################################
+    # Queries - these give the same results as the Corpus methods of the same name
+
+    def count_words(self) -> int:
+        return sum(d.count_words() for d in self.iter_documents())
+    def count_sentences(self) -> int:
+        return sum(d.count_sentences() for d in self.iter_documents())
+    def count_documents(self) -> int:
+        return len(self.paths)
+
+    def get_sentence_lengths(self) -> list:
+        lengths = []
+        for d in self.iter_documents():
+            lengths.extend(d.get_sentence_lengths())
+        return lengths
+
+    def word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        counts = collections.Counter()
+        for index in range(len(self.paths)):
+            counts.update(_count_document_words(self._get_element(index))[1 if correctedText else 0])
+        return _filter_frequency(counts, pattern, ignoreCase)
+
+    def concordance(self, keyword: str, correctedText=False, separator='\t', context_length=25) -> list:
+        return self.concordance_in([keyword], correctedText, separator, context_length)
+
+    # NB as in a Corpus, the context of a hit runs on into the next or previous document
+    def concordance_in(self, keywords: list, correctedText=False, separator='\t', context_length=25) -> list:
+        words = (w for d in self.iter_documents() for w in d.get_words_as_text_list(correctedText))
+        return concordance_in_stream(words, lambda w: w.lower() in keywords, str, separator, context_length)
+
+    ##############################################################################
+
+    # load all the documents into one Corpus in memory
+    def to_corpus(self):
+        from corpusparser.corpus import Corpus
+        c = Corpus.create_new()
+        for d in self.iter_documents():
+            c.append(d.clone_document().get_underlying_element())
+        return c
+
+
+# load a document file, returning (element, True if the file is compressed with gzip)
+def _load_file(path: str) -> tuple:
+    if snapshot.is_snapshot_file(path):
+        return (snapshot.read_snapshot(path), False)
+    compressed = xml_writer.is_compressed_file(path)
+    with xml_writer.open_xml_file(path) as f:
+        return (ET.parse(f).getroot(), compressed)
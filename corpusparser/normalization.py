@@ -0,0 +1,116 @@
+# A normalisation table maps each word form in a vocabulary to its corrected spelling
+# it is built once from a spelling rule file, saved to disk, and then applied to any
+# Document or Corpus by looking up each word, rather than running the rules again
+# the table records a fingerprint of the rule file it was built from, so it can be
+# rebuilt automatically when the rules change
+
+from corpusparser.spelling import SpellingRules
+import xml.etree.ElementTree as ET
+import hashlib
+import json
+import os
+
+
+class NormalizationTable():
+
+    def __init__(self, rules: list, fingerprint: str, forms: dict) -> None:
+        self.rules = rules
+        self.fingerprint = fingerprint
+        # corrected form of each word, or None if the rules do not change it
+        self.forms = forms
+        # the compiled rules are only needed for forms which are not in the table
+        self.spelling_rules = None
+
+    ##############################################################################
+    # Object creation methods
+
+    # build a table from a spelling rule file and a vocabulary
+    # the vocabulary can be a list of word forms, a CorpusElement, or the name of a
+    # word frequency file with one 'form#count' entry per line
+    def create_from_rules(rules_file: str, vocabulary):
+        with open(rules_file, 'rb') as f:
+            data = f.read()
+        rules = json.loads(data)['spellings']
+        table = NormalizationTable(rules, _fingerprint(data), {})
+        for form in _vocabulary_forms(vocabulary):
+            table.lookup(form)
+        return table
+
+    # load a table previously saved to file
+    def create_from_file(filename: str):
+        with open(filename, encoding='utf-8') as f:
+            data = json.load(f)
+        return NormalizationTable(data['rules'], data['fingerprint'], data['forms'])
+
+    # load a saved table if it was built from the current rule file, otherwise build
+    # a new table and save it
+    def load_or_create(filename: str, rules_file: str, vocabulary):
+        if os.path.exists(filename):
+            table = NormalizationTable.create_from_file(filename)
+            if table.is_current(rules_file):
+                return table
+        table = NormalizationTable.create_from_rules(rules_file, vocabulary)
+        table.save(filename)
+        return table
+
+    ##############################################################################
+
+    # write the table to file
+    def save(self, filename: str) -> None:
+        data = {'fingerprint': self.fingerprint, 'rules': self.rules, 'forms': self.forms}
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    # check whether the table was built from the current version of a rule file
+    def is_current(self, rules_file: str) -> bool:
+        with open(rules_file, 'rb') as f:
+            return _fingerprint(f.read()) == self.fingerprint
+
+    # return the corrected form of a word which has no existing 'so' attribute
+    # forms which are not yet in the table are corrected with the rules and added
+    def lookup(self, text: str) -> str:
+        if text in self.forms:
+            return self.forms[text]
+        corrected = self.correct(text)
+        self.forms[text] = corrected
+        return corrected
+
+    # apply the rules directly, as for SpellingRules.correct
+    def correct(self, text: str, so=None) -> str:
+        if self.spelling_rules is None:
+            self.spelling_rules = SpellingRules(self.rules)
+        return self.spelling_rules.correct(text, so)
+
+    # set the 'so' attribute of every word in an element (or CorpusElement)
+    # the result is the same as applying the rule file with update_spellings_from_file
+    def apply(self, e) -> None:
+        if not isinstance(e, ET.Element):
+            e = e.get_underlying_element()
+        for w in e.iter('w'):
+            so = w.get('so')
+            if so is None:
+                if w.text is None:
+                    continue
+                corrected = self.lookup(w.text)
+            else:
+                # words which have already been corrected are not in the table
+                corrected = self.correct(w.text, so)
+            if corrected is not None and corrected != so:
+                w.set('so', corrected)
+
+
+def _fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+# return the word forms in a vocabulary
+def _vocabulary_forms(vocabulary):
+    if isinstance(vocabulary, str):
+        with open(vocabulary, encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line != '':
+                    yield line.rsplit('#', 1)[0]
+    elif hasattr(vocabulary, 'get_words_as_text_list'):
+        yield from vocabulary.get_words_as_text_list()
+    else:
+        yield from vocabulary
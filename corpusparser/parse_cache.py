@@ -0,0 +1,91 @@
+# A persistent cache of parse strings, stored in an SQLite database
+# entries are keyed by a hash of the normalised sentence text, whether the corrected
+# text was used, and the parser model - so re-parsing a document after a spelling
+# change only sends the sentences which have actually changed to the parser
+# the cache holds at most max_entries parses; the least recently used are removed first
+
+import hashlib
+import sqlite3
+import unicodedata
+
+
+class ParseCache():
+
+    def __init__(self, filename: str, max_entries=100000) -> None:
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db = sqlite3.connect(filename)
+        self.db.execute('CREATE TABLE IF NOT EXISTS parses (key TEXT PRIMARY KEY, parse TEXT NOT NULL, last_used INTEGER NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)')
+        # last_used is a counter rather than a time, so the order of use is exact
+        self.clock = self.db.execute('SELECT COALESCE(MAX(last_used), 0) FROM parses').fetchone()[0]
+        self.size = self.db.execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+
+    # build the key for a sentence - whitespace and unicode normalisation are applied to the
+    # text, so that trivially different strings share a cache entry
+    def make_key(self, text: str, correctedText: bool, model: str) -> str:
+        text = unicodedata.normalize('NFC', ' '.join(text.split()))
+        key = model + '\0' + ('1' if correctedText else '0') + '\0' + text
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    # return the cached parse string, or None if the sentence has not been parsed before
+    def get(self, text: str, correctedText: bool, model: str) -> str:
+        key = self.make_key(text, correctedText, model)
+        row = self.db.execute('SELECT parse FROM parses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        self.db.execute('UPDATE parses SET last_used = ? WHERE key = ?', (self.clock, key))
+        return row[0]
+
+    # store a parse string, removing the least recently used entries if the cache is full
+    def put(self, text: str, correctedText: bool, model: str, parse: str) -> None:
+        key = self.make_key(text, correctedText, model)
+        self.clock += 1
+        cursor = self.db.execute('INSERT OR REPLACE INTO parses (key, parse, last_used) VALUES (?, ?, ?)', (key, parse, self.clock))
+        # NB for an INSERT OR REPLACE, rowcount is 1 whether or not the key already existed
+        # so check the count of entries directly when the cache may be full
+        self.size += cursor.rowcount
+        if self.size > self.max_entries:
+            self.size = self.db.execute('SELECT COUNT(*) FROM parses').fetchone()[0]
+            excess = self.size - self.max_entries
+            if excess > 0:
+                self.db.execute('DELETE FROM parses WHERE key IN (SELECT key FROM parses ORDER BY last_used LIMIT ?)', (excess,))
+                self.evictions += excess
+                self.size -= excess
+
+    # write any pending changes to disk
+    def flush(self) -> None:
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+    # empty the cache
+    def clear(self) -> None:
+        self.db.execute('DELETE FROM parses')
+        self.db.commit()
+        self.size = 0
+
+    # hit and miss statistics since the cache was opened
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            'entries': self.size,
+        }
+
+    def print_stats(self) -> None:
+        stats = self.get_stats()
+        print('Parse cache:', stats['hits'], 'hits,', stats['misses'], 'misses',
+              '(' + str(round(stats['hit_rate'] * 100)) + '% hit rate),',
+              stats['evictions'], 'evictions,', stats['entries'], 'entries')
@@ -0,0 +1,231 @@
+# Parser backends used by Sentence.parse and CorpusElement.transform_parse
+# a backend turns the text of a sentence into a bracketed parse string, e.g.
+# (S (NP (DT The) (NN man)) (VP (VBD ran)))
+# the heavy NLP libraries (spaCy, benepar) are only imported when a backend is
+# first used, so that 'import corpusparser' stays cheap for non-parsing work
+
+import multiprocessing
+
+# maximum sentence length for the parser is 512 characters
+MAX_PARSE_LENGTH = 512
+
+
+##############################################################################
+# Backends
+##############################################################################
+
+class ParserBackend():
+
+    # the name the backend is registered under
+    name = None
+
+    def __init__(self, **options) -> None:
+        self.options = options
+        self.loaded = False
+
+    # load any models - subclasses should override this
+    def load(self) -> None:
+        pass
+
+    # load the backend, if this has not already been done
+    def ensure_loaded(self) -> None:
+        if not self.loaded:
+            self.load()
+            self.loaded = True
+
+    # a string which identifies the model in use - this is part of the key for cached parses
+    # so it should change whenever the parser would give a different result
+    def get_model_version(self) -> str:
+        return self.name
+
+    # parse a single sentence and return the parse string
+    def parse(self, text: str) -> str:
+        raise NotImplementedError
+
+    # parse a sequence of sentences, yielding the parse strings in the same order
+    # backends which can process a batch more efficiently should override this
+    def pipe(self, texts, batch_size=64):
+        for text in texts:
+            yield self.parse(text)
+
+
+class BeneparBackend(ParserBackend):
+
+    # NB need to run the following commands in the terminal before using this backend
+    # pip3 install benepar
+    # python3 -m spacy download en_core_web_md
+
+    name = 'benepar'
+
+    def __init__(self, spacy_model='en_core_web_md', benepar_model='benepar_en3') -> None:
+        super().__init__(spacy_model=spacy_model, benepar_model=benepar_model)
+        self.spacy_model = spacy_model
+        self.benepar_model = benepar_model
+        self.nlp = None
+
+    def load(self) -> None:
+        import benepar, spacy
+        benepar.download(self.benepar_model)
+        self.nlp = spacy.load(self.spacy_model)
+        self.nlp.add_pipe('benepar', config={'model': self.benepar_model})
+
+    # NB the versions are read from the installed package metadata, so the models are not loaded
+    def get_model_version(self) -> str:
+        versions = []
+        for package in ['spacy', self.spacy_model, 'benepar']:
+            version = _get_package_version(package)
+            versions.append(package if version is None else package + '-' + version)
+        return self.name + ':' + '/'.join(versions) + '/' + self.benepar_model
+
+    def parse(self, text: str) -> str:
+        self.ensure_loaded()
+        doc = self.nlp(text)
+        sent = list(doc.sents)[0]
+        return sent._.parse_string
+
+    def pipe(self, texts, batch_size=64):
+        self.ensure_loaded()
+        for doc in self.nlp.pipe(texts, batch_size=batch_size):
+            sent = list(doc.sents)[0]
+            yield sent._.parse_string
+
+
+class StubBackend(ParserBackend):
+
+    # a lightweight backend for tests - no models are loaded
+    # every token is tagged with the same POS type directly under the sentence, e.g.
+    # (S (XX The) (XX man) (XX ran))
+
+    name = 'stub'
+
+    def __init__(self, pos='XX') -> None:
+        super().__init__(pos=pos)
+        self.pos = pos
+
+    def get_model_version(self) -> str:
+        return self.name + ':' + self.pos
+
+    def parse(self, text: str) -> str:
+        items = []
+        for token in text.split():
+            # brackets are escaped as they would be by a real parser
+            token = token.replace('(', '-LRB-').replace(')', '-RRB-')
+            items.append('(' + self.pos + ' ' + token + ')')
+        return '(S ' + ' '.join(items) + ')'
+
+
+# the installed version of a package, or None if it is not installed
+# NB importlib.metadata is new in Python 3.8, so on 3.7 the version is read with pkg_resources instead
+def _get_package_version(package: str) -> str:
+    try:
+        import importlib.metadata
+    except ImportError:
+        try:
+            import pkg_resources
+            return pkg_resources.get_distribution(package).version
+        except Exception:
+            return None
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+##############################################################################
+# Backend registry
+##############################################################################
+
+_backends = {
+    'benepar': BeneparBackend,
+    'stub': StubBackend,
+}
+
+# the backend used for parsing - created the first time it is needed
+_current_backend = None
+
+# make a new backend class available by name
+def register_parser_backend(name: str, backend_class) -> None:
+    _backends[name] = backend_class
+
+# choose the backend used for parsing, with any options for that backend
+# NB the backend is not loaded until the first sentence is parsed
+def set_parser_backend(name: str, **options) -> ParserBackend:
+    global _current_backend
+    if name not in _backends:
+        raise ValueError('Unknown parser backend: ' + name)
+    _current_backend = _backends[name](**options)
+    return _current_backend
+
+# retrieve the backend used for parsing - by default this is benepar
+def get_parser_backend() -> ParserBackend:
+    if _current_backend is None:
+        set_parser_backend('benepar')
+    return _current_backend
+
+
+##############################################################################
+# Batch parsing
+##############################################################################
+
+# parse a list of sentence texts in batches
+# yields (index, parse string) pairs, where index is the position of the text in the list
+# when sorted by length, sentences of a similar length are batched together, which
+# reduces the padding work done by the parser - NB this means the results are not
+# yielded in the original order
+def parse_in_batches(texts: list, batch_size=64, sort_by_length=True):
+    backend = get_parser_backend()
+    order = list(range(len(texts)))
+    if sort_by_length:
+        order.sort(key=lambda i: len(texts[i]))
+    parses = backend.pipe((texts[i] for i in order), batch_size)
+    for i, parse in zip(order, parses):
+        yield i, parse
+
+
+##############################################################################
+# Parallel parsing
+##############################################################################
+
+# parse a list of sentence texts across a pool of worker processes
+# yields (index, parse string) pairs as each batch is completed, so the results
+# are not in the original order - the parse string is None if the parser failed
+# each worker loads the current backend once, when it starts - NB on platforms which
+# fork new processes an already loaded backend is inherited rather than loaded again
+# backends added with register_parser_backend() must be registered at import time
+# to be available on platforms which do not fork (e.g. Windows, macOS)
+def parse_in_pool(texts: list, workers: int, batch_size=64, sort_by_length=True):
+    backend = get_parser_backend()
+    order = list(range(len(texts)))
+    if sort_by_length:
+        order.sort(key=lambda i: len(texts[i]))
+    # each batch of sentences is a single task for a worker
+    batches = []
+    for start in range(0, len(order), batch_size):
+        batches.append([(i, texts[i]) for i in order[start:start + batch_size]])
+    with multiprocessing.Pool(workers, _init_worker, (backend.name, backend.options)) as pool:
+        for results in pool.imap_unordered(_parse_batch, batches):
+            for i, parse in results:
+                yield i, parse
+
+# load the backend in a worker process
+def _init_worker(name: str, options: dict) -> None:
+    backend = get_parser_backend()
+    if backend.name != name or backend.options != options:
+        backend = set_parser_backend(name, **options)
+    backend.ensure_loaded()
+
+# parse a batch of (index, text) pairs in a worker process
+# if the batch fails, parse each sentence separately so that only the failing sentences are lost
+def _parse_batch(batch: list) -> list:
+    backend = get_parser_backend()
+    try:
+        parses = list(backend.pipe([text for i, text in batch], len(batch)))
+        return [(batch[n][0], parses[n]) for n in range(len(batch))]
+    except Exception:
+        results = []
+        for i, text in batch:
+            try:
+                results.append((i, backend.parse(text)))
+            except Exception:
+                results.append((i, None))
+        return results
@@ -0,0 +1,401 @@
+# A query engine for sequences of words, using a subset of the CQL query language
+# e.g. [so="ye"] [pos="VB.*"] finds 'ye' (corrected spelling) followed by a verb
+# each word is described by constraints on its attributes, in square brackets:
+#   text    the original text of the word (word is also accepted)
+#   so      the corrected text of the word, or the original text if it has not been corrected
+#   pos     the POS type of the word
+# values are regular expressions which must match the whole attribute, and %c after the
+# value ignores case, e.g. [text="the"%c]
+# constraints are combined with & (and), | (or), ! (not) and brackets, and != means does not match
+# [] matches any word, and "ye" is short for [text="ye"]
+# a word can be followed by ? (optional), * (any number), + (one or more), {n}, {m,n} or {m,}
+# matches do not cross sentence boundaries, or document boundaries if there are no sentences
+# where a match could be more than one length, the longest is taken, and matches do not overlap
+#
+# the query is answered from a WordIndex - candidate matches are found from the positions of
+# the most selective word in the query, and only those are checked
+
+from corpusparser.word_index import WordIndex
+from corpusparser.concordance import Concordance
+import bisect
+import re
+
+_attributes = {'text': 'text', 'word': 'text', 'so': 'so', 'pos': 'pos'}
+
+_token_pattern = re.compile(r'''
+    \s*(?:
+      (?P<string>"(?:[^"\\]|\\.)*")(?P<flags>%c)?
+    | (?P<repeat>\{(?P<min>\d*)(?P<comma>,?)(?P<max>\d*)\})
+    | (?P<name>[A-Za-z_]+)
+    | (?P<op>!=|[\[\]()&|!=?*+])
+    )''', re.VERBOSE)
+
+
+class Query():
+
+    # items is a list of (constraint, minimum, maximum) - the number of words each item matches
+    # the maximum is None if there is no limit
+    def __init__(self, items: list, text='') -> None:
+        self.items = items
+        self.text = text
+
+    ##############################################################################
+    # Object creation methods
+
+    # parse a query string - raises ValueError if it is not valid
+    def create_from_string(text: str):
+        return Query(_QueryParser(text).parse(), text)
+
+    ##############################################################################
+
+    # find every match in the words of an index
+    # returns a Concordance, with one hit for each match
+    def find(self, index: WordIndex) -> Concordance:
+        table = index.table
+        total = len(table.words)
+        tests = [constraint.compile(index) for constraint, minimum, maximum in self.items]
+        # matches stay within sentences if there are any, otherwise documents
+        if len(table.sentence_starts) > 0:
+            limit_starts, limit_ends = table.sentence_starts, table.sentence_ends
+        elif len(table.document_starts) > 0:
+            limit_starts, limit_ends = table.document_starts, table.document_ends
+        else:
+            limit_starts, limit_ends = None, None
+        starts = []
+        ends = []
+        last_end = 0
+        # the result of matching each item at each row, within each limit
+        memo = {}
+        for start in self._candidate_rows(index, limit_starts):
+            if start < last_end:
+                continue
+            if limit_starts is None:
+                limit = total
+            else:
+                i = bisect.bisect_right(limit_starts, start) - 1
+                if i < 0 or start >= limit_ends[i]:
+                    continue
+                limit = limit_ends[i]
+            end = _match(self.items, tests, 0, start, limit, memo)
+            if end > start:
+                starts.append(index.get_position(start))
+                ends.append(index.get_position(end))
+                last_end = end
+            elif end < 0 and self.items[0][2] is None:
+                # if the first item can repeat any number of times, a match starting later in a run of
+                # words which it matches would also give a match from here - so none of them can match
+                while start < limit and tests[0](start):
+                    start += 1
+                last_end = start
+        return Concordance(index, starts, ends, correctedText=False)
+
+    # the sorted rows at which a match could start
+    # if a word which must occur has a constraint which can be looked up in the index, matches can
+    # only start a fixed distance before its rows - or anywhere before them in the same sentence, if
+    # the words before it have no limit on their length
+    # otherwise every row must be checked
+    def _candidate_rows(self, index: WordIndex, limit_starts):
+        best = None
+        before_min = 0
+        before_max = 0
+        for constraint, minimum, maximum in self.items:
+            if minimum > 0:
+                estimate = constraint.estimate(index)
+                if estimate is not None and (best is None or estimate < best[0]):
+                    best = (estimate, constraint, before_min, before_max)
+            before_min += minimum
+            if before_max is not None:
+                before_max = None if maximum is None else before_max + maximum
+        if best is None:
+            return range(len(index.table.words))
+        estimate, constraint, before_min, before_max = best
+        rows = constraint.rows(index)
+        if before_max == 0:
+            return rows
+        starts = set()
+        for row in rows:
+            if before_max is not None:
+                first = max(0, row - before_max)
+            elif limit_starts is not None:
+                first = limit_starts[max(0, bisect.bisect_right(limit_starts, row) - 1)]
+            else:
+                first = 0
+            starts.update(range(first, row - before_min + 1))
+        return sorted(starts)
+
+
+# return the end of the longest match of items[i:] starting at row, or -1 if there is none
+def _match(items: list, tests: list, i: int, row: int, limit: int, memo: dict) -> int:
+    if i == len(items):
+        return row
+    key = (i, row, limit)
+    if key not in memo:
+        memo[key] = _match_item(items, tests, i, row, limit, memo)
+    return memo[key]
+
+# try each number of repeats of items[i], longest first
+def _match_item(items: list, tests: list, i: int, row: int, limit: int, memo: dict) -> int:
+    constraint, minimum, maximum = items[i]
+    test = tests[i]
+    most = limit - row if maximum is None else min(maximum, limit - row)
+    count = 0
+    while count < most and test(row + count):
+        count += 1
+    while count >= minimum:
+        end = _match(items, tests, i + 1, row + count, limit, memo)
+        if end >= 0:
+            return end
+        count -= 1
+    return -1
+
+
+##############################################################################
+# Constraints
+##############################################################################
+
+# each constraint can be compiled into a test for a row of the token table
+# estimate() returns an upper limit on the number of rows which match, or None if the
+# constraint cannot be looked up in the index (e.g. it is a negation) - in which case
+# rows() is not called
+
+class _AnyConstraint():
+
+    def compile(self, index: WordIndex):
+        return lambda row: True
+    def estimate(self, index: WordIndex) -> int:
+        return None
+
+
+class _AttributeConstraint():
+
+    def __init__(self, attribute: str, pattern: str, ignoreCase: bool, negated: bool) -> None:
+        self.attribute = attribute
+        try:
+            self.pattern = re.compile(pattern, flags=re.IGNORECASE if ignoreCase else 0)
+        except re.error as err:
+            raise ValueError('Invalid regular expression in query: ' + pattern + ' (' + str(err) + ')')
+        self.negated = negated
+        # the ids are found once for each index
+        self.index = None
+        self.ids = None
+
+    # the ids of the strings in the vocabulary which match the pattern
+    def get_ids(self, index: WordIndex) -> set:
+        if self.index is not index:
+            match = self.pattern.fullmatch
+            self.ids = {id for id, form in enumerate(index.table.vocab) if match(form)}
+            self.index = index
+        return self.ids
+
+    def compile(self, index: WordIndex):
+        column = index.get_table_column(self.attribute)
+        ids = self.get_ids(index)
+        if self.negated:
+            return lambda row: column[row] not in ids
+        return lambda row: column[row] in ids
+
+    def estimate(self, index: WordIndex) -> int:
+        if self.negated:
+            return None
+        postings = index.get_row_postings(self.attribute)
+        return sum(len(postings[id]) for id in self.get_ids(index) if id in postings)
+
+    def rows(self, index: WordIndex):
+        postings = index.get_row_postings(self.attribute)
+        ids = [id for id in self.get_ids(index) if id in postings]
+        if len(ids) == 1:
+            return postings[ids[0]]
+        return sorted(row for id in ids for row in postings[id])
+
+
+class _AndConstraint():
+
+    def __init__(self, parts: list) -> None:
+        self.parts = parts
+
+    def compile(self, index: WordIndex):
+        tests = [part.compile(index) for part in self.parts]
+        return lambda row: all(test(row) for test in tests)
+
+    # the rows of the most selective part are enough, as every part must match
+    def estimate(self, index: WordIndex) -> int:
+        estimates = [e for e in (part.estimate(index) for part in self.parts) if e is not None]
+        return min(estimates) if len(estimates) > 0 else None
+
+    def rows(self, index: WordIndex):
+        best = None
+        for part in self.parts:
+            estimate = part.estimate(index)
+            if estimate is not None and (best is None or estimate < best[0]):
+                best = (estimate, part)
+        return best[1].rows(index)
+
+
+class _OrConstraint():
+
+    def __init__(self, parts: list) -> None:
+        self.parts = parts
+
+    def compile(self, index: WordIndex):
+        tests = [part.compile(index) for part in self.parts]
+        return lambda row: any(test(row) for test in tests)
+
+    # the rows of every part are needed
+    def estimate(self, index: WordIndex) -> int:
+        estimates = [part.estimate(index) for part in self.parts]
+        return None if None in estimates else sum(estimates)
+
+    def rows(self, index: WordIndex):
+        rows = set()
+        for part in self.parts:
+            rows.update(part.rows(index))
+        return sorted(rows)
+
+
+class _NotConstraint():
+
+    def __init__(self, part) -> None:
+        self.part = part
+
+    def compile(self, index: WordIndex):
+        test = self.part.compile(index)
+        return lambda row: not test(row)
+    def estimate(self, index: WordIndex) -> int:
+        return None
+
+
+##############################################################################
+# Parser
+##############################################################################
+
+class _QueryParser():
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _token_pattern.match(text, position)
+            if match is None:
+                self.error('unexpected character at position ' + str(position))
+            self.tokens.append(match)
+            position = match.end()
+        self.position = 0
+
+    def error(self, message: str) -> None:
+        raise ValueError('Invalid query "' + self.text + '": ' + message)
+
+    def peek(self) -> str:
+        if self.position < len(self.tokens):
+            match = self.tokens[self.position]
+            for kind in ['op', 'string', 'repeat', 'name']:
+                if match.group(kind) is not None:
+                    return match.group(kind) if kind == 'op' else kind
+        return None
+
+    def next(self):
+        match = self.tokens[self.position]
+        self.position += 1
+        return match
+
+    def expect(self, op: str) -> None:
+        if self.peek() != op:
+            self.error('expected ' + op)
+        self.next()
+
+    # query := item+
+    def parse(self) -> list:
+        items = []
+        while self.peek() is not None:
+            items.append(self.parse_item())
+        if len(items) == 0:
+            self.error('the query is empty')
+        return items
+
+    # item := ( '[' constraint? ']' | string ) repeat?
+    def parse_item(self) -> tuple:
+        if self.peek() == '[':
+            self.next()
+            if self.peek() == ']':
+                constraint = _AnyConstraint()
+            else:
+                constraint = self.parse_or()
+            self.expect(']')
+        elif self.peek() == 'string':
+            constraint = self.parse_value('text', False)
+        else:
+            self.error('expected [ or a string')
+        minimum, maximum = self.parse_repeat()
+        return (constraint, minimum, maximum)
+
+    # repeat := '?' | '*' | '+' | '{' m? ','? n? '}'
+    def parse_repeat(self) -> tuple:
+        op = self.peek()
+        if op == '?':
+            self.next()
+            return (0, 1)
+        if op == '*':
+            self.next()
+            return (0, None)
+        if op == '+':
+            self.next()
+            return (1, None)
+        if op == 'repeat':
+            match = self.next()
+            minimum = int(match.group('min')) if match.group('min') != '' else 0
+            if match.group('comma') == '':
+                if match.group('min') == '':
+                    self.error('expected a number in {}')
+                return (minimum, minimum)
+            maximum = int(match.group('max')) if match.group('max') != '' else None
+            if maximum is not None and maximum < minimum:
+                self.error('the maximum is less than the minimum in ' + match.group('repeat'))
+            return (minimum, maximum)
+        return (1, 1)
+
+    # or := and ( '|' and )*
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek() == '|':
+            self.next()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else _OrConstraint(parts)
+
+    # and := unary ( '&' unary )*
+    def parse_and(self):
+        parts = [self.parse_unary()]
+        while self.peek() == '&':
+            self.next()
+            parts.append(self.parse_unary())
+        return parts[0] if len(parts) == 1 else _AndConstraint(parts)
+
+    # unary := '!' unary | '(' or ')' | name ( '=' | '!=' ) string
+    def parse_unary(self):
+        op = self.peek()
+        if op == '!':
+            self.next()
+            return _NotConstraint(self.parse_unary())
+        if op == '(':
+            self.next()
+            constraint = self.parse_or()
+            self.expect(')')
+            return constraint
+        if op != 'name':
+            self.error('expected an attribute name')
+        name = self.next().group('name')
+        if name not in _attributes:
+            self.error('unknown attribute ' + name)
+        op = self.peek()
+        if op not in ['=', '!=']:
+            self.error('expected = or != after ' + name)
+        self.next()
+        if self.peek() != 'string':
+            self.error('expected a string after ' + name + op)
+        return self.parse_value(_attributes[name], op == '!=')
+
+    # string := '"' regex '"' '%c'?
+    def parse_value(self, attribute: str, negated: bool):
+        match = self.next()
+        pattern = match.group('string')[1:-1].replace('\\"', '"')
+        return _AttributeConstraint(attribute, pattern, match.group('flags') is not None, negated)
@@ -0,0 +1,61 @@
+# Read the sentences or words of a standard format file one at a time, without loading the whole document
+# the file is read with iterparse, and each element is removed from the tree once it has been read, so
+# memory use stays the same however large the file is
+# the sentences and words are the same, in the same order, as get_sentences_as_elements() and
+# get_words_as_elements() on the whole document, and as text they are the same as
+# get_sentences_as_text_list() and get_words_as_text_list()
+
+from corpusparser.sentence import Sentence
+from corpusparser.word import Word
+from corpusparser import xml_writer
+import xml.etree.ElementTree as ET
+
+
+# yield each sentence in a file as a Sentence, or as the text of its words if as_text is True
+def iter_sentences(filename: str, as_text=False, correctedText=False):
+    for s in _iter_elements(filename, 's'):
+        if as_text:
+            yield ' '.join(_word_texts(s, correctedText))
+        else:
+            yield Sentence.create_from_element(s)
+
+# yield each word in a file as a Word, or as its text if as_text is True
+# NB as with get_words_as_text_list(), words with no text are left out of the text
+def iter_words(filename: str, as_text=False, correctedText=False):
+    for w in _iter_elements(filename, 'w'):
+        if not as_text:
+            yield Word.create_from_element(w)
+        elif w.text is not None:
+            yield w.get('so', w.text) if correctedText else w.text
+
+
+# yield each element with a tag, in document order, and remove everything from the tree once it has been read
+# an element is yielded once it has been read completely - if it contains elements with the same tag, they
+# are yielded straight after it
+def _iter_elements(filename: str, tag: str):
+    with xml_writer.open_xml_file(filename) as f:
+        # the elements which have been started but not ended
+        stack = []
+        # the number of open elements with the tag - elements inside one are kept until it ends
+        open_count = 0
+        for event, e in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                stack.append(e)
+                if e.tag == tag:
+                    open_count += 1
+                continue
+            stack.pop()
+            if e.tag == tag:
+                open_count -= 1
+                if open_count == 0:
+                    yield from e.iter(tag)
+            if open_count == 0 and stack:
+                # the element is the only child left in its parent, as the ones before it have been removed
+                stack[-1].remove(e)
+
+def _word_texts(s: ET.Element, correctedText: bool) -> list:
+    texts = []
+    for w in s.iter('w'):
+        if w.text is not None:
+            texts.append(w.get('so', w.text) if correctedText else w.text)
+    return texts
@@ -1,18 +1,9 @@
 from corpusparser.corpus_element import CorpusElement
 from corpusparser.word import Word
+from corpusparser.parser import get_parser_backend, MAX_PARSE_LENGTH
 from collections import deque
 import xml.etree.ElementTree as ET   
 
-# NB need to run the following commands in the terminal before running this code
-# pip3 install benepar
-# python3 -m spacy download en_core_web_md
-
-import benepar, spacy
-
-# global variables
-nlp = None
-prepared = False
-
 # Sentence class represents a sentence in the text
 
 class Sentence(CorpusElement):
@@ -42,12 +33,13 @@ class Sentence(CorpusElement):
     # create a sentence as a new object in the tree
     def append_new(parent, tag: str):
         new_e = ET.SubElement(parent.get_underlying_element(), tag)
-        return Sentence(new_e)
+        parent._touch(content=False)
+        return Sentence(new_e)._attach_to(parent)
     
     # create a sentence from a specific index in a parent
     def create_from_parent_and_index(parent: CorpusElement, index: int):
         sent_e = parent.get_sentence_element_by_index(index)
-        return Sentence.create_from_element(sent_e)
+        return Sentence.create_from_element(sent_e)._attach_to(parent)
     
     ##############################################################################
 
@@ -55,7 +47,7 @@ class Sentence(CorpusElement):
         word_elems = self.get_words_as_elements()
         word_list = []
         for w in word_elems:
-            word_list.append(Word.create_from_element(w))
+            word_list.append(Word.create_from_element(w)._attach_to(self))
         return word_list
 
     def get_words_as_text(self, correctedText=False) -> str:
@@ -64,28 +56,33 @@ class Sentence(CorpusElement):
     ##############################################################################
     
     def prepare_parser(self) -> None:
-        global nlp
-        benepar.download('benepar_en3')
-        nlp = spacy.load('en_core_web_md')
-        nlp.add_pipe('benepar', config={'model': 'benepar_en3'})
-
-    def parse(self, correctedText=False, add_parse_string=False, restructure=False, id=None) -> bool:
-        # first check to see if we have prepared the parser
-        global prepared
-        if not prepared:
-            self.prepare_parser()
-            prepared = True
+        # the parser backend loads its models the first time it is used
+        # this can be called to load them in advance
+        get_parser_backend().ensure_loaded()
 
+    def parse(self, correctedText=False, add_parse_string=False, restructure=False, id=None, cache=None) -> bool:
         # get the text of the sentence    
         text = self.get_words_as_text(correctedText)
         # maximum sentence length for the parser is 512 characters
         # if we exceed this return failure
-        if len(text) > 512:
+        if len(text) > MAX_PARSE_LENGTH:
             return False
-        doc = nlp(text)
-        sent = list(doc.sents)[0]
-        parse = sent._.parse_string
+        # if there is a parse cache, check it before invoking the parser
+        backend = get_parser_backend()
+        parse = None
+        if cache is not None:
+            model = backend.get_model_version()
+            parse = cache.get(text, correctedText, model)
+        if parse is None:
+            parse = backend.parse(text)
+            if cache is not None:
+                cache.put(text, correctedText, model, parse)
+        self.apply_parse(parse, add_parse_string, restructure, id)
 
+        # return success
+        return True
+
+    def apply_parse(self, parse: str, add_parse_string=False, restructure=False, id=None) -> None:
         # save the parse string to the sentence if required
         # if the document has an ID, and the sentence has a number, add these to the parse string
         if add_parse_string:
@@ -99,9 +96,6 @@ class Sentence(CorpusElement):
         if restructure:
             self.restructure(parse)
 
-        # return success
-        return True
-
     def restructure(self, parse) -> None:
 
         # Copy all elements in the sentence to element_list
@@ -153,6 +147,10 @@ class Sentence(CorpusElement):
 
             # If it’s a word
             elif item.endswith(')'):
+                # Any non-words before the first word (e.g. a comment at the start of the sentence)
+                # are added to the current phrase, so they are not mistaken for the word
+                while len(element_list) > 0 and element_list[0].tag != 'w':
+                    phrase_stack[-1].append(element_list.popleft())
                 # Get the next word from element_list (we should be at a word, not a non-word)
                 if len(element_list) > 0:
                     word = element_list.popleft()
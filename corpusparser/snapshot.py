@@ -0,0 +1,237 @@
+# A compact binary snapshot of an element tree, which is much quicker to save and load than XML
+# every string in the tree (tags, attribute names and values, text and tails) is interned in a
+# string table, and the elements are held as columns of string ids in document order
+# a snapshot holds exactly what the XML model holds, including comments and processing instructions,
+# so loading a snapshot gives the same tree as parsing the XML it was saved from
+#
+# the file is:
+#   the magic bytes b'CPSNAP' and a version byte
+#   the string table - the number of strings, their lengths in UTF-8 bytes, then the UTF-8 bytes
+#   the columns, each one element per entry except the attributes column:
+#     tags - the string id of the tag, or COMMENT / PI
+#     children - the number of child elements
+#     texts, tails - the string id of the text and tail, or NONE
+#     attribute counts - the number of attributes
+#     attributes - the string ids of each name and value, for all elements in turn
+# each column is a type code (B, H or I - the smallest which holds its largest value), an unsigned
+# 32-bit count, and that many little-endian unsigned integers
+# string ids are stored with RESERVED added to them, so the ids used in place of a string are 0 to 2
+
+from array import array
+import xml.etree.ElementTree as ET
+import struct
+import sys
+
+_magic = b'CPSNAP'
+_version = 1
+
+# ids used in place of a string id
+NONE = 0
+COMMENT = 1
+PI = 2
+RESERVED = 3
+
+# the type codes of the columns, from the smallest - NB 'I' is 32 bits on all supported platforms
+_codes = ('B', 'H', 'I')
+_count = struct.Struct('<I')
+
+
+##############################################################################
+# Saving
+
+# return the snapshot of an element and all of its sub-elements as bytes
+def to_snapshot_bytes(e: ET.Element) -> bytes:
+    strings = []
+    ids = {}
+    tags = []
+    children = []
+    texts = []
+    tails = []
+    attribute_counts = []
+    attributes = []
+
+    # return the id of a string, adding it to the string table if it is new
+    def intern(text):
+        if text is None:
+            return NONE
+        id = ids.get(text)
+        if id is None:
+            id = len(strings) + RESERVED
+            strings.append(text)
+            ids[text] = id
+        return id
+
+    for element in e.iter():
+        tag = element.tag
+        if tag is ET.Comment:
+            tags.append(COMMENT)
+        elif tag is ET.PI:
+            tags.append(PI)
+        else:
+            tags.append(intern(tag))
+        children.append(len(element))
+        texts.append(intern(element.text))
+        tails.append(intern(element.tail))
+        attrib = element.attrib
+        attribute_counts.append(len(attrib))
+        for name, value in attrib.items():
+            attributes.append(intern(name))
+            attributes.append(intern(value))
+    # the tail of the top element is not part of its tree
+    tails[0] = NONE
+
+    encoded = [s.encode('utf-8') for s in strings]
+    parts = [_magic, bytes([_version])]
+    for column in ([len(s) for s in encoded], tags, children, texts, tails, attribute_counts, attributes):
+        parts.append(_pack_column(column))
+    parts.append(b''.join(encoded))
+    return b''.join(parts)
+
+# write the snapshot of an element to a file
+def write_snapshot(e: ET.Element, filename: str) -> None:
+    data = to_snapshot_bytes(e)
+    with open(filename, 'wb') as f:
+        f.write(data)
+
+
+##############################################################################
+# Loading
+
+# build the element tree held in a snapshot, and return its top element
+def from_snapshot_bytes(data: bytes) -> ET.Element:
+    if data[:len(_magic)] != _magic:
+        raise ValueError('Not a corpusparser snapshot')
+    if len(data) <= len(_magic) or data[len(_magic)] != _version:
+        raise ValueError('Unsupported snapshot version')
+    offset = len(_magic) + 1
+    columns = []
+    for i in range(7):
+        column, offset = _read_column(data, offset)
+        columns.append(column)
+    lengths, tags, children, texts, tails, attribute_counts, attributes = columns
+    if len(tags) == 0:
+        raise ValueError('Snapshot has no elements')
+    if not len(tags) == len(children) == len(texts) == len(tails) == len(attribute_counts):
+        raise ValueError('Snapshot columns are different lengths')
+
+    # decode all the strings at once, then cut them up by their lengths
+    blob = data[offset:]
+    if sum(lengths) != len(blob):
+        raise ValueError('Snapshot string table is the wrong length')
+    strings = [None] * RESERVED
+    text = blob.decode('utf-8')
+    position = 0
+    if len(text) == len(blob):
+        # all ASCII, so the lengths in bytes are also the lengths in characters
+        for length in lengths:
+            strings.append(text[position:position + length])
+            position += length
+    else:
+        for length in lengths:
+            strings.append(blob[position:position + length].decode('utf-8'))
+            position += length
+    if 2 * sum(attribute_counts) != len(attributes):
+        raise ValueError('Snapshot attributes do not match its elements')
+    for column in (tags, texts, tails, attributes):
+        if len(column) > 0 and max(column) >= len(strings):
+            raise ValueError('Snapshot refers to a string which is not in its string table')
+
+    texts = [strings[id] for id in texts]
+    tails = [strings[id] for id in tails]
+    # the top element is built first, so every other element can be added to its parent as it is built
+    root = _make_element(strings, tags[0], texts[0], None, attribute_counts[0], attributes, 0)
+    a = 2 * attribute_counts[0]
+    # the element which is being filled, the number of children it still has to come, and the
+    # same for each of its ancestors
+    parent = root
+    remaining = children[0]
+    stack = []
+    SubElement = ET.SubElement
+    names = [None if id < RESERVED else strings[id] for id in tags]
+    items = zip(tags, names, children, texts, tails, attribute_counts)
+    next(items)
+    for tag, name, count, text, tail, attribute_count in items:
+        if remaining == 0:
+            raise ValueError('Snapshot children do not match its elements')
+        if attribute_count == 0 and name is not None:
+            element = SubElement(parent, name)
+            element.text = text
+            element.tail = tail
+        else:
+            element = _make_element(strings, tag, text, tail, attribute_count, attributes, a)
+            a += 2 * attribute_count
+            parent.append(element)
+        remaining -= 1
+        if count:
+            stack.append((parent, remaining))
+            parent = element
+            remaining = count
+        else:
+            # go back up to the first ancestor which still has children to come
+            while remaining == 0 and stack:
+                parent, remaining = stack.pop()
+    if stack or remaining != 0:
+        raise ValueError('Snapshot children do not match its elements')
+    return root
+
+# read a snapshot file, and return its top element
+def read_snapshot(filename: str) -> ET.Element:
+    with open(filename, 'rb') as f:
+        data = f.read()
+    return from_snapshot_bytes(data)
+
+# True if a file is a snapshot
+def is_snapshot_file(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(len(_magic)) == _magic
+
+
+##############################################################################
+
+# build an element which has attributes, or is a comment or processing instruction
+# its attributes are the string ids in attributes from position a
+def _make_element(strings: list, tag: int, text: str, tail: str, attribute_count: int, attributes, a: int) -> ET.Element:
+    if tag == COMMENT:
+        element = ET.Comment()
+    elif tag == PI:
+        element = ET.PI(text)
+    elif tag >= RESERVED:
+        element = ET.Element(strings[tag])
+    else:
+        raise ValueError('Snapshot element has no tag')
+    for j in range(a, a + 2 * attribute_count, 2):
+        element.set(strings[attributes[j]], strings[attributes[j + 1]])
+    element.text = text
+    element.tail = tail
+    return element
+
+# a column as its type code, its length and its values in little-endian order
+def _pack_column(values: list) -> bytes:
+    largest = max(values, default=0)
+    for code in _codes:
+        column = array(code)
+        if largest < 1 << (8 * column.itemsize):
+            break
+    column.fromlist(values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return code.encode('ascii') + _count.pack(len(column)) + column.tobytes()
+
+# read a column, and return it with the offset after it
+def _read_column(data: bytes, offset: int) -> tuple:
+    code = chr(data[offset]) if offset < len(data) else ''
+    if code not in _codes:
+        raise ValueError('Snapshot is truncated or corrupt')
+    offset += 1
+    if offset + _count.size > len(data):
+        raise ValueError('Snapshot is truncated')
+    (count,) = _count.unpack_from(data, offset)
+    offset += _count.size
+    column = array(code)
+    end = offset + count * column.itemsize
+    if end > len(data):
+        raise ValueError('Snapshot is truncated')
+    column.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column, end
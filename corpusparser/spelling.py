@@ -0,0 +1,92 @@
+# Spelling rules - an ordered list of spelling updates, compiled once and applied to
+# every <w> element in a single pass
+# each rule is a dictionary in the same form as the spelling file, e.g.
+# {"match": "*", "replace": ""} or {"regex": true, "match": "v([bcdf].*)", "replace": "u\\1"}
+# the rules are applied in order, each one to the output of the last, and the result is
+# stored in the 'so' (standardised orthography) attribute of the word
+# most word forms occur many times, so the result for each distinct form is remembered
+
+import xml.etree.ElementTree as ET
+import json
+import re
+
+
+class SpellingRules():
+
+    def __init__(self, rules: list) -> None:
+        self.rules = [_compile_rule(rule) for rule in rules]
+        # results for each distinct word form, keyed on (text, existing 'so' value)
+        self.cache = {}
+
+    # create the rules from a JSON spelling file
+    def create_from_file(filename: str):
+        with open(filename) as f:
+            dict = json.load(f)
+        return SpellingRules(dict['spellings'])
+
+    # apply every rule, in order, to a single word form
+    # so is the word's existing 'so' attribute, if it has one
+    # returns the new value for the 'so' attribute, or None if no rule applied and there was none before
+    def correct(self, text: str, so=None) -> str:
+        key = (text, so)
+        if key in self.cache:
+            return self.cache[key]
+        for rule in self.rules:
+            # each rule applies to the corrected form if there is one, otherwise the original text
+            current = so if so is not None else text
+            if current is None:
+                break
+            corrected = rule(current)
+            if corrected is not None:
+                so = corrected
+        self.cache[key] = so
+        return so
+
+    # apply the rules to every word in the element
+    def apply(self, e: ET.Element) -> None:
+        for w in e.iter('w'):
+            so = w.get('so')
+            corrected = self.correct(w.text, so)
+            if corrected is not None and corrected != so:
+                w.set('so', corrected)
+
+
+##############################################################################
+# Compiled rules
+##############################################################################
+
+# a compiled rule is called with the current form of a word
+# if the rule matches it returns the corrected form, otherwise None
+
+class _PlainRule():
+
+    # a plain rule replaces every occurrence of the match string
+    def __init__(self, match: str, replace: str) -> None:
+        self.match = match
+        self.replace = replace
+
+    def __call__(self, text: str) -> str:
+        if self.match in text:
+            return text.replace(self.match, self.replace)
+        return None
+
+
+class _RegexRule():
+
+    # a regex rule applies if the pattern matches at the start of the word, ignoring case
+    # NB the substitution itself is case sensitive
+    def __init__(self, match: str, replace: str) -> None:
+        self.match = re.compile(match, flags=re.IGNORECASE)
+        self.pattern = re.compile(match)
+        self.replace = replace
+
+    def __call__(self, text: str) -> str:
+        if self.match.match(text):
+            return self.pattern.sub(self.replace, text)
+        return None
+
+
+def _compile_rule(rule: dict):
+    if 'regex' in rule and rule['regex']:
+        return _RegexRule(rule['match'], rule['replace'])
+    return _PlainRule(rule['match'], rule['replace'])
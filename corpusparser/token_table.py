@@ -0,0 +1,128 @@
+# A columnar view of the words in an element
+# each <w> element is a row in the table, in document order, and each column is a
+# compact array of integers - word forms and POS types are interned in a vocabulary,
+# so the columns hold ids rather than strings
+# sentences and documents are held as ranges of rows (start, end)
+# the table is a snapshot - if the tree is changed, the table must be rebuilt
+
+from array import array
+import xml.etree.ElementTree as ET
+import collections
+import re
+
+
+class TokenTable():
+
+    # id used in a column where a word has no text, or no POS type
+    NONE = -1
+
+    def __init__(self) -> None:
+        # interned strings - the id of a string is its index in vocab
+        self.vocab = []
+        self.vocab_ids = {}
+        # one entry per word
+        self.words = array('i')         # original text
+        self.corrected = array('i')     # corrected text ('so' attribute), or original text if none
+        self.pos = array('i')           # POS type ('pos' attribute)
+        # one entry per sentence / document - the range of words it contains
+        self.sentence_starts = array('i')
+        self.sentence_ends = array('i')
+        self.document_starts = array('i')
+        self.document_ends = array('i')
+        # True if any word has no text - these are counted, but left out of text lists
+        self.has_empty_words = False
+
+    ##############################################################################
+    # Object creation methods
+
+    # build the table from an element and all of its sub-elements
+    def create_from_element(e: ET.Element):
+        table = TokenTable()
+        table._add_element(e)
+        return table
+
+    ##############################################################################
+
+    # return the id of a string, adding it to the vocabulary if it is new
+    def intern(self, text: str) -> int:
+        if text is None:
+            return TokenTable.NONE
+        id = self.vocab_ids.get(text)
+        if id is None:
+            id = len(self.vocab)
+            self.vocab.append(text)
+            self.vocab_ids[text] = id
+        return id
+
+    # add the words, sentences and documents of an element to the table, in document order
+    def _add_element(self, e: ET.Element) -> None:
+        tag = e.tag
+        if tag == 'w':
+            word_id = self.intern(e.text)
+            self.words.append(word_id)
+            if word_id == TokenTable.NONE:
+                self.has_empty_words = True
+                self.corrected.append(word_id)
+            else:
+                so = e.get('so')
+                self.corrected.append(word_id if so is None else self.intern(so))
+            self.pos.append(self.intern(e.get('pos')))
+            for child in e:
+                self._add_element(child)
+        elif tag == 's':
+            index = len(self.sentence_starts)
+            self.sentence_starts.append(len(self.words))
+            self.sentence_ends.append(0)
+            for child in e:
+                self._add_element(child)
+            self.sentence_ends[index] = len(self.words)
+        elif tag == 'document':
+            index = len(self.document_starts)
+            self.document_starts.append(len(self.words))
+            self.document_ends.append(0)
+            for child in e:
+                self._add_element(child)
+            self.document_ends[index] = len(self.words)
+        else:
+            for child in e:
+                self._add_element(child)
+
+    ##############################################################################
+    # Queries - these give the same results as the CorpusElement methods of the same name
+
+    def count_words(self) -> int:
+        return len(self.words)
+    def count_sentences(self) -> int:
+        return len(self.sentence_starts)
+    def count_documents(self) -> int:
+        return len(self.document_starts)
+
+    # the column of word ids for the original or corrected text
+    def get_word_ids(self, correctedText=False) -> array:
+        if correctedText:
+            return self.corrected
+        return self.words
+
+    def get_words_as_text_list(self, correctedText=False) -> list:
+        vocab = self.vocab
+        return [vocab[id] for id in self.get_word_ids(correctedText) if id != TokenTable.NONE]
+
+    def get_sentence_lengths(self) -> list:
+        return [end - start for start, end in zip(self.sentence_starts, self.sentence_ends)]
+
+    # count each distinct word id, then work out the frequency of each distinct form
+    # NB the forms are added in order of their first occurrence, as in CorpusElement.word_frequency
+    def word_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> dict:
+        counts = collections.Counter(self.get_word_ids(correctedText))
+        counts.pop(TokenTable.NONE, None)
+        frequency = collections.Counter()
+        for id, count in counts.items():
+            w = self.vocab[id]
+            if ignoreCase:
+                w = w.lower()
+            if pattern != '':
+                if not re.match(pattern, w):
+                    continue
+                w = w.lower()
+            frequency[w] += count
+        return frequency
@@ -0,0 +1,119 @@
+# Export a document or corpus for a corpus manager such as Sketch Engine, in one pass over the tree
+# vertical (VRT) format has one word per line, with its original text, corrected text and POS type
+# separated by tabs, and documents and sentences marked by <doc> and <s> lines carrying their attributes
+#   <doc id="d1" n="1">
+#   <s n="1">
+#   The	The	DT
+#   ...
+#   </s>
+#   </doc>
+# the output is written to the file in chunks as the tree is walked, and can be compressed with gzip
+
+from corpusparser import xml_writer
+import xml.etree.ElementTree as ET
+import re
+
+# the output is written to the file when this many lines, or characters of sentence text, have been collected
+_lines_per_write = 4096
+_characters_per_write = 65536
+
+# characters which must be escaped in a word
+_special_characters = re.compile('[&<>\t\n\r]')
+
+# the structures of the vertical format, for each element tag
+_structures = {'document': 'doc', 's': 's'}
+
+
+# write an element as vertical format, copying the listed attributes of documents and sentences
+# words with no text are left out, as they are from get_words_as_text_list()
+# a word with no corrected text has its original text in the second column, and a word with no POS type
+# has an empty third column
+def write_vrt(e: ET.Element, filename: str, attributes=('id', 'n'), compress=None) -> None:
+    with xml_writer.open_output_file(filename, compress) as f:
+        lines = []
+
+        def add(element):
+            tag = element.tag
+            if tag == 'w':
+                add_word(element)
+                return
+            structure = _structures.get(tag)
+            if structure is not None:
+                lines.append('<' + structure + _structure_attributes(element, attributes) + '>\n')
+            for child in element:
+                # most children are words with no sub-elements, so they are added here rather than through add()
+                if child.tag == 'w' and len(child) == 0:
+                    text = child.text
+                    if text is not None:
+                        lines.append(_word_line(text, child.get('so', text), child.get('pos', '')))
+                else:
+                    add(child)
+            if structure is not None:
+                lines.append('</' + structure + '>\n')
+            if len(lines) >= _lines_per_write:
+                f.write(''.join(lines).encode('utf-8'))
+                lines.clear()
+
+        def add_word(w):
+            text = w.text
+            if text is not None:
+                lines.append(_word_line(text, w.get('so', text), w.get('pos', '')))
+            # NB in the tree, words can contain other words
+            for child in w:
+                add(child)
+
+        add(e)
+        f.write(''.join(lines).encode('utf-8'))
+
+# write the text of each sentence on its own line, as from get_sentences_as_text_list()
+def write_sentence_text(e: ET.Element, filename: str, correctedText=False, compress=None) -> None:
+    with xml_writer.open_output_file(filename, compress) as f:
+        lines = []
+        size = 0
+        for s in e.iter('s'):
+            if correctedText:
+                line = ' '.join(w.get('so', w.text) for w in s.iter('w') if w.text is not None) + '\n'
+            else:
+                line = ' '.join(w.text for w in s.iter('w') if w.text is not None) + '\n'
+            lines.append(line)
+            size += len(line)
+            if size >= _characters_per_write:
+                f.write(''.join(lines).encode('utf-8'))
+                lines.clear()
+                size = 0
+        f.write(''.join(lines).encode('utf-8'))
+
+
+# the listed attributes of an element, as they are written in a structure line, e.g. ' id="d1" n="1"'
+def _structure_attributes(e: ET.Element, attributes) -> str:
+    text = ''
+    for name in attributes:
+        value = e.get(name)
+        if value is not None:
+            text += ' ' + name + '="' + _escape_attribute(value) + '"'
+    return text
+
+def _word_line(text: str, corrected: str, pos: str) -> str:
+    line = text + '\t' + corrected + '\t' + pos + '\n'
+    # most words have nothing to escape, so check them all at once
+    if _special_characters.search(text + corrected + pos) is None:
+        return line
+    return _escape_token(text) + '\t' + _escape_token(corrected) + '\t' + _escape_token(pos) + '\n'
+
+# a word must stay on one line, in its own column, and must not look like a structure line
+def _escape_token(text: str) -> str:
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '\t' in text or '\n' in text or '\r' in text:
+        text = text.replace('\t', ' ').replace('\n', ' ').replace('\r', ' ')
+    return text
+
+def _escape_attribute(text: str) -> str:
+    text = _escape_token(text)
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    return text
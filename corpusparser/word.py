@@ -30,16 +30,17 @@ class Word(CorpusElement):
     # create a word as a new object in the tree
     def append_new(parent, tag: str):
         new_e = ET.SubElement(parent.get_underlying_element(), tag)
-        return Word(new_e)
+        parent._touch(content=False)
+        return Word(new_e)._attach_to(parent)
     
     # create a word from a specific index in a parent
     def create_from_parent_and_index(parent: CorpusElement, index: int):
         word_e = parent.get_word_element_by_index(index)
-        return Word.create_from_element(word_e)
+        return Word.create_from_element(word_e)._attach_to(parent)
     
     # create a word from a specific sentence and word index in a parent
     def create_from_sentence_and_word_index(parent: CorpusElement, sentence_index: int, word_index: int):
         sent_e = parent.get_word_element_by_sentence_and_word_index(sentence_index, word_index)
-        return Word.create_from_element(sent_e)
+        return Word.create_from_element(sent_e)._attach_to(parent)
 
     ##############################################################################
\ No newline at end of file
@@ -0,0 +1,233 @@
+# A positional inverted index of the words in a TokenTable
+# for each word form it holds the positions at which that form occurs, so that
+# searches for a list of forms take time in proportion to the number of hits,
+# rather than scanning every word
+# positions are indexes into the list returned by get_words_as_text_list(), i.e.
+# words with no text are left out
+# forms can be looked up as they are, in lower case, or by the runs of word
+# characters (letters, digits and underscores) they contain
+
+from corpusparser.token_table import TokenTable
+from array import array
+import bisect
+import heapq
+import re
+
+# a run of word characters, as matched by \w in a regex
+_word_chars = re.compile(r'\w+')
+
+
+class WordIndex():
+
+    def __init__(self, table: TokenTable) -> None:
+        self.table = table
+        # the columns, for original and corrected text, and the postings for each column
+        # are built the first time they are needed
+        self.columns = {}
+        self.postings = {}
+        self.lower_ids = None
+        self.piece_ids = None
+        self.rows = None
+        self.sort_ranks = {}
+        self.row_postings = {}
+
+    ##############################################################################
+    # Object creation methods
+
+    def create_from_element(e):
+        return WordIndex(TokenTable.create_from_element(e))
+
+    ##############################################################################
+    # Index structures
+
+    # the word ids of every word with text, in order
+    def get_column(self, correctedText=False) -> array:
+        if correctedText not in self.columns:
+            column = self.table.get_word_ids(correctedText)
+            if self.table.has_empty_words:
+                column = array('i', (id for id in column if id != TokenTable.NONE))
+            self.columns[correctedText] = column
+        return self.columns[correctedText]
+
+    # the positions of each word id in a column
+    def get_postings(self, correctedText=False) -> dict:
+        if correctedText not in self.postings:
+            postings = {}
+            for position, id in enumerate(self.get_column(correctedText)):
+                p = postings.get(id)
+                if p is None:
+                    p = postings[id] = array('i')
+                p.append(position)
+            self.postings[correctedText] = postings
+        return self.postings[correctedText]
+
+    # the ids of the forms which are the same in lower case
+    def get_lower_ids(self) -> dict:
+        if self.lower_ids is None:
+            self.lower_ids = {}
+            for id, form in enumerate(self.table.vocab):
+                self.lower_ids.setdefault(form.lower(), []).append(id)
+        return self.lower_ids
+
+    # the ids of the forms which contain each run of word characters
+    def get_piece_ids(self) -> dict:
+        if self.piece_ids is None:
+            self.piece_ids = {}
+            for id, form in enumerate(self.table.vocab):
+                for piece in set(_word_chars.findall(form)):
+                    self.piece_ids.setdefault(piece, []).append(id)
+        return self.piece_ids
+
+    # the row in the token table of each position - only needed if some words have no text
+    def get_rows(self) -> array:
+        if self.rows is None:
+            self.rows = array('i', (row for row, id in enumerate(self.table.words) if id != TokenTable.NONE))
+        return self.rows
+
+    # the rows of each id in a column of the token table - 'text', 'so' (corrected text) or 'pos'
+    # unlike get_postings(), this includes the words with no text
+    def get_row_postings(self, attribute: str) -> dict:
+        if attribute != 'pos' and not self.table.has_empty_words:
+            return self.get_postings(attribute == 'so')
+        if attribute not in self.row_postings:
+            postings = {}
+            for row, id in enumerate(self.get_table_column(attribute)):
+                if id == TokenTable.NONE:
+                    continue
+                p = postings.get(id)
+                if p is None:
+                    p = postings[id] = array('i')
+                p.append(row)
+            self.row_postings[attribute] = postings
+        return self.row_postings[attribute]
+
+    # a column of the token table, by attribute name
+    def get_table_column(self, attribute: str) -> array:
+        if attribute == 'pos':
+            return self.table.pos
+        return self.table.get_word_ids(attribute == 'so')
+
+    # the rank of each word id when the vocabulary is sorted, for sorting by context
+    # forms which are the same (in lower case, if ignoreCase) have the same rank
+    def get_sort_ranks(self, ignoreCase=True) -> array:
+        if ignoreCase not in self.sort_ranks:
+            vocab = self.table.vocab
+            keys = [form.lower() for form in vocab] if ignoreCase else vocab
+            ranks = array('i', bytes(4 * len(vocab)))
+            rank = -1
+            previous = None
+            for id in sorted(range(len(vocab)), key=keys.__getitem__):
+                if rank < 0 or keys[id] != previous:
+                    rank += 1
+                    previous = keys[id]
+                ranks[id] = rank
+            self.sort_ranks[ignoreCase] = ranks
+        return self.sort_ranks[ignoreCase]
+
+    ##############################################################################
+    # Lookups
+
+    # the number of words in a column
+    def count_words(self, correctedText=False) -> int:
+        return len(self.get_column(correctedText))
+
+    # the form of the word at a position
+    def get_word(self, position: int, correctedText=False) -> str:
+        return self.table.vocab[self.get_column(correctedText)[position]]
+
+    # the row in the token table of the word at a position
+    def get_row(self, position: int) -> int:
+        if self.table.has_empty_words:
+            return self.get_rows()[position]
+        return position
+
+    # the position of the first word with text at or after a row in the token table
+    def get_position(self, row: int) -> int:
+        if self.table.has_empty_words:
+            return bisect.bisect_left(self.get_rows(), row)
+        return row
+
+    # the forms of the words in a range of positions
+    def get_words(self, start: int, end: int, correctedText=False) -> list:
+        vocab = self.table.vocab
+        return [vocab[id] for id in self.get_column(correctedText)[start:end]]
+
+    # the sorted positions of all words with any of the given ids
+    def positions_of_ids(self, ids, correctedText=False) -> list:
+        postings = self.get_postings(correctedText)
+        lists = [postings[id] for id in set(ids) if id in postings]
+        if len(lists) == 1:
+            return list(lists[0])
+        return list(heapq.merge(*lists))
+
+    # the sorted positions of the given forms
+    def positions(self, forms: list, correctedText=False) -> list:
+        vocab_ids = self.table.vocab_ids
+        return self.positions_of_ids([vocab_ids[f] for f in forms if f in vocab_ids], correctedText)
+
+    # the sorted positions of words which, in lower case, are one of the given forms
+    def positions_lower(self, forms: list, correctedText=False) -> list:
+        lower_ids = self.get_lower_ids()
+        ids = []
+        for form in set(forms):
+            ids.extend(lower_ids.get(form, []))
+        return self.positions_of_ids(ids, correctedText)
+
+    ##############################################################################
+    # Queries - these give the same results as the CorpusElement methods of the same name
+
+    def concordance_in(self, keywords: list, correctedText=False, separator='\t', context_length=25) -> list:
+        results = []
+        words_count = self.count_words(correctedText)
+        for i in self.positions_lower(keywords, correctedText):
+            left_start = max(0, i - context_length)
+            right_end = min(words_count, i + context_length + 1)
+            left_context = ' '.join(self.get_words(left_start, i, correctedText))
+            right_context = ' '.join(self.get_words(i + 1, right_end, correctedText))
+            results.append(left_context + separator + self.get_word(i, correctedText) + separator + right_context)
+        return results
+
+    # count the words in a list, with the same result as CorpusElement.word_count_in, i.e. the number of
+    # matches of the regex \Wword1\W|\Wword2\W|... in the text of all the words joined by spaces
+    # this is only possible when every word in the list is made of word characters - returns None otherwise
+    # such a word can only match a whole run of word characters, so the candidates can be found from the index
+    # NB the regex consumes the non-word character after each match, so a run which follows a matched run
+    # with only one character in between does not match
+    def word_count_in(self, list, correctedText=False) -> int:
+        if len(list) == 0:
+            return 0
+        for word in list:
+            if not isinstance(word, str) or not _word_chars.fullmatch(word):
+                return None
+        words = set(list)
+        piece_ids = self.get_piece_ids()
+        ids = []
+        for word in words:
+            ids.extend(piece_ids.get(word, []))
+        column = self.get_column(correctedText)
+        vocab = self.table.vocab
+        last_position = len(column) - 1
+        count = 0
+        # the end of the last match - the token position, and the character offset in the token
+        last_match = None
+        for position in self.positions_of_ids(ids, correctedText):
+            form = vocab[column[position]]
+            for run in _word_chars.finditer(form):
+                if run.group() not in words:
+                    continue
+                start, end = run.span()
+                # a run at the start of the first word, or at the end of the last word, has no
+                # non-word character before or after it in the joined text
+                if start == 0 and position == 0:
+                    continue
+                if end == len(form) and position == last_position:
+                    continue
+                # check whether the character before the run was consumed by the previous match
+                if last_match is not None:
+                    if last_match == (position, start - 1):
+                        continue
+                    if start == 0 and last_match == (position - 1, len(vocab[column[position - 1]])):
+                        continue
+                count += 1
+                last_match = (position, end)
+        return count
@@ -0,0 +1,206 @@
+# Write an element tree as XML a piece at a time, rather than building the whole text in memory
+# the output is the same as xml.etree.ElementTree.tostring(), and with an indent it is the same as
+# calling ElementTree.indent() first - but the indentation is worked out as the tree is written,
+# so the text and tails of the elements are not changed
+# NB names in a namespace, e.g. '{http://www.tei-c.org/ns/1.0}w', need prefixes to be chosen for the whole
+# tree, so iter_xml() does not write them - to_xml_string() and write_xml() use ET for those trees instead
+
+import xml.etree.ElementTree as ET
+import codecs
+import copy
+import gzip
+
+# the text is passed on in chunks of about this many characters
+CHUNK_SIZE = 65536
+
+
+##############################################################################
+
+# return the XML of an element and all of its sub-elements as a series of strings
+# if indent is more than 0, each sub-element is written on a new line, indented by that many spaces per level
+def iter_xml(e: ET.Element, indent=0, chunk_size=CHUNK_SIZE):
+    space = ' ' * indent
+    # the whitespace before an element at each level, when it replaces a blank text or tail
+    indentations = ['\n']
+    pieces = []
+    # pieces which have been joined, and their total length
+    parts = []
+    size = 0
+    # the elements whose sub-elements are being written, with the index of the next one
+    stack = []
+    element = e
+    tail = e.tail
+    level = 0
+    while True:
+        tag = element.tag
+        text = element.text
+        count = len(element)
+        if indent and count:
+            if len(indentations) <= level + 1:
+                indentations.append(indentations[-1] + space)
+            if not text or not text.strip():
+                text = indentations[level + 1]
+        if tag is ET.Comment:
+            pieces.append('<!--%s-->' % text)
+        elif tag is ET.PI:
+            pieces.append('<?%s?>' % text)
+        elif tag is None:
+            if text:
+                pieces.append(_escape_text(text))
+        else:
+            if not isinstance(tag, str) or tag[:1] == '{':
+                raise ValueError('Cannot write element tag: ' + repr(tag))
+            pieces.append('<' + tag)
+            for name, value in element.items():
+                if not isinstance(name, str) or name[:1] == '{':
+                    raise ValueError('Cannot write attribute name: ' + repr(name))
+                pieces.append(' %s="%s"' % (name, _escape_attribute(value)))
+            if count:
+                pieces.append('>')
+                if text:
+                    pieces.append(_escape_text(text))
+            elif text:
+                pieces.append('>' + _escape_text(text) + '</' + tag + '>')
+            else:
+                pieces.append(' />')
+
+        if count:
+            stack.append([element, 0, tail])
+            level += 1
+            element = element[0]
+            tail = _indented_tail(element.tail, indent, indentations, level, count == 1)
+            continue
+
+        if tail:
+            pieces.append(_escape_text(tail))
+        # finish each element whose last sub-element has been written, then go on to the next sub-element
+        while stack:
+            entry = stack[-1]
+            parent = entry[0]
+            entry[1] += 1
+            if entry[1] < len(parent):
+                element = parent[entry[1]]
+                tail = _indented_tail(element.tail, indent, indentations, level, entry[1] == len(parent) - 1)
+                break
+            stack.pop()
+            level -= 1
+            if parent.tag is not None and parent.tag is not ET.Comment and parent.tag is not ET.PI:
+                pieces.append('</' + parent.tag + '>')
+            if entry[2]:
+                pieces.append(_escape_text(entry[2]))
+        else:
+            break
+
+        # pass on the text so far, so it need not all be held in memory
+        if len(pieces) > 256:
+            part = ''.join(pieces)
+            pieces = []
+            parts.append(part)
+            size += len(part)
+            if size >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+                size = 0
+    parts.append(''.join(pieces))
+    chunk = ''.join(parts)
+    if chunk:
+        yield chunk
+
+# return the XML of an element as a string, or as bytes in the given encoding, as ET.tostring() does
+def to_xml_string(e: ET.Element, indent=0, encoding='unicode'):
+    try:
+        text = ''.join(iter_xml(e, indent))
+    except ValueError:
+        return _to_xml_string_with_et(e, indent, encoding)
+    if encoding == 'unicode':
+        return text
+    return (_declaration(encoding) + text).encode(encoding, 'xmlcharrefreplace')
+
+# write the XML of an element to a file, a chunk at a time
+# encoding 'unicode' writes UTF-8 with no XML declaration, as a str from to_xml_string() would be saved
+# if compress is True the file is written with gzip - if it is None, files whose names end with .gz are compressed
+def write_xml(e: ET.Element, filename: str, indent=0, encoding='unicode', compress=None) -> None:
+    try:
+        with open_output_file(filename, compress) as f:
+            # NB an incremental encoder only writes a byte order mark (e.g. for UTF-16) at the start
+            if encoding == 'unicode':
+                encoder = codecs.getincrementalencoder('utf-8')()
+            else:
+                encoder = codecs.getincrementalencoder(encoding)('xmlcharrefreplace')
+                f.write(encoder.encode(_declaration(encoding)))
+            for chunk in iter_xml(e, indent):
+                f.write(encoder.encode(chunk))
+            f.write(encoder.encode('', final=True))
+    except ValueError:
+        # start again, and write the whole tree at once
+        xml = _to_xml_string_with_et(e, indent, encoding)
+        with open_output_file(filename, compress) as f:
+            f.write(xml.encode('utf-8') if encoding == 'unicode' else xml)
+
+# open a file for writing bytes, compressing them with gzip if compress is True, or if it is None
+# and the name of the file ends with .gz
+def open_output_file(filename: str, compress=None):
+    if compress is None:
+        compress = str(filename).endswith('.gz')
+    if compress:
+        # NB level 6 is much quicker than gzip's default of 9, and the files are only slightly larger
+        return gzip.open(filename, 'wb', compresslevel=6)
+    return open(filename, 'wb')
+
+# open an XML file for reading, uncompressing it if it was written with gzip
+def open_xml_file(filename: str):
+    if is_compressed_file(filename):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+# True if a file was written with gzip, whatever its name
+def is_compressed_file(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+##############################################################################
+
+# write the XML with ET, indenting a copy of the tree so the tree itself is not changed
+def _to_xml_string_with_et(e: ET.Element, indent: int, encoding: str):
+    if indent > 0:
+        e = copy.deepcopy(e)
+        ET.indent(e, ' ' * indent)
+    return ET.tostring(e, encoding)
+
+# the tail of a sub-element - if the tree is being indented, a blank tail is replaced by the indentation
+# of the next sub-element, or of the parent's end tag after the last one
+def _indented_tail(tail: str, indent: int, indentations: list, level: int, last: bool) -> str:
+    if indent and (not tail or not tail.strip()):
+        return indentations[level - 1] if last else indentations[level]
+    return tail
+
+# the XML declaration which ET.tostring() adds for encodings other than UTF-8 and ASCII
+def _declaration(encoding: str) -> str:
+    if encoding.lower() in ('utf-8', 'us-ascii'):
+        return ''
+    return "<?xml version='1.0' encoding='%s'?>\n" % encoding
+
+# escape text and attribute values in the same way as ET
+def _escape_text(text: str) -> str:
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+def _escape_attribute(text: str) -> str:
+    if not isinstance(text, str):
+        raise ValueError('Cannot write attribute value: ' + repr(text))
+    text = _escape_text(text)
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    if '\n' in text:
+        text = text.replace('\n', '&#10;')
+    if '\t' in text:
+        text = text.replace('\t', '&#09;')
+    return text
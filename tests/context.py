@@ -6,4 +6,15 @@ from corpusparser.corpus_element import CorpusElement
 from corpusparser.corpus import Corpus
 from corpusparser.document import Document
 from corpusparser.sentence import Sentence
-from corpusparser.word import Word
\ No newline at end of file
+from corpusparser.word import Word
+from corpusparser.parser import set_parser_backend, get_parser_backend, register_parser_backend, StubBackend
+from corpusparser.parse_cache import ParseCache
+from corpusparser.spelling import SpellingRules
+from corpusparser.normalization import NormalizationTable
+from corpusparser.token_table import TokenTable
+from corpusparser.word_index import WordIndex
+from corpusparser.concordance import Concordance
+from corpusparser.query import Query
+from corpusparser.corpus_store import CorpusStore
+from corpusparser.lazy_corpus import LazyCorpus
+from corpusparser.reader import iter_sentences, iter_words
\ No newline at end of file
@@ -1,6 +1,19 @@
-from context import CorpusElement, Document, Sentence, Word
+from context import CorpusElement, Corpus, Document, Sentence, Word
+from context import set_parser_backend, get_parser_backend
+from context import ParseCache, StubBackend, register_parser_backend
+from context import iter_sentences, iter_words
+from context import SpellingRules, NormalizationTable, TokenTable, WordIndex, Concordance, Query, CorpusStore, LazyCorpus
 
 import unittest
+import importlib.util
+import subprocess
+import sys
+import os
+import tempfile
+import json
+import gzip
+import copy
+import re
 
 import xml.etree.ElementTree as ET
 
@@ -44,6 +57,19 @@ class ImportColmepTestCase(unittest.TestCase):
             self.assertEquals(elem.text, '¶') 
             break
 
+    # check that punctuation is split from the start and end of words, and tags are kept in order
+    def test_imported_punctuation_and_tags(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, 'punctuation.xml')
+            with open(filename, 'w') as f:
+                f.write('<document>¶The "quick" fox, <newpage pageno="2" />;; ! <footnote n="1">A note</footnote>\nend.</document>')
+            d = Document.create_from_nonstandard_file(filename, 'colmep')
+        words = [e.text for e in d.iter('w')]
+        self.assertEqual(words, ['¶', 'The', '"', 'quick', '"', 'fox', ',', ';', ';', '!', 'end.'])
+        tags = [e.tag for e in d.iter()]
+        self.assertEqual(tags.index('newpage'), 8)
+        self.assertEqual(d.findall('footnote')[0].text, 'A note')
+
 
 class UtilityFunctionsTestCase(unittest.TestCase):
 
@@ -75,6 +101,31 @@ class UtilityFunctionsTestCase(unittest.TestCase):
         self.assertEqual(Document.count_elements(d_new, 'comment'), 6)
         # check the document name has been cloned
         self.assertEqual(d_new.get_name(), 'Test document')
+
+    # check that cloning keeps text, tails and attributes, and makes a separate copy
+    def test_clone_element_is_exact(self):
+        self.d.transform_tokenise_sentences()
+        self.d.transform_number_sentences()
+        ET.indent(self.d.get_underlying_element())
+        d_new = self.d.clone_document()
+        self.assertEqual(self.d.to_xml_string(), d_new.to_xml_string())
+        for old_e, new_e in zip(self.d.iter(), d_new.iter()):
+            self.assertIsNot(old_e, new_e)
+            self.assertEqual((old_e.tag, old_e.text, old_e.tail, old_e.attrib), (new_e.tag, new_e.text, new_e.tail, new_e.attrib))
+        # changing the clone should not change the original
+        d_new.get_sentences()[0].set_attribute('n', '100')
+        self.assertEqual(self.d.get_sentences()[0].get_attribute('n'), '1')
+
+    # check that only the named attributes are copied
+    def test_clone_element_with_attributes(self):
+        d_new = self.d.clone_document(attributes=['pageno'])
+        self.assertIsNone(d_new.get_name())
+        self.assertEqual(Document.count_elements(d_new, 'comment'), 6)
+        for elem in d_new.iter('comment'):
+            self.assertEqual(len(elem.attrib), 0)
+        for elem in d_new.iter('newpage'):
+            self.assertIn('pageno', elem.attrib)
+        self.assertEqual(self.d.get_words_as_text(), d_new.get_words_as_text())
         
     
 class SentencesAndWordsTestCase(unittest.TestCase):    
@@ -127,6 +178,32 @@ class SentencesAndWordsTestCase(unittest.TestCase):
         longest = self.d.longest_sentence_length()
         self.assertEqual(longest, 124)
 
+    # check that tokenisation moves the existing elements and leaves no marker attributes
+    def test_tokenise_in_place(self):
+        d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        words = list(d.iter('w'))
+        d.transform_tokenise_sentences()
+        self.assertEqual(d.count_sentences(), 39)
+        # the word elements are the same objects, not copies
+        for old_w, new_w in zip(words, d.iter('w')):
+            self.assertIs(old_w, new_w)
+        for w in d.iter('w'):
+            self.assertNotIn('sent-break', w.attrib)
+        # tokenising again with a different model regroups the same words
+        d.transform_tokenise_sentences(tokenisation_model='period_and_pause')
+        self.assertEqual(d.count_words(), 1772)
+        self.assertEqual(len(d.findall('s')), d.count_sentences())
+        self.assertGreater(d.count_sentences(), 39)
+
+    # check that each document in a corpus is tokenised separately
+    def test_tokenise_corpus(self):
+        c = Corpus.create_new()
+        for filename in ['tests/data/simple-input1.xml', 'tests/data/simple-input2.xml']:
+            Document.create_from_nonstandard_file(filename, 'colmep').add_to_corpus(c)
+        c.transform_tokenise_sentences()
+        self.assertEqual(c.count_documents(), 2)
+        self.assertEqual([len(d.findall('s')) for d in c.findall('document')], [2, 1])
+
     # check that initial comment elemets are correctly embedded within the first sentence
     def test_comments_in_first_sentence(self):
         sents = self.d.get_sentences_as_elements()
@@ -201,11 +278,82 @@ class SpellingCorrectionTestCase(unittest.TestCase):
         self.assertEqual(word.get('so'), 'upon')
 
 
+    # check that the compiled rules give the same result as applying each rule in turn to every word
+    def test_spelling_rules_match_sequential_updates(self):
+        with open('tests/data/spellings.json') as f:
+            rules = json.load(f)['spellings']
+        # use the input text, plus every word form in the word frequency list
+        d = self.d.clone_document()
+        with open('tests/data/word_frequency.txt') as f:
+            for line in f:
+                w = ET.SubElement(d.get_underlying_element(), 'w')
+                w.text = line.rstrip('\n').rsplit('#', 1)[0]
+        words = list(d.iter('w'))
+        # give some words an existing corrected form
+        for w in words[::50]:
+            w.set('so', w.text.upper())
+        expected = [_sequential_spelling(w.text, w.get('so'), rules) for w in words]
+        d.update_spellings_from_file('tests/data/spellings.json')
+        self.assertEqual([w.get('so') for w in words], expected)
+
+    # check that each distinct form is only corrected once
+    def test_spelling_rules_cache(self):
+        rules = SpellingRules.create_from_file('tests/data/spellings.json')
+        rules.apply(self.d.get_underlying_element())
+        self.assertEqual(len(rules.cache), len(set(self.d.get_words_as_text_list())))
+
+    # check that a normalisation table gives the same result as the spelling file
+    def test_normalization_table(self):
+        table = NormalizationTable.create_from_rules('tests/data/spellings.json', 'tests/data/word_frequency.txt')
+        self.assertEqual(table.forms['vpon'], 'upon')
+        self.assertIsNone(table.forms['the'])
+        d_table = self.d.clone_document()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        d_table.update_spellings_from_table(table)
+        self.assertEqual(self.d.to_xml_string(), d_table.to_xml_string())
+
+    # check that a saved table is reused until the rule file changes
+    def test_normalization_table_rebuilt_when_rules_change(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            rules_file = os.path.join(tempdir, 'spellings.json')
+            table_file = os.path.join(tempdir, 'table.json')
+            with open('tests/data/spellings.json') as f:
+                rules = json.load(f)
+            with open(rules_file, 'w') as f:
+                json.dump(rules, f)
+            table = NormalizationTable.load_or_create(table_file, rules_file, self.d)
+            self.assertTrue(os.path.exists(table_file))
+            # the saved table is loaded, not rebuilt
+            table_again = NormalizationTable.load_or_create(table_file, rules_file, ['new'])
+            self.assertEqual(table_again.forms, table.forms)
+            self.assertNotIn('new', table_again.forms)
+            # a change to the rules causes the table to be rebuilt
+            rules['spellings'].append({'match': 'yng', 'replace': 'ing'})
+            with open(rules_file, 'w') as f:
+                json.dump(rules, f)
+            self.assertFalse(table_again.is_current(rules_file))
+            table_new = NormalizationTable.load_or_create(table_file, rules_file, self.d)
+            self.assertEqual(table_new.forms['thynges'], 'thinges')
+
+
+# apply spelling rules one at a time, as separate updates to a single word
+def _sequential_spelling(text, so, rules):
+    for rule in rules:
+        current = so if so is not None else text
+        if rule.get('regex'):
+            if re.match(rule['match'], current, flags=re.IGNORECASE):
+                so = re.sub(rule['match'], rule['replace'], current)
+        elif rule['match'] in current:
+            so = current.replace(rule['match'], rule['replace'])
+    return so
+
 
+@unittest.skipUnless(importlib.util.find_spec('benepar'), 'benepar is not installed')
 class SentenceParseTestCase(unittest.TestCase):    
 
     # import the xml file into a Document and process sentences
     def setUp(self) -> None:
+        set_parser_backend('benepar')
         filename = 'tests/data/input.xml'
         format = 'colmep'
         self.d = Document.create_from_nonstandard_file(filename, format)
@@ -227,5 +375,1119 @@ class SentenceParseTestCase(unittest.TestCase):
 
 
 
+# a backend which fails for one sentence, to check that parser errors are counted
+class FailingBackend(StubBackend):
+    name = 'failing'
+    def parse(self, text: str) -> str:
+        if 'Prologue' in text:
+            raise ValueError('Cannot parse')
+        return super().parse(text)
+
+register_parser_backend('failing', FailingBackend)
+
+
+class StubParseTestCase(unittest.TestCase):    
+
+    # parse using the stub backend, which does not need spaCy or benepar
+    def setUp(self) -> None:
+        set_parser_backend('stub')
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        self.d.transform_number_sentences()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        set_parser_backend('benepar')
+        return super().tearDown()
+
+    # check that the stub backend is in use
+    def test_stub_backend_selected(self):
+        self.assertEqual(get_parser_backend().name, 'stub')
+
+    # check that the parse string and restructure are applied
+    def test_parse_sentence(self):
+        self.d.transform_parse(add_parse_string=True, restructure=True, id='TEST')
+        sents = self.d.get_sentences()
+        parse = sents[0].get_attribute('parse')
+        self.assertEqual('(S (XX ¶) (XX The)', parse[:18])
+        self.assertTrue(parse.endswith(' (ID TEST,1))'))
+        # the stub parse puts every word directly under a <sent> phrase
+        se = sents[1].get_underlying_element()
+        self.assertEqual(se[0].tag, 'sent')
+        self.assertEqual(se[0].find('w').get('pos'), 'XX')
+        # no words should be lost in restructuring
+        self.assertEqual(self.d.count_words(), 1772)
+
+    # check that batched parsing gives exactly the same result as parsing one sentence at a time
+    def test_batched_parse(self):
+        d_batched = self.d.clone_document()
+        self.d.transform_parse(add_parse_string=True, restructure=True, id='TEST')
+        d_batched.transform_parse(add_parse_string=True, restructure=True, id='TEST', batch_size=8)
+        self.assertEqual(self.d.to_xml_string(), d_batched.to_xml_string())
+
+    # check that parsing across several worker processes gives the same result
+    def test_parse_with_workers(self):
+        d_pool = self.d.clone_document()
+        self.d.transform_parse(add_parse_string=True, restructure=True, id='TEST')
+        d_pool.transform_parse(add_parse_string=True, restructure=True, id='TEST', batch_size=4, workers=2)
+        self.assertEqual(self.d.to_xml_string(), d_pool.to_xml_string())
+
+    # check that a parser error in a worker only loses the failing sentence
+    def test_parse_with_workers_failure(self):
+        set_parser_backend('failing')
+        self.d.transform_parse(add_parse_string=True, batch_size=4, workers=2)
+        parsed = [s.has_attribute('parse') for s in self.d.get_sentences()]
+        # sentence 2 fails, and one other sentence is too long to parse
+        self.assertEqual(parsed.count(False), 2)
+        self.assertFalse(parsed[1])
+
+    # check that batches are sorted by length when requested
+    def test_batched_parse_sorted_by_length(self):
+        texts = []
+        backend = get_parser_backend()
+        parse = backend.parse
+        def recording_parse(text):
+            texts.append(text)
+            return parse(text)
+        backend.parse = recording_parse
+        self.d.transform_parse(batch_size=8, sort_by_length=True)
+        self.assertEqual([len(t) for t in texts], sorted(len(t) for t in texts))
+
+
+class ParseCacheTestCase(unittest.TestCase):
+
+    # parse using the stub backend, with a cache in a temporary directory
+    def setUp(self) -> None:
+        set_parser_backend('stub')
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tempdir.name, 'parses.db')
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        set_parser_backend('benepar')
+        self.tempdir.cleanup()
+        return super().tearDown()
+
+    # check that a second run takes every parse from the cache, with the same result
+    def test_cache_reuses_parses(self):
+        d_cached = self.d.clone_document()
+        cache = ParseCache(self.cache_file)
+        self.d.transform_parse(add_parse_string=True, cache=cache)
+        # 38 sentences are short enough to parse
+        self.assertEqual(cache.get_stats()['misses'], 38)
+        cache.close()
+        # reopen the cache, as a later run would
+        cache = ParseCache(self.cache_file)
+        d_cached.transform_parse(add_parse_string=True, cache=cache, batch_size=8)
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 38)
+        self.assertEqual(stats['misses'], 0)
+        self.assertEqual(self.d.to_xml_string(), d_cached.to_xml_string())
+        cache.close()
+
+    # check that the key depends on the corrected text flag and model, but not whitespace
+    def test_cache_keys(self):
+        cache = ParseCache(self.cache_file)
+        cache.put('The  right plesaunt', False, 'stub:XX', '(S)')
+        self.assertEqual(cache.get('The right plesaunt', False, 'stub:XX'), '(S)')
+        self.assertIsNone(cache.get('The right plesaunt', True, 'stub:XX'))
+        self.assertIsNone(cache.get('The right plesaunt', False, 'stub:YY'))
+        cache.close()
+
+    # check that the least recently used entries are evicted when the cache is full
+    def test_cache_eviction(self):
+        cache = ParseCache(self.cache_file, max_entries=2)
+        cache.put('one', False, 'stub:XX', '(S 1)')
+        cache.put('two', False, 'stub:XX', '(S 2)')
+        cache.get('one', False, 'stub:XX')
+        cache.put('three', False, 'stub:XX', '(S 3)')
+        self.assertEqual(cache.get('one', False, 'stub:XX'), '(S 1)')
+        self.assertIsNone(cache.get('two', False, 'stub:XX'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+        cache.close()
+
+
+class TokenTableTestCase(unittest.TestCase):
+
+    # import the xml file, process sentences and spellings, and add POS types with the stub parser
+    def setUp(self) -> None:
+        set_parser_backend('stub')
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        self.d.transform_parse(restructure=True)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        set_parser_backend('benepar')
+        return super().tearDown()
+
+    # check that the queries give the same results with and without the table
+    def test_queries_match_tree(self):
+        results = []
+        for use_table in [False, True]:
+            if use_table:
+                self.d.build_token_table()
+            results.append([
+                self.d.count_words(),
+                self.d.count_sentences(),
+                self.d.count_documents(),
+                self.d.get_sentence_lengths(),
+                self.d.get_words_as_text_list(),
+                self.d.get_words_as_text_list(correctedText=True),
+                list(self.d.word_frequency().most_common()),
+                list(self.d.word_frequency(correctedText=True, ignoreCase=True).most_common()),
+                list(self.d.word_frequency_no_punctuation(correctedText=True).most_common()),
+                list(self.d.word_frequency_starts_with('t').most_common()),
+                self.d.concordance_in(['he', 'hym']),
+                self.d.word_count_in(['the', 'The']),
+            ])
+        self.assertIsNotNone(self.d.get_token_table())
+        self.assertEqual(results[0], results[1])
+
+    # check the columns of the table
+    def test_columns(self):
+        table = self.d.build_token_table()
+        self.assertEqual(len(table.words), 1772)
+        self.assertEqual(len(table.corrected), 1772)
+        self.assertEqual(table.count_documents(), 1)
+        self.assertEqual(table.vocab[table.words[1]], 'The')
+        # the last sentence was too long to parse, so some words have no POS type
+        self.assertEqual(table.vocab[table.pos[1]], 'XX')
+        self.assertIn(TokenTable.NONE, table.pos)
+        # vpo*n* is the second word in sentence 5
+        position = table.sentence_starts[4] + 1
+        self.assertEqual(table.vocab[table.words[position]], 'vpo*n*')
+        self.assertEqual(table.vocab[table.corrected[position]], 'upon')
+
+    # check that the table is dropped when the document is changed
+    def test_table_dropped_on_change(self):
+        self.d.build_token_table()
+        s = self.d.get_underlying_element().find('s')
+        self.d.remove(s)
+        self.assertIsNone(self.d.get_token_table())
+        self.assertEqual(self.d.count_sentences(), 38)
+
+
+class WordIndexTestCase(unittest.TestCase):
+
+    # import the xml file and process sentences and spellings
+    def setUp(self) -> None:
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        return super().setUp()
+
+    # check that the queries give the same results with and without the index
+    def test_queries_match_scan(self):
+        queries = [['the'], ['The', 'the'], ['he', 'hym', 'hys'], ['he', 'hym', 'hys', 'ye', 'ȝe'], ['and'], ['of', 'a'], ['nothere']]
+        results = []
+        for use_index in [False, True]:
+            if use_index:
+                self.d.build_word_index()
+            result = []
+            for correctedText in [False, True]:
+                for query in queries:
+                    result.append(self.d.word_count_in(query, correctedText))
+                    result.append(self.d.concordance_in(query, correctedText))
+                result.append(self.d.concordance('the', correctedText, separator='|', context_length=3))
+            # these cannot be answered from the index, so are answered by the scan
+            result.append(self.d.word_count_in(['th.']))
+            result.append(self.d.word_count_in(['hym,']))
+            results.append(result)
+        self.assertIsNotNone(self.d.get_word_index())
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1][0], 75)
+        self.assertEqual(results[1][2], 83)
+
+    # check the count against the regex where tokens contain punctuation, and matches are adjacent
+    def test_word_count_edge_cases(self):
+        texts = [
+            ['he', 'he', 'he'],
+            ['he,he', 'he', ',he', 'he,', 'he'],
+            ['(he)', 'x', 'he.he.he', '', 'hym', 'he_he', 'he1', 'he'],
+            ['hym'],
+            ['a', 'he', ',', 'he', ',,', 'hym', 'b'],
+        ]
+        for words in texts:
+            d = Document.create_new()
+            for word in words:
+                ET.SubElement(d.get_underlying_element(), 'w').text = word
+            for query in [['he'], ['hym'], ['he', 'hym'], ['he', 'he']]:
+                expected = d.word_count_in(query)
+                d.build_word_index()
+                self.assertEqual(d.word_count_in(query), expected, (words, query))
+                d.drop_word_index()
+
+    # check that the index is dropped when the document is changed
+    def test_index_dropped_on_change(self):
+        self.d.build_word_index()
+        self.assertIsNotNone(self.d.get_token_table())
+        s = self.d.get_underlying_element().find('s')
+        self.d.remove(s)
+        self.assertIsNone(self.d.get_word_index())
+        self.assertIsNone(self.d.get_token_table())
+
+
+class ConcordanceTestCase(unittest.TestCase):
+
+    # import the xml file and process sentences
+    def setUp(self) -> None:
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        return super().setUp()
+
+    # check that the lines are the same as concordance_in, a page at a time
+    def test_pages_match_concordance_in(self):
+        expected = self.d.concordance_in(['he', 'hym'])
+        c = self.d.get_concordance(['he', 'hym'])
+        self.assertEqual(len(c), len(expected))
+        self.assertEqual(c.count_pages(page_size=10), (len(expected) + 9) // 10)
+        lines = []
+        for page in range(c.count_pages(page_size=10)):
+            lines.extend(c.get_page(page, page_size=10))
+        self.assertEqual(lines, expected)
+        self.assertEqual(c.get_line(3, separator='|', context_length=2), self.d.concordance_in(['he', 'hym'], separator='|', context_length=2)[3])
+
+    # check that each hit gives the sentence and position of the word
+    def test_hits(self):
+        c = self.d.get_concordance(['the'])
+        words = self.d.get_words_as_text_list()
+        for hit in c.get_hits():
+            self.assertEqual(hit.document, 0)
+            self.assertEqual(hit.length, 1)
+            self.assertEqual(words[hit.position].lower(), 'the')
+            s = self.d.get_sentence_element_by_index(hit.sentence)
+            self.assertIn(words[hit.position], [w.text for w in s.iter('w')])
+
+    # check sorting by the words to the right, then the left
+    def test_sort(self):
+        c = self.d.get_concordance(['the'])
+        sorted_c = c.sort(['R1', 'L1'])
+        self.assertEqual(sorted(c.starts), sorted(sorted_c.starts))
+        words = self.d.get_words_as_text_list()
+        keys = [(words[p + 1].lower(), words[p - 1].lower()) for p in sorted_c.starts]
+        self.assertEqual(keys, sorted(keys))
+        with self.assertRaises(ValueError):
+            c.sort('X1')
+
+    # check that a sample is a subset of the hits, in order, and repeatable with a seed
+    def test_sample(self):
+        c = self.d.get_concordance(['the'])
+        sample = c.sample(10, seed=1)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(list(sample.starts), sorted(sample.starts))
+        self.assertTrue(set(sample.starts) <= set(c.starts))
+        self.assertEqual(list(sample.starts), list(c.sample(10, seed=1).starts))
+        self.assertEqual(len(c.sample(1000)), len(c))
+
+
+class QueryTestCase(unittest.TestCase):
+
+    # a small document with two sentences and POS types
+    def setUp(self) -> None:
+        self.d = Document.create_from_xml_string(
+            '<document><s>'
+            '<w pos="PRP" so="ye">Ye</w><w pos="VBP">shall</w><w pos="VB">see</w><w pos="IN">in</w><w pos="DT">the</w><w pos="NN">storie</w>'
+            '</s><s>'
+            '<w pos="PRP" so="ye">ȝe</w><w pos="MD">may</w><w pos="RB">wel</w><w pos="VB">knowe</w><w pos="PRP" so="ye">ye</w>'
+            '</s><s>'
+            '<w pos="VB">Go</w><w pos="PRP" so="ye">ye</w><w pos="NN">hens</w>'
+            '</s></document>')
+        return super().setUp()
+
+    def matches(self, query: str) -> list:
+        return [line.split('|')[1] for line in self.d.query(query).get_lines(separator='|', context_length=0)]
+
+    def test_attributes(self):
+        self.assertEqual(self.matches('[so="ye"] [pos="VB.*"]'), ['Ye shall'])
+        self.assertEqual(self.matches('[so="ye"]'), ['Ye', 'ȝe', 'ye', 'ye'])
+        self.assertEqual(self.matches('"ye"'), ['ye', 'ye'])
+        self.assertEqual(self.matches('[text="ye"%c]'), ['Ye', 'ye', 'ye'])
+        self.assertEqual(self.matches('[word="ye" & pos="PRP"] "hens"'), ['ye hens'])
+        self.assertEqual(self.matches('[pos="VB" | pos="MD"] [!pos="PRP"]'), ['see in', 'may wel'])
+        self.assertEqual(self.matches('[pos!="PRP" & text="[a-z]+"]{3}'), ['shall see in', 'may wel knowe'])
+
+    # optional words, gaps and repeats
+    def test_repeats(self):
+        self.assertEqual(self.matches('[so="ye"] []{0,2} [pos="VB"]'), ['Ye shall see', 'ȝe may wel knowe'])
+        self.assertEqual(self.matches('[so="ye"] [pos="MD"]? [pos="V.*"]'), ['Ye shall'])
+        self.assertEqual(self.matches('[so="ye"] [pos="MD"]? [pos="RB"]'), ['ȝe may wel'])
+        self.assertEqual(self.matches('[pos="DT"]? [pos="NN"]'), ['the storie', 'hens'])
+        self.assertEqual(self.matches('[pos="VB.*"]+'), ['shall see', 'knowe', 'Go'])
+        self.assertEqual(self.matches('[]* [pos="NN"]'), ['Ye shall see in the storie', 'Go ye hens'])
+
+    # matches do not cross sentences
+    def test_sentence_boundaries(self):
+        self.assertEqual(self.matches('[pos="NN"] [so="ye"]'), [])
+        self.assertEqual(self.matches('[so="ye"] [pos="VB"]'), [])
+        hits = self.d.query('[so="ye"]').get_hits()
+        self.assertEqual([hit.sentence for hit in hits], [0, 1, 1, 2])
+        self.assertEqual([hit.position for hit in hits], [0, 6, 10, 12])
+
+    def test_invalid_queries(self):
+        for query in ['', '[text="ye"', '[colour="red"]', '[text="("]', '[]{3,1}', 'ye']:
+            with self.assertRaises(ValueError):
+                Query.create_from_string(query)
+
+    # check that the index built by a query is not used after a change through another object
+    def test_index_dropped_on_change_elsewhere(self):
+        self.assertEqual(self.matches('"hens"'), ['hens'])
+        self.assertEqual(self.d.count_words(), 14)
+        other = Document(self.d.get_underlying_element())
+        other.update_spellings('ye', 'YE')
+        Word.append_new(Sentence(self.d.get_sentence_element_by_index(2)), 'w').set_text('hens')
+        self.assertIsNone(self.d.get_word_index())
+        self.assertEqual(self.d.count_words(), 15)
+        self.assertEqual(self.d.word_frequency(correctedText=True)['YE'], 4)
+        self.assertEqual(self.d.get_words_as_text_list()[-1], 'hens')
+        self.assertEqual(self.matches('"hens"'), ['hens', 'hens'])
+        self.assertEqual(len(self.d.get_concordance(['hens']).get_hits()), 2)
+
+
+class MemoisationTestCase(unittest.TestCase):
+
+    # import the xml file and process sentences
+    def setUp(self) -> None:
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        return super().setUp()
+
+    # check that results are remembered until the document is changed
+    def test_results_remembered(self):
+        version = self.d.get_version()
+        self.assertEqual(self.d.count_sentences(), 39)
+        lengths = self.d.get_sentence_lengths()
+        frequency = self.d.word_frequency()
+        # the remembered results are not computed again, even if the tree is walked
+        self.d.iter = None
+        self.assertEqual(self.d.count_sentences(), 39)
+        self.assertEqual(self.d.get_sentence_lengths(), lengths)
+        self.assertEqual(self.d.longest_sentence_length(), max(lengths))
+        self.assertEqual(self.d.word_frequency(), frequency)
+        del self.d.iter
+        self.assertEqual(self.d.get_version(), version)
+
+    # check that changing a returned result does not change the remembered one
+    def test_results_copied(self):
+        self.d.get_sentence_lengths().append(1000)
+        self.d.word_frequency()['the'] = 0
+        self.assertNotIn(1000, self.d.get_sentence_lengths())
+        self.assertEqual(self.d.word_frequency()['the'], 73)
+
+    # check that results are computed again after changes, including changes through child objects
+    def test_results_updated_on_change(self):
+        self.assertEqual(self.d.word_frequency(correctedText=True)['the'], 73)
+        self.d.update_spellings('the', 'thee')
+        self.assertEqual(self.d.word_frequency(correctedText=True)['the'], 0)
+        self.assertEqual(self.d.count_sentences(), 39)
+        self.d.remove(self.d.get_underlying_element().find('s'))
+        self.assertEqual(self.d.count_sentences(), 38)
+        s = Sentence.append_new(self.d, 's')
+        self.assertEqual(self.d.count_sentences(), 39)
+        Word.append_new(s, 'w').set_text('ende')
+        self.assertEqual(self.d.word_frequency()['ende'], 1)
+        w = Word.create_from_sentence_and_word_index(self.d, 38, 0)
+        w.set_text('end')
+        self.assertEqual(self.d.word_frequency()['ende'], 0)
+        self.assertEqual(self.d.word_frequency()['end'], 1)
+        # changes made directly to the underlying elements must be notified
+        w.get_underlying_element().text = 'endes'
+        self.d.mark_changed()
+        self.assertEqual(self.d.word_frequency()['endes'], 1)
+
+    # check that every helper which changes the element counts as a change
+    def test_setters_counted_as_changes(self):
+        for change in [lambda: self.d.set_tail('\n'), lambda: self.d.set_name('a'), lambda: self.d.set_id('b')]:
+            version = self.d.get_version()
+            count = sys.modules[CorpusElement.__module__]._get_change_count()
+            change()
+            self.assertEqual(self.d.get_version(), version + 1)
+            self.assertGreater(sys.modules[CorpusElement.__module__]._get_change_count(), count)
+
+    # check that changes through a separate object for the same elements are seen
+    def test_results_updated_on_change_elsewhere(self):
+        d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        c = Corpus.create_new()
+        d.add_to_corpus(c)
+        self.assertEqual(c.count_sentences(), 0)
+        self.assertEqual(c.word_frequency(correctedText=True)['the'], 73)
+        d.transform_tokenise_sentences()
+        d.update_spellings('the', 'thee')
+        self.assertEqual(c.count_sentences(), 39)
+        self.assertEqual(c.word_frequency(correctedText=True)['the'], 0)
+        self.assertEqual(c.collect_stats()['sentences'], 39)
+        # a second object for the same document
+        Document(d.get_underlying_element()).update_spellings('thee', 'the')
+        self.assertEqual(c.word_frequency(correctedText=True)['the'], 73)
+        self.assertEqual(d.word_frequency(correctedText=True)['the'], 73)
+        Document(d.get_underlying_element()).remove(d.get_sentence_element_by_index(0))
+        self.assertEqual(d.count_sentences(), 38)
+        self.assertEqual(c.count_sentences(), 38)
+
+
+class RandomAccessTestCase(unittest.TestCase):
+
+    # import the xml file, process sentences, and add phrases with the stub parser
+    def setUp(self) -> None:
+        set_parser_backend('stub')
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        self.d.transform_parse(restructure=True)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        set_parser_backend('benepar')
+        return super().tearDown()
+
+    # check every word and sentence against lists built from the tree
+    def test_lookups_match_tree(self):
+        words = list(self.d.iter('w'))
+        sents = list(self.d.iter('s'))
+        for i in range(len(words)):
+            self.assertIs(self.d.get_word_element_by_index(i), words[i])
+        for i in range(len(sents)):
+            self.assertIs(self.d.get_sentence_element_by_index(i), sents[i])
+            sent_words = list(sents[i].iter('w'))
+            for j in range(len(sent_words)):
+                self.assertIs(self.d.get_word_element_by_sentence_and_word_index(i, j), sent_words[j])
+            self.assertIs(self.d.get_word_element_by_sentence_and_word_index(i, -1), sent_words[-1])
+        self.assertIs(self.d.get_child_by_index('s', 2, recursive=False), self.d.get_underlying_element().findall('s')[2])
+        with self.assertRaises(IndexError):
+            self.d.get_word_element_by_sentence_and_word_index(0, len(list(sents[0].iter('w'))))
+        with self.assertRaises(IndexError):
+            self.d.get_word_element_by_index(len(words))
+
+    # check that the lookups follow changes to the document
+    def test_lookups_updated_on_change(self):
+        first = self.d.get_word_element_by_sentence_and_word_index(1, 0)
+        self.d.remove(self.d.get_sentence_element_by_index(0))
+        self.assertIs(self.d.get_word_element_by_sentence_and_word_index(0, 0), first)
+        self.assertIs(Word.create_from_parent_and_index(self.d, 0).get_underlying_element(), first)
+        s = Sentence.append_new(self.d, 's')
+        w = Word.append_new(s, 'w')
+        self.assertIs(self.d.get_word_element_by_sentence_and_word_index(-1, 0), w.get_underlying_element())
+
+    # check that the lookups follow changes through objects the document was not created from
+    def test_lookups_updated_on_change_elsewhere(self):
+        first = self.d.get_word_element_by_sentence_and_word_index(1, 0)
+        other = Document(self.d.get_underlying_element())
+        other.remove(other.get_sentence_element_by_index(0))
+        self.assertIs(self.d.get_word_element_by_sentence_and_word_index(0, 0), first)
+        self.assertIs(self.d.get_word_element_by_index(0), first)
+        self.assertIs(self.d.get_child_by_index('s', 0, recursive=False), self.d.get_underlying_element().find('s'))
+        # remove the first word through an object for the phrase which holds it
+        phrase = next(p for p in self.d.iter() if first in list(p))
+        CorpusElement(phrase).remove(first)
+        self.assertIsNot(self.d.get_word_element_by_index(0), first)
+        self.assertIs(self.d.get_word_element_by_sentence_and_word_index(0, 0), next(self.d.get_sentence_element_by_index(0).iter('w')))
+
+
+class StatisticsTestCase(unittest.TestCase):
+
+    # import the xml file, process sentences and spellings, and add phrases with the stub parser
+    def setUp(self) -> None:
+        set_parser_backend('stub')
+        filename = 'tests/data/input.xml'
+        format = 'colmep'
+        self.d = Document.create_from_nonstandard_file(filename, format)
+        self.d.transform_tokenise_sentences()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        self.d.transform_parse(restructure=True)
+        self.c = Corpus.create_new()
+        self.d.add_to_corpus(self.c)
+        Document.create_from_xml_file('tests/data/simple-input1.xml').add_to_corpus(self.c)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        set_parser_backend('benepar')
+        return super().tearDown()
+
+    # check that the statistics are the same as the individual methods give
+    def test_stats_match_methods(self):
+        for e in [self.d, self.c, Document.create_new()]:
+            stats = e.collect_stats()
+            self.assertEqual(stats['documents'], e.count_documents())
+            self.assertEqual(stats['sentences'], e.count_sentences())
+            self.assertEqual(stats['words'], e.count_words())
+            self.assertEqual(stats['longest_sentence'], e.longest_sentence_length())
+            self.assertEqual(stats['shortest_sentence'], e.shortest_sentence_length())
+            self.assertEqual(stats['average_sentence_length'], e.average_sentence_length())
+            self.assertEqual(stats['most_frequent_words'], [list(x) for x in e.word_frequency_no_punctuation(correctedText=True).most_common(20)])
+            self.assertEqual(stats['most_frequent_punctuation'], [list(x) for x in e.word_frequency_contains_punctuation(correctedText=True).most_common(10)])
+            self.assertEqual(stats['nonstandard_characters'], e.get_nonstandard_characters())
+            self.assertEqual(stats['xml_tags'], e.get_xml_tags())
+            self.assertEqual(stats['element_counts']['document'], e.count_elements('document'))
+            self.assertEqual(json.loads(json.dumps(stats)), stats)
+
+    def test_stats_updated_on_change(self):
+        self.assertEqual(self.c.collect_stats()['documents'], 2)
+        Document.create_new().add_to_corpus(self.c)
+        self.assertEqual(self.c.collect_stats()['documents'], 3)
+
+    # check that changes through objects the corpus and document were not created from are seen
+    def test_stats_updated_on_change_elsewhere(self):
+        stats = self.d.collect_stats()
+        words = self.c.collect_stats()['words']
+        w = Word.create_from_element(self.d.get_word_element_by_index(0))
+        Word.append_new(Sentence(self.d.get_sentence_element_by_index(0)), 'w').set_text('ende')
+        self.assertEqual(self.d.collect_stats()['words'], stats['words'] + 1)
+        self.assertEqual(self.c.collect_stats()['words'], words + 1)
+        w.set_text('Ende')
+        self.assertEqual(self.d.collect_stats()['nonstandard_characters'], self.d.get_nonstandard_characters())
+        self.assertEqual(self.d.collect_stats()['longest_sentence'], self.d.longest_sentence_length())
+
+
+class CorpusIngestTestCase(unittest.TestCase):
+
+    # check that importing in worker processes gives the same documents, in the same order, as one at a time
+    def test_ingest_matches_serial(self):
+        paths = ['tests/data/input.xml', 'tests/data/missing.xml', 'tests/data/input.xml']
+        serial = Corpus.create_from_files(paths, 'colmep')
+        parallel = Corpus.create_from_files(paths, 'colmep', workers=2)
+        self.assertEqual(parallel.count_documents(), 2)
+        self.assertEqual(parallel.to_xml_string(), serial.to_xml_string())
+        expected = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        self.assertEqual(ET.tostring(parallel[0]), ET.tostring(expected.get_underlying_element()))
+
+    # check that a failed file is reported without stopping the import
+    def test_ingest_report(self):
+        paths = ['tests/data/simple-input1.xml', 'tests/data/missing.xml', 'tests/data/simple-input2.xml']
+        c = Corpus.create_from_files(paths, workers=2)
+        self.assertEqual([r['path'] for r in c.ingest_report], paths)
+        self.assertIsNone(c.ingest_report[0]['error'])
+        self.assertIn('FileNotFoundError', c.ingest_report[1]['error'])
+        self.assertEqual(c.count_documents(), 2)
+        self.assertEqual(c.ingest_report[2]['words'], Document.create_from_xml_file(paths[2]).count_words())
+
+    # check that standard format files are read in this process, even if workers are asked for
+    def test_ingest_xml_not_pooled(self):
+        paths = ['tests/data/simple-input1.xml', 'tests/data/simple-input2.xml']
+        serial = Corpus.create_from_files(paths)
+        corpus_module = sys.modules[Corpus.__module__]
+        pool = corpus_module.multiprocessing.Pool
+        def no_pool(*args):
+            raise AssertionError('a pool was started')
+        corpus_module.multiprocessing.Pool = no_pool
+        self.addCleanup(setattr, corpus_module.multiprocessing, 'Pool', pool)
+        parallel = Corpus.create_from_files(paths, workers=2)
+        self.assertEqual(parallel.to_xml_string(), serial.to_xml_string())
+        self.assertTrue(all(r['seconds'] > 0 for r in parallel.ingest_report))
+
+
+# a pipeline step which can be sent to a worker process
+def _mark_document(d: Document) -> None:
+    d.set_attribute('checked', str(d.count_sentences()))
+
+# a pipeline step which changes the underlying elements directly
+def _mark_words(d: Document) -> None:
+    for w in d.iter('w'):
+        w.text = w.text.upper()
+
+
+class CorpusMapTestCase(unittest.TestCase):
+
+    # a corpus of three copies of the test file
+    def setUp(self) -> None:
+        self.c = Corpus.create_new()
+        for name in ['one', 'two', 'three']:
+            d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+            d.set_name(name)
+            d.add_to_corpus(self.c)
+        self.pipeline = [
+            'transform_tokenise_sentences',
+            ('update_spellings_from_file', 'tests/data/spellings.json'),
+            ('transform_add_convenience_text_to_sentences', {'correctedText': True}),
+            _mark_document,
+        ]
+        return super().setUp()
+
+    # check that the pipeline gives the same result in worker processes, in this process, and on the whole corpus
+    def test_map_matches_corpus_transforms(self):
+        expected = Corpus(self.c.clone_element())
+        expected.transform_tokenise_sentences()
+        expected.update_spellings_from_file('tests/data/spellings.json')
+        expected.transform_add_convenience_text_to_sentences(correctedText=True)
+        for d in expected.get_documents_as_elements():
+            _mark_document(Document(d))
+        serial = Corpus(self.c.clone_element())
+        serial.map_documents(self.pipeline)
+        self.assertEqual(serial.to_xml_string(), expected.to_xml_string())
+        report = self.c.map_documents(self.pipeline, workers=2)
+        self.assertEqual(self.c.to_xml_string(), expected.to_xml_string())
+        self.assertEqual([r['name'] for r in report], ['one', 'two', 'three'])
+        self.assertTrue(all(r['error'] is None and r['peak_memory'] > 0 for r in report))
+        self.assertEqual(self.c.count_sentences(), 3 * 39)
+
+    # check that Document objects for the corpus stay in it when the documents are transformed in worker processes
+    def test_map_keeps_documents(self):
+        documents = self.c.get_documents()
+        tail = documents[1].get_underlying_element().tail = '\n'
+        self.c.word_frequency()
+        self.c.map_documents(self.pipeline, workers=2, measure_memory=False)
+        for i, d in enumerate(documents):
+            self.assertIs(d.get_underlying_element(), self.c[i])
+            self.assertEqual(d.count_sentences(), 39)
+            self.assertEqual(d.get_attribute('checked'), '39')
+        self.assertEqual(documents[1].get_underlying_element().tail, tail)
+        self.assertEqual(self.c.word_frequency(), CorpusElement._word_frequency(self.c))
+        documents[0].update_spellings('the', 'thee')
+        self.assertEqual(self.c.word_frequency(correctedText=True), CorpusElement._word_frequency(self.c, correctedText=True))
+
+    # check that a function step which changes the elements directly is seen by the corpus
+    def test_map_function_changes(self):
+        self.c.word_frequency()
+        self.c.map_documents([_mark_words], measure_memory=False)
+        self.assertEqual(self.c.word_frequency(), CorpusElement._word_frequency(self.c))
+
+    # check that a failing document is reported and left as it was
+    def test_map_errors(self):
+        before = self.c.to_xml_string()
+        report = self.c.map_documents(['transform_tokenise_sentences', ('update_spellings_from_file', 'tests/data/missing.json')], workers=2, measure_memory=False)
+        self.assertTrue(all('FileNotFoundError' in r['error'] for r in report))
+        self.assertIsNone(report[0]['peak_memory'])
+        self.assertEqual(self.c.to_xml_string(), before)
+        with self.assertRaises(ValueError):
+            self.c.map_documents(['transform_nothing'])
+
+
+class CorpusFrequencyTestCase(unittest.TestCase):
+
+    # a corpus of three copies of the test file, with spellings corrected
+    def setUp(self) -> None:
+        self.c = Corpus.create_new()
+        for i in range(3):
+            d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+            d.add_to_corpus(self.c)
+        self.c.transform_tokenise_sentences()
+        self.c.update_spellings_from_file('tests/data/spellings.json')
+        self.corpus_module = sys.modules[Corpus.__module__]
+        return super().setUp()
+
+    # the word frequency of the whole tree, as CorpusElement gives it
+    def flat_frequency(self, pattern='', correctedText=False, ignoreCase=False) -> list:
+        return list(CorpusElement._word_frequency(self.c, pattern, correctedText, ignoreCase).most_common())
+
+    # count the calls to count the words of a document
+    def count_calls(self) -> list:
+        calls = []
+        count = self.corpus_module._count_document_words
+        def counting(e):
+            calls.append(e)
+            return count(e)
+        self.corpus_module._count_document_words = counting
+        self.addCleanup(setattr, self.corpus_module, '_count_document_words', count)
+        return calls
+
+    # check that the merged counts are the same as counting every word
+    def test_frequency_matches_tree(self):
+        for pattern in ['', '.*[A-Za-z0-9].*', '[Tt].*']:
+            for correctedText in [False, True]:
+                for ignoreCase in [False, True]:
+                    self.assertEqual(list(self.c.word_frequency(pattern, correctedText, ignoreCase).most_common()),
+                                     self.flat_frequency(pattern, correctedText, ignoreCase))
+        documents = self.c.get_document_frequencies(correctedText=True)
+        self.assertEqual(len(documents), 3)
+        self.assertEqual(documents[0], self.c.get_documents()[0].word_frequency(correctedText=True))
+
+    # check that only a changed document is counted again
+    def test_only_changed_document_counted(self):
+        calls = self.count_calls()
+        self.c.word_frequency()
+        self.assertEqual(len(calls), 3)
+        d = self.c.get_documents()[1]
+        d.update_spellings('and', 'ande')
+        self.assertEqual(self.c.word_frequency(correctedText=True)['ande'], 68)
+        self.assertEqual(list(self.c.word_frequency(correctedText=True).most_common()), self.flat_frequency(correctedText=True))
+        self.assertEqual(calls[3:], [d.get_underlying_element()])
+        # a change to the whole corpus means every document is counted again
+        self.c.update_spellings('the', 'thee')
+        self.assertEqual(self.c.word_frequency(correctedText=True)['thee'], 231)
+        self.assertEqual(len(calls), 7)
+        # adding a document only counts the new one
+        Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep').add_to_corpus(self.c)
+        self.assertEqual(self.c.word_frequency(correctedText=True)['thee'], 231)
+        self.assertEqual(list(self.c.word_frequency(correctedText=True).most_common()), self.flat_frequency(correctedText=True))
+        self.assertEqual(len(calls), 8)
+        # a new document, or a new sentence in one, only counts that document
+        Sentence.append_new(Document.append_new(self.c, 'document'), 's')
+        self.c.word_frequency()
+        self.assertEqual(calls[8:], [self.c[4]])
+
+    # check that changes through objects which were not returned by get_documents() are counted
+    def test_changes_elsewhere_counted(self):
+        calls = self.count_calls()
+        before = self.c.word_frequency(correctedText=True)['the']
+        d = Document(self.c[0])
+        d.update_spellings('the', 'thee')
+        self.assertEqual(self.c.get_document_frequencies(correctedText=True)[0]['the'], 0)
+        self.assertEqual(self.c.word_frequency(correctedText=True)['the'], before * 2 // 3)
+        self.assertEqual(calls[3:], [self.c[0]])
+        # a change below a document, through an object for one of its words
+        w = Word.create_from_element(self.c[2].find('.//w'))
+        w.set_text('ende')
+        self.assertEqual(self.c.word_frequency()['ende'], 1)
+        self.assertEqual(calls[4:], [self.c[2]])
+        self.assertEqual(list(self.c.word_frequency(correctedText=True).most_common()), self.flat_frequency(correctedText=True))
+        # a change to the whole corpus through another object for it
+        Corpus(self.c.get_underlying_element()).update_spellings('thee', 'the')
+        self.assertEqual(self.c.word_frequency(correctedText=True)['the'], before)
+        self.assertEqual(len(calls), 8)
+
+    # check that counting in worker processes gives the same counts
+    def test_parallel_counts(self):
+        expected = self.c.get_document_frequencies(correctedText=True)
+        self.c.mark_changed()
+        self.assertEqual(self.c.get_document_frequencies(correctedText=True, workers=2), expected)
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.filename = os.path.join(self.folder.name, 'document.snapshot')
+        return super().setUp()
+
+    # check that a processed document loads from a snapshot exactly as it was saved
+    def test_snapshot_round_trip(self):
+        d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        d.transform_tokenise_sentences()
+        d.update_spellings_from_file('tests/data/spellings.json')
+        d.save_snapshot(self.filename)
+        loaded = Document.load_snapshot(self.filename)
+        self.assertIsInstance(loaded, Document)
+        self.assertEqual(loaded.to_xml_string(), d.to_xml_string())
+        self.assertLess(os.path.getsize(self.filename), len(d.to_xml_string(encoding='utf-8')))
+
+    # check the parts of the XML model which the import never makes
+    def test_snapshot_keeps_everything(self):
+        xml = ('<document name="é &amp; ü"><!-- a comment --><s n="1">Before <w so="thë" pos="DT">þe</w>\n'
+               '<?target some data?><w /><w>ſ</w> after</s>tail<s /></document>')
+        d = Document.create_from_xml_string(xml)
+        d.get_underlying_element().append(ET.Comment(' added '))
+        d.get_underlying_element()[0].tail = 'between'
+        d.save_snapshot(self.filename)
+        self.assertEqual(Document.load_snapshot(self.filename).to_xml_string(), d.to_xml_string())
+        single = Document.create_from_xml_string('<document />')
+        single.save_snapshot(self.filename)
+        self.assertEqual(Document.load_snapshot(self.filename).to_xml_string(), '<document />')
+
+    # check that a file which is not a snapshot is rejected
+    def test_snapshot_invalid(self):
+        Document.create_from_xml_file('tests/data/simple-input1.xml').save_snapshot(self.filename)
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        for bad in [b'<document />', data[:-3], data[:20]]:
+            with open(self.filename, 'wb') as f:
+                f.write(bad)
+            with self.assertRaises(ValueError):
+                Document.load_snapshot(self.filename)
+
+
+class XMLWriterTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        self.d.transform_tokenise_sentences()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        return super().setUp()
+
+    # the output of ET, with the indent applied to a copy of the tree
+    def expected(self, indent: int, encoding='unicode'):
+        e = copy.deepcopy(self.d.get_underlying_element())
+        if indent > 0:
+            ET.indent(e, ' ' * indent)
+        return ET.tostring(e, encoding)
+
+    # check that the output is the same as ET's, and the tree is not changed by indenting
+    def test_same_as_tostring(self):
+        before = ET.tostring(self.d.get_underlying_element())
+        for indent in [0, 2, 4]:
+            self.assertEqual(self.d.to_xml_string(indent), self.expected(indent))
+        self.assertEqual(self.d.to_xml_string(2, 'utf-8'), self.expected(2, 'utf-8'))
+        self.assertEqual(self.d.to_xml_string(0, 'latin-1'), self.expected(0, 'latin-1'))
+        self.assertEqual(ET.tostring(self.d.get_underlying_element()), before)
+
+    # check that files are written in the same way, and compressed files can be read back
+    def test_write_file(self):
+        filename = os.path.join(self.folder.name, 'document.xml')
+        self.d.to_xml_file(filename, indent=2)
+        with open(filename, encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.expected(2))
+        compressed = os.path.join(self.folder.name, 'document.xml.gz')
+        self.d.to_xml_file(compressed, indent=2)
+        with open(compressed, 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+        self.assertEqual(Document.create_from_xml_file(compressed).to_xml_string(), self.expected(2))
+
+
+class CorpusStoreTestCase(unittest.TestCase):
+
+    # a corpus of two copies of the test file, with spellings corrected, and its store
+    def setUp(self) -> None:
+        self.c = Corpus.create_new()
+        for i in range(2):
+            Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep').add_to_corpus(self.c)
+        self.c.transform_tokenise_sentences()
+        self.c.update_spellings_from_file('tests/data/spellings.json')
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.store = CorpusStore.create_from_corpus(self.c, os.path.join(self.folder.name, 'store'))
+        self.addCleanup(self.store.close)
+        return super().setUp()
+
+    # check that the queries give the same results as the corpus
+    def test_store_queries(self):
+        self.assertEqual(self.store.count_words(), self.c.count_words())
+        self.assertEqual(self.store.count_sentences(), self.c.count_sentences())
+        self.assertEqual(self.store.count_documents(), 2)
+        self.assertEqual(self.store.get_sentence_lengths(), self.c.get_sentence_lengths())
+        self.assertEqual(list(self.store.word_frequency(correctedText=True).most_common()),
+                         list(self.c.word_frequency(correctedText=True).most_common()))
+        self.assertEqual(self.store.word_frequency('[Tt].*', ignoreCase=True), self.c.word_frequency('[Tt].*', ignoreCase=True))
+        for context_length in [0, 3, 25]:
+            self.assertEqual(self.store.concordance_in(['which', 'and'], True, '|', context_length),
+                             self.c.concordance_in(['which', 'and'], True, '|', context_length))
+
+    # check that the corpus is converted back to exactly the same XML
+    def test_store_round_trip(self):
+        self.assertEqual(self.store.to_corpus().to_xml_string(), self.c.to_xml_string())
+        self.assertEqual(self.store.get_document(1).to_xml_string(), Document(self.c[1]).to_xml_string())
+        filename = os.path.join(self.folder.name, 'corpus.xml')
+        self.store.to_xml_file(filename, indent=2)
+        with open(filename, encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.c.to_xml_string(indent=2))
+
+    # check that a store made from files is the same as one made from a corpus
+    def test_store_from_files(self):
+        paths = []
+        for i, d in enumerate(self.c.get_documents()):
+            paths.append(os.path.join(self.folder.name, 'text%d.xml' % i))
+            d.to_xml_file(paths[-1])
+        store = CorpusStore.create_from_files(paths, os.path.join(self.folder.name, 'files'))
+        self.addCleanup(store.close)
+        self.assertEqual(store.vocab, self.store.vocab)
+        self.assertEqual(list(store.get_word_ids(True)), list(self.store.get_word_ids(True)))
+        self.assertEqual(store.to_corpus().to_xml_string(), self.c.to_xml_string())
+
+
+class LazyCorpusTestCase(unittest.TestCase):
+
+    # four copies of the test file, as XML, compressed XML and a snapshot, and the same corpus in memory
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        d.transform_tokenise_sentences()
+        d.update_spellings_from_file('tests/data/spellings.json')
+        self.paths = [os.path.join(self.folder.name, name) for name in ['a.xml', 'b.xml.gz', 'c.snapshot', 'd.xml']]
+        for path in self.paths:
+            if path.endswith('.snapshot'):
+                d.save_snapshot(path)
+            else:
+                d.to_xml_file(path)
+        self.c = Corpus.create_new()
+        for i in range(len(self.paths)):
+            d.clone_document().add_to_corpus(self.c)
+        return super().setUp()
+
+    # check that the queries give the same results as the corpus in memory, with only two documents loaded
+    def test_lazy_queries(self):
+        lazy = Corpus.create_lazy(self.paths, max_documents=2)
+        self.assertEqual(lazy.count_words(), self.c.count_words())
+        self.assertEqual(lazy.count_sentences(), self.c.count_sentences())
+        self.assertEqual(lazy.get_sentence_lengths(), self.c.get_sentence_lengths())
+        self.assertEqual(list(lazy.word_frequency(correctedText=True).most_common()),
+                         list(self.c.word_frequency(correctedText=True).most_common()))
+        self.assertEqual(lazy.concordance_in(['which', 'and'], True, '|', 5), self.c.concordance_in(['which', 'and'], True, '|', 5))
+        self.assertEqual(lazy.to_corpus().to_xml_string(), self.c.to_xml_string())
+        self.assertEqual([lazy.is_loaded(i) for i in range(4)], [False, False, True, True])
+        self.assertEqual(lazy.get_stats()['writes'], 0)
+        # the most recently used document is dropped last
+        lazy.get_document(2)
+        lazy.get_document(0)
+        self.assertEqual([lazy.is_loaded(i) for i in range(4)], [True, False, True, False])
+        small = LazyCorpus(self.paths, max_documents=None, max_mb=0.1)
+        self.assertEqual(small.count_words(), self.c.count_words())
+        self.assertEqual(small.get_stats()['loaded'], 1)
+
+    # check that changed documents are written back to their files, in the same format
+    def test_lazy_write_back(self):
+        lazy = LazyCorpus(self.paths, max_documents=2)
+        lazy.map_documents([('update_spellings', 'the', 'thee')])
+        self.assertEqual(lazy.get_stats()['writes'], 2)
+        self.assertTrue(lazy.is_changed(3))
+        lazy.close()
+        self.assertEqual(lazy.get_stats()['writes'], 4)
+        self.c.update_spellings('the', 'thee')
+        self.assertEqual(Document.load_snapshot(self.paths[2]).to_xml_string(), Document(self.c[2]).to_xml_string())
+        self.assertEqual(Document.create_from_xml_file(self.paths[1]).to_xml_string(), Document(self.c[1]).to_xml_string())
+        reopened = LazyCorpus(self.paths)
+        self.assertEqual(reopened.word_frequency(correctedText=True), self.c.word_frequency(correctedText=True))
+
+    # check that changes made directly by a function step, or through an object for a word, are written back
+    def test_lazy_write_back_direct_changes(self):
+        lazy = LazyCorpus(self.paths, max_documents=2)
+        lazy.map_documents([_mark_words])
+        lazy.close()
+        self.assertEqual(lazy.get_stats()['writes'], 4)
+        _mark_words(self.c)
+        self.c.mark_changed()
+        self.assertEqual(Document.load_snapshot(self.paths[2]).to_xml_string(), Document(self.c[2]).to_xml_string())
+        self.assertEqual(LazyCorpus(self.paths).word_frequency(), self.c.word_frequency())
+        Word.create_from_element(lazy.get_document(0).get_underlying_element().find('.//w')).set_text('ende')
+        self.assertTrue(lazy.is_changed(0))
+        self.assertFalse(lazy.is_changed(1))
+        lazy.close()
+        self.assertEqual(Document.create_from_xml_file(self.paths[0]).word_frequency()['ende'], 1)
+
+    # check that changes through the setters for the tail, name and id are written back
+    def test_lazy_write_back_setters(self):
+        lazy = LazyCorpus(self.paths, max_documents=1)
+        d = lazy.get_document(0)
+        d.set_id('X1')
+        d.set_name('first')
+        self.assertTrue(lazy.is_changed(0))
+        lazy.get_document(1)
+        self.assertFalse(lazy.is_loaded(0))
+        e = Document.create_from_xml_file(self.paths[0]).get_underlying_element()
+        self.assertEqual((e.get('id'), e.get('name')), ('X1', 'first'))
+        lazy.get_document(1).set_tail('\n')
+        lazy.get_document(1).set_id('X2')
+        lazy.flush()
+        self.assertFalse(lazy.is_changed(1))
+        self.assertEqual(Document.create_from_xml_file(self.paths[1]).get_id(), 'X2')
+
+    # check that a compressed file is written back compressed, and that a failed write leaves the file as it was
+    def test_lazy_write_back_safely(self):
+        path = os.path.join(self.folder.name, 'e.xml')
+        with open(self.paths[1], 'rb') as f, open(path, 'wb') as g:
+            g.write(f.read())
+        lazy = LazyCorpus([path])
+        lazy.get_document(0).update_spellings('the', 'thee')
+        lazy.flush()
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(2), b'\x1f\x8b')
+        self.assertEqual(Document.create_from_xml_file(path).word_frequency(correctedText=True)['thee'],
+                         self.c.get_documents()[0].word_frequency(correctedText=True)['the'])
+        with open(path, 'rb') as f:
+            before = f.read()
+        lazy.get_document(0).update_spellings('thee', 'the')
+        lazy.get_document(0).get_underlying_element().set('bad', 1)
+        with self.assertRaises(Exception):
+            lazy.flush()
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ['a.xml', 'b.xml.gz', 'c.snapshot', 'd.xml', 'e.xml'])
+
+
+class StreamingReaderTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+        self.d.transform_tokenise_sentences()
+        self.d.update_spellings_from_file('tests/data/spellings.json')
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.filename = os.path.join(self.folder.name, 'document.xml.gz')
+        self.d.to_xml_file(self.filename, indent=2)
+        return super().setUp()
+
+    # check that the sentences are the same as those of the whole document
+    def test_iter_sentences(self):
+        sentences = list(iter_sentences(self.filename))
+        self.assertIsInstance(sentences[0], Sentence)
+        self.assertEqual([s.get_words_as_text() for s in sentences], [Sentence(s).get_words_as_text() for s in self.d.get_sentences_as_elements()])
+        for correctedText in [False, True]:
+            self.assertEqual(list(iter_sentences(self.filename, as_text=True, correctedText=correctedText)),
+                             self.d.get_sentences_as_text_list(correctedText))
+
+    # check that the words are the same as those of the whole document
+    def test_iter_words(self):
+        words = list(iter_words(self.filename))
+        self.assertIsInstance(words[0], Word)
+        self.assertEqual([(w.get_underlying_element().text, w.get_underlying_element().attrib) for w in words],
+                         [(w.text, w.attrib) for w in self.d.get_words_as_elements()])
+        for correctedText in [False, True]:
+            self.assertEqual(list(iter_words(self.filename, as_text=True, correctedText=correctedText)),
+                             self.d.get_words_as_text_list(correctedText))
+
+
+class VerticalExportTestCase(unittest.TestCase):
+
+    # a corpus of two numbered, spelling-corrected copies of the test file
+    def setUp(self) -> None:
+        self.c = Corpus.create_new()
+        for i in range(2):
+            d = Document.create_from_nonstandard_file('tests/data/input.xml', 'colmep')
+            d.set_id('text' + str(i + 1))
+            d.add_to_corpus(self.c)
+        self.c.transform_tokenise_sentences()
+        self.c.transform_number_sentences()
+        self.c.update_spellings_from_file('tests/data/spellings.json')
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        return super().setUp()
+
+    def read(self, filename: str) -> list:
+        with open(os.path.join(self.folder.name, filename), encoding='utf-8') as f:
+            return f.read().split('\n')
+
+    # check the structures and the columns of each word
+    def test_vrt(self):
+        self.c.to_vrt_file(os.path.join(self.folder.name, 'corpus.vrt'))
+        lines = self.read('corpus.vrt')
+        self.assertEqual(lines[:2], ['<doc id="text1">', '<s n="1">'])
+        self.assertEqual(lines.count('</doc>'), 2)
+        self.assertEqual(lines.count('</s>'), self.c.count_sentences())
+        self.assertEqual(lines[-3:], ['</s>', '</doc>', ''])
+        words = [line.split('\t') for line in lines if not line.startswith('<') and line != '']
+        self.assertEqual([w[0] for w in words], self.c.get_words_as_text_list())
+        self.assertEqual([w[1] for w in words], self.c.get_words_as_text_list(correctedText=True))
+        self.assertIn('<doc id="text2">', lines)
+
+    # check that words and attributes cannot break the format
+    def test_vrt_escaping(self):
+        d = Document.create_from_xml_string('<document id="a &quot;b&quot;"><s n="1"><w>&lt;s&gt;</w><w pos="NN">x\ty</w><w /></s></document>')
+        d.to_vrt_file(os.path.join(self.folder.name, 'document.vrt.gz'))
+        with gzip.open(os.path.join(self.folder.name, 'document.vrt.gz'), 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '<doc id="a &quot;b&quot;">\n<s n="1">\n&lt;s&gt;\t&lt;s&gt;\t\nx y\tx y\tNN\n</s>\n</doc>\n')
+
+    # check that the sentence text is the same as get_sentences_as_text_list()
+    def test_text_file(self):
+        for correctedText in [False, True]:
+            self.c.to_text_file(os.path.join(self.folder.name, 'corpus.txt'), correctedText)
+            self.assertEqual(self.read('corpus.txt')[:-1], self.c.get_sentences_as_text_list(correctedText))
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    # check that importing the package does not import the parser libraries
+    def test_import_does_not_load_parser(self):
+        code = 'import sys, corpusparser; print(any(m in sys.modules for m in ("spacy", "benepar")))'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
+
+
+
 if __name__ == '__main__':
     unittest.main()